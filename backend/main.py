@@ -1,11 +1,12 @@
-import os
 from contextlib import asynccontextmanager
 
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 
-from routers import summarize, tasks, search, notes
+from routers import summarize, tasks, search, notes, graph, transcribe, meetings, health, profiles
 from services.database import create_db_and_tables
+from services.profiling import ProfilingMiddleware
+from services.tracing import TracingMiddleware
 
 
 @asynccontextmanager
@@ -25,23 +26,23 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Opt-in request profiling (X-Profile-Token header or PROFILE_SAMPLE_RATE)
+app.add_middleware(ProfilingMiddleware)
+
+# Request spans (TRACING_EXPORTER=console or file)
+app.add_middleware(TracingMiddleware)
+
 # Include routers
 app.include_router(summarize.router)
 app.include_router(tasks.router)
 app.include_router(search.router)
 app.include_router(notes.router)
+app.include_router(graph.router)
+app.include_router(transcribe.router)
+app.include_router(meetings.router)
+app.include_router(health.router)
+app.include_router(profiles.router)
 
 @app.get("/")
 def read_root():
     return {"message": "Welcome to AI Second Brain API", "status": "active"}
-
-@app.get("/health")
-def health_check():
-    # Check if services are available
-    services = {
-        "api": "ok",
-        "db": "ok",  # This would typically check database connection
-        "openai": "ok" if os.getenv("OPENAI_API_KEY") else "missing key",
-        "vector_store": "pinecone" if os.getenv("PINECONE_API_KEY") and os.getenv("PINECONE_ENV") else "faiss"
-    }
-    return services
@@ -0,0 +1,36 @@
+"""Add graph analytics columns to notes
+
+Revision ID: 002
+Revises: 001
+Create Date: 2026-10-19 00:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = '002'
+down_revision = '001'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    # Add analytics columns to notes table
+    op.add_column('notes', sa.Column('pagerank', sa.Float(), nullable=True))
+    op.add_column('notes', sa.Column('component_id', sa.Integer(), nullable=True))
+    op.add_column('notes', sa.Column('community_id', sa.Integer(), nullable=True))
+    
+    # Create indexes for "most central" and "cluster of" lookups
+    op.create_index('idx_notes_pagerank', 'notes', ['pagerank'])
+    op.create_index('idx_notes_component_id', 'notes', ['component_id'])
+    op.create_index('idx_notes_community_id', 'notes', ['community_id'])
+
+
+def downgrade() -> None:
+    op.drop_index('idx_notes_community_id', table_name='notes')
+    op.drop_index('idx_notes_component_id', table_name='notes')
+    op.drop_index('idx_notes_pagerank', table_name='notes')
+    op.drop_column('notes', 'community_id')
+    op.drop_column('notes', 'component_id')
+    op.drop_column('notes', 'pagerank')
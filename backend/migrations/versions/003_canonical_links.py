@@ -0,0 +1,49 @@
+"""Store links once per unordered note pair
+
+Revision ID: 003
+Revises: 002
+Create Date: 2026-10-19 00:00:00.000000
+
+"""
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision = '003'
+down_revision = '002'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    # Drop self-links and flip reversed pairs so source_note_id < target_note_id
+    op.execute("DELETE FROM links WHERE source_note_id = target_note_id")
+    op.execute("""
+        UPDATE links
+        SET source_note_id = target_note_id, target_note_id = source_note_id
+        WHERE source_note_id > target_note_id
+    """)
+    
+    # Keep only the strongest row per pair
+    op.execute("""
+        DELETE FROM links a
+        USING links b
+        WHERE a.source_note_id = b.source_note_id
+          AND a.target_note_id = b.target_note_id
+          AND (a.similarity < b.similarity OR (a.similarity = b.similarity AND a.id < b.id))
+    """)
+    
+    op.create_unique_constraint('uq_links_note_pair', 'links', ['source_note_id', 'target_note_id'])
+    
+    # Composite indexes serve "top neighbors by similarity" from either endpoint
+    op.drop_index('idx_links_source_note_id', table_name='links')
+    op.drop_index('idx_links_target_note_id', table_name='links')
+    op.create_index('idx_links_source_similarity', 'links', ['source_note_id', 'similarity'])
+    op.create_index('idx_links_target_similarity', 'links', ['target_note_id', 'similarity'])
+
+
+def downgrade() -> None:
+    op.drop_index('idx_links_target_similarity', table_name='links')
+    op.drop_index('idx_links_source_similarity', table_name='links')
+    op.create_index('idx_links_source_note_id', 'links', ['source_note_id'])
+    op.create_index('idx_links_target_note_id', 'links', ['target_note_id'])
+    op.drop_constraint('uq_links_note_pair', 'links', type_='unique')
@@ -0,0 +1,56 @@
+"""Add chunks table with optional pgvector embeddings
+
+Revision ID: 004
+Revises: 003
+Create Date: 2026-10-19 00:00:00.000000
+
+"""
+import os
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+# revision identifiers, used by Alembic.
+revision = '004'
+down_revision = '003'
+branch_labels = None
+depends_on = None
+
+# Dimension of the pgvector column (must match the embedding model)
+CHUNK_EMBEDDING_DIMS = int(os.getenv("CHUNK_EMBEDDING_DIMS", "1536"))
+
+
+def upgrade() -> None:
+    op.create_table('chunks',
+        sa.Column('id', postgresql.UUID(as_uuid=True), primary_key=True),
+        sa.Column('note_id', postgresql.UUID(as_uuid=True),
+                  sa.ForeignKey('notes.id', ondelete='CASCADE'), nullable=False),
+        sa.Column('ordinal', sa.Integer(), nullable=False),
+        sa.Column('start_char', sa.Integer(), nullable=False),
+        sa.Column('end_char', sa.Integer(), nullable=False),
+        sa.Column('content', sa.Text(), nullable=False),
+        sa.Column('content_hash', sa.String(64), nullable=False),
+        sa.Column('embedding', sa.LargeBinary(), nullable=True),
+        sa.Column('created_at', sa.DateTime(), nullable=True),
+    )
+    
+    # The unique (note_id, ordinal) index also serves "chunks of a note" lookups and deletes
+    op.create_unique_constraint('uq_chunks_note_ordinal', 'chunks', ['note_id', 'ordinal'])
+    op.create_index('idx_chunks_content_hash', 'chunks', ['content_hash'])
+    
+    # Indexed vector column when the pgvector extension can be installed
+    available = op.get_bind().execute(
+        sa.text("SELECT 1 FROM pg_available_extensions WHERE name = 'vector'")
+    ).scalar()
+    if available:
+        op.execute("CREATE EXTENSION IF NOT EXISTS vector")
+        op.execute(f"ALTER TABLE chunks ADD COLUMN embedding_vector vector({CHUNK_EMBEDDING_DIMS})")
+        op.execute(
+            "CREATE INDEX idx_chunks_embedding_vector ON chunks "
+            "USING hnsw (embedding_vector vector_cosine_ops)"
+        )
+
+
+def downgrade() -> None:
+    op.drop_table('chunks')
@@ -0,0 +1,46 @@
+"""Scope notes, tasks, links and chunks to a tenant and workspace
+
+Revision ID: 005
+Revises: 004
+Create Date: 2026-10-19 00:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = '005'
+down_revision = '004'
+branch_labels = None
+depends_on = None
+
+SCOPED_TABLES = ['notes', 'tasks', 'links', 'chunks']
+
+# Composite indexes lead with the scope so per-tenant queries never scan other tenants
+SCOPE_INDEXES = [
+    ('idx_notes_scope_created', 'notes', ['tenant_id', 'workspace_id', 'created_at']),
+    ('idx_tasks_scope_completed', 'tasks', ['tenant_id', 'workspace_id', 'completed']),
+    ('idx_links_scope_similarity', 'links', ['tenant_id', 'workspace_id', 'similarity']),
+    ('idx_chunks_scope', 'chunks', ['tenant_id', 'workspace_id']),
+]
+
+
+def upgrade() -> None:
+    # Existing rows join the default scope
+    for table in SCOPED_TABLES:
+        for column in ('tenant_id', 'workspace_id'):
+            op.add_column(
+                table, sa.Column(column, sa.String(64), nullable=False, server_default='default')
+            )
+    
+    for name, table, columns in SCOPE_INDEXES:
+        op.create_index(name, table, columns)
+
+
+def downgrade() -> None:
+    for name, table, _ in SCOPE_INDEXES:
+        op.drop_index(name, table_name=table)
+    
+    for table in SCOPED_TABLES:
+        op.drop_column(table, 'workspace_id')
+        op.drop_column(table, 'tenant_id')
@@ -0,0 +1,33 @@
+"""Delete a note's tasks and links with it
+
+Revision ID: 006
+Revises: 005
+Create Date: 2026-10-19 00:00:00.000000
+
+"""
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision = '006'
+down_revision = '005'
+branch_labels = None
+depends_on = None
+
+# Foreign keys to notes.id created by 001 (Postgres default constraint names)
+NOTE_FOREIGN_KEYS = [
+    ('tasks_source_note_id_fkey', 'tasks', 'source_note_id'),
+    ('links_source_note_id_fkey', 'links', 'source_note_id'),
+    ('links_target_note_id_fkey', 'links', 'target_note_id'),
+]
+
+
+def upgrade() -> None:
+    for name, table, column in NOTE_FOREIGN_KEYS:
+        op.drop_constraint(name, table, type_='foreignkey')
+        op.create_foreign_key(name, table, 'notes', [column], ['id'], ondelete='CASCADE')
+
+
+def downgrade() -> None:
+    for name, table, column in NOTE_FOREIGN_KEYS:
+        op.drop_constraint(name, table, type_='foreignkey')
+        op.create_foreign_key(name, table, 'notes', [column], ['id'])
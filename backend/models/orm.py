@@ -2,13 +2,19 @@ import uuid
 from datetime import datetime
 from typing import Optional, List
 
-from sqlalchemy import Column, ForeignKey, String, Boolean, Float, Text, DateTime
+from sqlalchemy import (
+    Column, ForeignKey, String, Boolean, Float, Integer, Text, DateTime, Index, LargeBinary,
+    UniqueConstraint
+)
 from sqlmodel import Field, Relationship, SQLModel
 from sqlalchemy.dialects.postgresql import UUID
 
 
 class Note(SQLModel, table=True):
     __tablename__ = "notes"
+    __table_args__ = (
+        Index("idx_notes_scope_created", "tenant_id", "workspace_id", "created_at"),
+    )
     
     id: uuid.UUID = Field(
         default_factory=uuid.uuid4,
@@ -21,6 +27,21 @@ class Note(SQLModel, table=True):
     created_at: datetime = Field(default_factory=datetime.utcnow, sa_column=Column(DateTime))
     updated_at: datetime = Field(default_factory=datetime.utcnow, sa_column=Column(DateTime))
     
+    # Tenant and workspace the row belongs to (see services.tenancy)
+    tenant_id: str = Field(
+        default="default",
+        sa_column=Column(String(64), nullable=False, server_default="default")
+    )
+    workspace_id: str = Field(
+        default="default",
+        sa_column=Column(String(64), nullable=False, server_default="default")
+    )
+    
+    # Graph analytics (populated by services.graph_analytics)
+    pagerank: Optional[float] = Field(default=None, sa_column=Column(Float, index=True))
+    component_id: Optional[int] = Field(default=None, sa_column=Column(Integer, index=True))
+    community_id: Optional[int] = Field(default=None, sa_column=Column(Integer, index=True))
+    
     # Relationships
     tasks: List["Task"] = Relationship(back_populates="source_note")
     outgoing_links: List["Link"] = Relationship(
@@ -35,6 +56,9 @@ class Note(SQLModel, table=True):
 
 class Task(SQLModel, table=True):
     __tablename__ = "tasks"
+    __table_args__ = (
+        Index("idx_tasks_scope_completed", "tenant_id", "workspace_id", "completed"),
+    )
     
     id: uuid.UUID = Field(
         default_factory=uuid.uuid4,
@@ -48,17 +72,34 @@ class Task(SQLModel, table=True):
     source_note_id: Optional[uuid.UUID] = Field(
         default=None,
         foreign_key="notes.id",
-        sa_column=Column(UUID(as_uuid=True), ForeignKey("notes.id"))
+        sa_column=Column(UUID(as_uuid=True), ForeignKey("notes.id", ondelete="CASCADE"))
     )
     completed: bool = Field(default=False, sa_column=Column(Boolean))
     created_at: datetime = Field(default_factory=datetime.utcnow, sa_column=Column(DateTime))
     
+    # Tenant and workspace the row belongs to (see services.tenancy)
+    tenant_id: str = Field(
+        default="default",
+        sa_column=Column(String(64), nullable=False, server_default="default")
+    )
+    workspace_id: str = Field(
+        default="default",
+        sa_column=Column(String(64), nullable=False, server_default="default")
+    )
+    
     # Relationship
     source_note: Optional[Note] = Relationship(back_populates="tasks")
 
 
 class Link(SQLModel, table=True):
+    """Undirected semantic link, stored once per pair with source_note_id < target_note_id"""
     __tablename__ = "links"
+    __table_args__ = (
+        UniqueConstraint("source_note_id", "target_note_id", name="uq_links_note_pair"),
+        Index("idx_links_source_similarity", "source_note_id", "similarity"),
+        Index("idx_links_target_similarity", "target_note_id", "similarity"),
+        Index("idx_links_scope_similarity", "tenant_id", "workspace_id", "similarity"),
+    )
     
     id: uuid.UUID = Field(
         default_factory=uuid.uuid4,
@@ -67,14 +108,24 @@ class Link(SQLModel, table=True):
         sa_column=Column(UUID(as_uuid=True), primary_key=True)
     )
     source_note_id: uuid.UUID = Field(
-        sa_column=Column(UUID(as_uuid=True), ForeignKey("notes.id"), index=True)
+        sa_column=Column(UUID(as_uuid=True), ForeignKey("notes.id", ondelete="CASCADE"))
     )
     target_note_id: uuid.UUID = Field(
-        sa_column=Column(UUID(as_uuid=True), ForeignKey("notes.id"), index=True)
+        sa_column=Column(UUID(as_uuid=True), ForeignKey("notes.id", ondelete="CASCADE"))
     )
     similarity: float = Field(sa_column=Column(Float))
     created_at: datetime = Field(default_factory=datetime.utcnow, sa_column=Column(DateTime))
     
+    # Tenant and workspace the row belongs to (see services.tenancy)
+    tenant_id: str = Field(
+        default="default",
+        sa_column=Column(String(64), nullable=False, server_default="default")
+    )
+    workspace_id: str = Field(
+        default="default",
+        sa_column=Column(String(64), nullable=False, server_default="default")
+    )
+    
     # Relationships
     source: Note = Relationship(
         sa_relationship_kwargs={"foreign_keys": "Link.source_note_id"},
@@ -84,3 +135,48 @@ class Link(SQLModel, table=True):
         sa_relationship_kwargs={"foreign_keys": "Link.target_note_id"},
         back_populates="incoming_links"
     )
+
+
+class Chunk(SQLModel, table=True):
+    """
+    A retrieval chunk of a note with its embedding
+    
+    The embedding is stored as little-endian float32 bytes. When the pgvector
+    extension is available, migration 004 also adds an indexed
+    embedding_vector column that services.chunk_store queries with SQL.
+    """
+    __tablename__ = "chunks"
+    __table_args__ = (
+        UniqueConstraint("note_id", "ordinal", name="uq_chunks_note_ordinal"),
+        Index("idx_chunks_content_hash", "content_hash"),
+        Index("idx_chunks_scope", "tenant_id", "workspace_id"),
+    )
+    
+    id: uuid.UUID = Field(
+        default_factory=uuid.uuid4,
+        primary_key=True,
+        index=True,
+        sa_column=Column(UUID(as_uuid=True), primary_key=True)
+    )
+    note_id: uuid.UUID = Field(
+        sa_column=Column(
+            UUID(as_uuid=True), ForeignKey("notes.id", ondelete="CASCADE"), nullable=False
+        )
+    )
+    ordinal: int = Field(sa_column=Column(Integer, nullable=False))
+    start_char: int = Field(sa_column=Column(Integer, nullable=False))
+    end_char: int = Field(sa_column=Column(Integer, nullable=False))
+    content: str = Field(sa_column=Column(Text, nullable=False))
+    content_hash: str = Field(sa_column=Column(String(64), nullable=False))
+    embedding: Optional[bytes] = Field(default=None, sa_column=Column(LargeBinary))
+    created_at: datetime = Field(default_factory=datetime.utcnow, sa_column=Column(DateTime))
+    
+    # Tenant and workspace the row belongs to (see services.tenancy)
+    tenant_id: str = Field(
+        default="default",
+        sa_column=Column(String(64), nullable=False, server_default="default")
+    )
+    workspace_id: str = Field(
+        default="default",
+        sa_column=Column(String(64), nullable=False, server_default="default")
+    )
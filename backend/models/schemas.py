@@ -21,9 +21,19 @@ class NoteIn(BaseModel):
     meta: Optional[Dict[str, Any]] = None
 
 
+class MeetingIn(BaseModel):
+    text: str
+    title: Optional[str] = None
+    meta: Optional[Dict[str, Any]] = None
+
+
 class SearchIn(BaseModel):
     query: str
     k: Optional[int] = 6
+    expand_hops: int = Field(default=0, ge=0, le=2)
+    max_expansion: int = Field(default=4, ge=0, le=20)
+    # Workspaces of the caller's tenant to search ("*" for all); default: the request's workspace
+    workspaces: Optional[List[str]] = Field(default=None, max_length=32)
 
 
 # Output models
@@ -57,6 +67,10 @@ class NoteOut(BaseModel):
 class CitationInfo(BaseModel):
     note_id: UUID4
     snippet: str
+    title: Optional[str] = None
+    chunk_id: Optional[UUID4] = None
+    start_char: Optional[int] = None
+    end_char: Optional[int] = None
 
 
 class SearchOut(BaseModel):
@@ -83,3 +97,61 @@ class NoteEmbedResponse(BaseModel):
 class NoteDetailOut(NoteOut):
     tasks: List[TaskItem] = []
     related_links: List[LinkInfo] = []
+
+
+# Graph analytics models
+class GraphAnalyticsOut(BaseModel):
+    nodes: int
+    edges: int
+    components: int
+    communities: int
+    orphans: int
+    pagerank_iterations: int
+    community_iterations: int
+
+
+class NoteRankOut(BaseModel):
+    id: UUID4
+    title: Optional[str] = None
+    pagerank: Optional[float] = None
+    component_id: Optional[int] = None
+    community_id: Optional[int] = None
+
+
+class RelinkOut(BaseModel):
+    notes: int
+    links: int
+    seconds: float
+
+
+class TranscribeOut(BaseModel):
+    transcript: str
+    segments: int
+    backend: str = "api"
+    real_time_factor: Optional[float] = None
+    cached: bool = False
+    summary: Optional[SummarizeOut] = None
+    tasks: List[TaskItem] = []
+
+
+class MeetingOut(BaseModel):
+    note_id: UUID4
+    summary: SummarizeOut
+    tasks: List[TaskItem]
+    chunks_indexed: int
+
+
+# Health models
+class ProbeResult(BaseModel):
+    status: str
+    latency_ms: float
+    detail: Optional[str] = None
+    data: Dict[str, Any] = {}
+    critical: bool = True
+    cached: bool = False
+
+
+class ReadinessOut(BaseModel):
+    status: str
+    ready: bool
+    checks: Dict[str, ProbeResult]
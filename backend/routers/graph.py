@@ -0,0 +1,114 @@
+import uuid
+from typing import Any, Dict, List
+
+from fastapi import APIRouter, HTTPException, Depends, Path
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from models.schemas import GraphAnalyticsOut, NoteRankOut, RelinkOut
+from services.database import get_session, get_central_notes, get_community_notes, list_orphan_notes
+from services.graph import get_graph_data, relink_all_notes, DEFAULT_TOP_K
+from services.graph_analytics import compute_graph_analytics
+from services.serialization import json_response
+from services.tenancy import Scope, get_scope
+
+router = APIRouter(prefix="/graph", tags=["graph"])
+
+
+@router.get("")
+async def get_graph(
+    session: AsyncSession = Depends(get_session),
+    scope: Scope = Depends(get_scope),
+    limit: int = 100
+) -> Dict[str, Any]:
+    """
+    Get nodes and edges for graph visualization
+    """
+    try:
+        return await get_graph_data(session, limit, scope=scope)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error getting graph: {str(e)}")
+
+
+@router.post("/analytics", response_model=GraphAnalyticsOut)
+async def run_graph_analytics(
+    incremental: bool = True,
+    session: AsyncSession = Depends(get_session),
+    scope: Scope = Depends(get_scope)
+):
+    """
+    Recompute PageRank, components and communities over the scope's links
+    """
+    try:
+        stats = await compute_graph_analytics(session, incremental=incremental, scope=scope)
+        return GraphAnalyticsOut(**stats)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error computing graph analytics: {str(e)}")
+
+
+@router.post("/relink-all", response_model=RelinkOut)
+async def relink_all(
+    k: int = DEFAULT_TOP_K,
+    session: AsyncSession = Depends(get_session),
+    scope: Scope = Depends(get_scope)
+):
+    """
+    Recompute top-k links for every note of the scope in one vectorized pass
+    """
+    try:
+        stats = await relink_all_notes(session, k=k, scope=scope)
+        return RelinkOut(**stats)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error relinking notes: {str(e)}")
+
+
+@router.get("/central", response_model=List[NoteRankOut])
+async def central_notes(
+    session: AsyncSession = Depends(get_session),
+    scope: Scope = Depends(get_scope),
+    limit: int = 10
+):
+    """
+    Get the most central notes (hubs) by PageRank
+    """
+    try:
+        notes = await get_central_notes(session, limit, scope=scope)
+        return json_response(List[NoteRankOut], notes)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error getting central notes: {str(e)}")
+
+
+@router.get("/orphans", response_model=List[NoteRankOut])
+async def orphan_notes(
+    session: AsyncSession = Depends(get_session),
+    scope: Scope = Depends(get_scope),
+    limit: int = 100
+):
+    """
+    Get notes without any semantic links
+    """
+    try:
+        notes = await list_orphan_notes(session, limit, scope=scope)
+        return json_response(List[NoteRankOut], notes)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error getting orphan notes: {str(e)}")
+
+
+@router.get("/notes/{note_id}/cluster", response_model=List[NoteRankOut])
+async def note_cluster(
+    note_id: uuid.UUID = Path(...),
+    session: AsyncSession = Depends(get_session),
+    scope: Scope = Depends(get_scope),
+    limit: int = 50
+):
+    """
+    Get the community a note belongs to, most central notes first
+    """
+    try:
+        notes = await get_community_notes(session, note_id, limit, scope=scope)
+        if not notes:
+            raise HTTPException(status_code=404, detail=f"No cluster found for note {note_id}")
+        return json_response(List[NoteRankOut], notes)
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error getting note cluster: {str(e)}")
@@ -0,0 +1,41 @@
+from typing import Any, Dict
+
+from fastapi import APIRouter, Response
+
+from models.schemas import ReadinessOut
+from services.health import readiness
+
+router = APIRouter(prefix="/health", tags=["health"])
+
+
+@router.get("")
+async def health_check(deep: bool = False) -> Dict[str, Any]:
+    """
+    Report every dependency check (always 200; use /health/ready for routing)
+    """
+    return ReadinessOut(**await readiness(deep=deep)).model_dump()
+
+
+@router.get("/live")
+async def liveness() -> Dict[str, str]:
+    """
+    Liveness probe: the process is up and its event loop is responding
+    """
+    return {"status": "ok"}
+
+
+@router.get("/ready", response_model=ReadinessOut)
+async def readiness_probe(
+    response: Response,
+    deep: bool = False
+):
+    """
+    Readiness probe: 503 until Postgres and the vector index respond
+    
+    Each check reports its latency and is cached for HEALTH_CACHE_SECONDS.
+    Pass deep=true to also probe the embedding backend.
+    """
+    result = await readiness(deep=deep)
+    if not result["ready"]:
+        response.status_code = 503
+    return ReadinessOut(**result)
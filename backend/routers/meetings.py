@@ -0,0 +1,91 @@
+import asyncio
+import logging
+
+from fastapi import APIRouter, HTTPException, Depends
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from models.schemas import MeetingIn, MeetingOut, SummarizeOut, TaskItem
+from services.llm import build_meeting_chain
+from services.retriever import process_and_index_note, remove_note_vectors, uses_chunk_store
+from services.database import get_session, stage_note_with_tasks
+from services.tenancy import Scope, get_scope
+
+router = APIRouter(prefix="/meetings", tags=["meetings"])
+
+# Configure logger
+logger = logging.getLogger(__name__)
+
+
+@router.post("/process", response_model=MeetingOut)
+async def process_meeting(
+    data: MeetingIn,
+    session: AsyncSession = Depends(get_session),
+    scope: Scope = Depends(get_scope)
+):
+    """
+    Summarize a meeting, extract its tasks and store everything in one pass.
+    
+    Each chunk is sent to the LLM once for bullets, decisions and tasks
+    together (instead of separate /summarize and /tasks/extract calls). The
+    note, its tasks and (with VECTOR_STORE=postgres) its chunks are committed
+    in one transaction. Other vector stores are written before the commit and
+    cleaned up if it fails.
+    
+    Returns:
+        - ID of the stored note
+        - Summary with highlights, decisions and action items
+        - Merged task list
+        - Number of chunks indexed
+    """
+    if not data.text.strip():
+        raise HTTPException(status_code=400, detail="Text content is required")
+    
+    note = None
+    try:
+        # Run the map-reduce chain off the event loop
+        meeting_chain = build_meeting_chain()
+        result = await asyncio.to_thread(meeting_chain, data.text)
+        
+        tasks = [TaskItem(**t) if isinstance(t, dict) else t for t in result.get("tasks", [])]
+        
+        # Stage note and tasks, index embeddings, then commit together
+        note = await stage_note_with_tasks(
+            session,
+            {"title": data.title, "body": data.text},
+            tasks,
+            scope=scope
+        )
+        chunks_indexed = await process_and_index_note(
+            text=data.text,
+            note_id=str(note.id),
+            metadata=data.meta,
+            session=session,
+            scope=scope
+        )
+        await session.commit()
+        
+        for task in tasks:
+            task.source_note_id = note.id
+        
+        return MeetingOut(
+            note_id=note.id,
+            summary=SummarizeOut(
+                summary=result.get("summary", ""),
+                highlights=result.get("highlights", []),
+                decisions=result.get("decisions", []),
+                action_items=result.get("action_items", [])
+            ),
+            tasks=tasks,
+            chunks_indexed=chunks_indexed
+        )
+    except Exception as e:
+        await session.rollback()
+        if note is not None and not uses_chunk_store(session):
+            # The rolled-back note may have left vectors in a non-transactional store
+            try:
+                await remove_note_vectors([note.id], scope=scope)
+            except Exception as cleanup_error:
+                logger.error(
+                    f"Could not remove vectors of rolled-back note {note.id}: {cleanup_error}"
+                )
+        raise HTTPException(status_code=500, detail=f"Error processing meeting: {str(e)}")
@@ -1,39 +1,56 @@
 import uuid
+import logging
 from typing import List
 
-from fastapi import APIRouter, HTTPException, Depends, Path
+from fastapi import APIRouter, BackgroundTasks, HTTPException, Depends, Path, Response
 from sqlalchemy.ext.asyncio import AsyncSession
 
-from models.schemas import NoteIn, NoteOut, NoteDetailOut, NoteEmbedResponse, LinkInfo, TaskItem
-from services.database import get_session, save_note, get_note, list_notes, get_tasks_by_note
-from services.retriever import process_and_index_note
+from models.schemas import NoteIn, NoteOut, NoteDetailOut, NoteEmbedResponse
+from services.database import (
+    get_session, save_note, get_note, delete_note, list_notes, get_tasks_by_note
+)
+from services.serialization import json_response
+from services.retriever import (
+    compact_vectors, process_and_index_note, remove_note_vectors, uses_chunk_store
+)
 from services.graph import link_related_notes
+from services.tenancy import Scope, get_scope
+from services.tracing import span
 
 router = APIRouter(prefix="/notes", tags=["notes"])
 
+# Configure logger
+logger = logging.getLogger(__name__)
+
 
 @router.post("/embed", response_model=NoteEmbedResponse)
 async def embed_note(
     data: NoteIn,
-    session: AsyncSession = Depends(get_session)
+    session: AsyncSession = Depends(get_session),
+    scope: Scope = Depends(get_scope)
 ):
     """
     Embed note text into vector store and create semantic links
     """
     try:
-        # Index the note in the vector store
+        # Index the note in the vector store (chunks table rows join this session's transaction)
         chunks_indexed = await process_and_index_note(
             text=data.text,
             note_id=str(data.note_id),
-            metadata=data.meta
+            metadata=data.meta,
+            session=session,
+            scope=scope
         )
         
         # Generate links to related notes
-        links = await link_related_notes(
-            session=session,
-            note_id=data.note_id,
-            k=5
-        )
+        with span("ingest.link"):
+            links = await link_related_notes(
+                session=session,
+                note_id=data.note_id,
+                k=5,
+                scope=scope
+            )
+        await session.commit()
         
         return NoteEmbedResponse(
             chunks_indexed=chunks_indexed,
@@ -46,6 +63,7 @@ async def embed_note(
 @router.get("", response_model=List[NoteOut])
 async def get_notes(
     session: AsyncSession = Depends(get_session),
+    scope: Scope = Depends(get_scope),
     skip: int = 0,
     limit: int = 20
 ):
@@ -53,18 +71,10 @@ async def get_notes(
     Get a list of notes with pagination
     """
     try:
-        notes = await list_notes(session, skip, limit)
+        notes = await list_notes(session, skip, limit, scope=scope)
         
-        return [
-            NoteOut(
-                id=note.id,
-                title=note.title,
-                body=note.body,
-                created_at=note.created_at,
-                updated_at=note.updated_at
-            )
-            for note in notes
-        ]
+        # Serialize the rows once, straight from their attributes
+        return json_response(List[NoteOut], notes)
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error getting notes: {str(e)}")
 
@@ -72,43 +82,35 @@ async def get_notes(
 @router.get("/{note_id}", response_model=NoteDetailOut)
 async def get_note_detail(
     note_id: uuid.UUID = Path(...),
-    session: AsyncSession = Depends(get_session)
+    session: AsyncSession = Depends(get_session),
+    scope: Scope = Depends(get_scope)
 ):
     """
     Get detailed information about a note, including tasks and links
     """
     try:
         # Get the note
-        note = await get_note(session, note_id)
+        note = await get_note(session, note_id, scope=scope)
         
         if not note:
             raise HTTPException(status_code=404, detail=f"Note {note_id} not found")
         
         # Get tasks for this note
-        tasks = await get_tasks_by_note(session, note_id)
+        tasks = await get_tasks_by_note(session, note_id, scope=scope)
         
         # Get related links
-        links = await link_related_notes(session, note_id)
+        links = await link_related_notes(session, note_id, scope=scope)
         
         # Create response
-        return NoteDetailOut(
-            id=note.id,
-            title=note.title,
-            body=note.body,
-            created_at=note.created_at,
-            updated_at=note.updated_at,
-            tasks=[
-                TaskItem(
-                    description=task.description,
-                    due_date=task.due_date,
-                    owner=task.owner,
-                    source_note_id=task.source_note_id,
-                    completed=task.completed
-                )
-                for task in tasks
-            ],
-            related_links=links
-        )
+        return json_response(NoteDetailOut, {
+            "id": note.id,
+            "title": note.title,
+            "body": note.body,
+            "created_at": note.created_at,
+            "updated_at": note.updated_at,
+            "tasks": tasks,
+            "related_links": links,
+        })
     except HTTPException:
         raise
     except Exception as e:
@@ -118,21 +120,63 @@ async def get_note_detail(
 @router.post("", response_model=NoteOut)
 async def create_note(
     note_data: dict,
-    session: AsyncSession = Depends(get_session)
+    session: AsyncSession = Depends(get_session),
+    scope: Scope = Depends(get_scope)
 ):
     """
-    Create a new note
+    Create a new note, or update the note with the given "id"
     """
     try:
+        previous_body = None
+        if note_data.get("id"):
+            previous = await get_note(session, uuid.UUID(str(note_data["id"])), scope=scope)
+            previous_body = previous.body if previous else None
+        
         # Save the note
-        note = await save_note(session, note_data)
+        note = await save_note(session, note_data, scope=scope)
         
-        return NoteOut(
-            id=note.id,
-            title=note.title,
-            body=note.body,
-            created_at=note.created_at,
-            updated_at=note.updated_at
-        )
+        if previous_body is not None and note.body != previous_body:
+            # Chunks of the old body no longer match the note; /notes/embed indexes the new one
+            await remove_note_vectors([note.id], session=session, scope=scope)
+            await session.commit()
+        
+        return json_response(NoteOut, note)
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error creating note: {str(e)}")
+
+
+@router.delete("/{note_id}", status_code=204)
+async def remove_note(
+    background_tasks: BackgroundTasks,
+    note_id: uuid.UUID = Path(...),
+    session: AsyncSession = Depends(get_session),
+    scope: Scope = Depends(get_scope)
+):
+    """
+    Delete a note with its tasks, links and indexed chunks
+    """
+    try:
+        if not await delete_note(session, note_id, scope=scope):
+            raise HTTPException(status_code=404, detail=f"Note {note_id} not found")
+        
+        if uses_chunk_store(session):
+            # Chunks are deleted in the note's transaction
+            await remove_note_vectors([note_id], session=session, scope=scope)
+            await session.commit()
+        else:
+            # Tombstone only once the delete is committed, so a failed commit leaves
+            # the note searchable
+            await session.commit()
+            try:
+                await remove_note_vectors([note_id], scope=scope)
+            except Exception as e:
+                logger.error(f"Could not remove vectors of deleted note {note_id}: {e}")
+        
+        # Rebuild the local index once enough of it is tombstoned
+        background_tasks.add_task(compact_vectors, scope=scope)
+        return Response(status_code=204)
+    except HTTPException:
+        raise
+    except Exception as e:
+        await session.rollback()
+        raise HTTPException(status_code=500, detail=f"Error deleting note: {str(e)}")
@@ -0,0 +1,50 @@
+import re
+import asyncio
+from typing import Any, Dict, List, Optional
+
+from fastapi import APIRouter, Depends, Header, HTTPException, Query
+from fastapi.responses import PlainTextResponse
+
+from services import profiling
+from services.profiling import check_admin_token, get_profile_store
+
+router = APIRouter(prefix="/admin/profiles", tags=["admin"])
+
+PROFILE_ID_PATTERN = re.compile(r"^[0-9a-f]{1,32}$")
+
+
+def require_admin(x_profile_token: Optional[str] = Header(None)) -> None:
+    """Admin endpoints need PROFILE_ADMIN_TOKEN; they do not exist when it is unset"""
+    if not profiling.PROFILE_ADMIN_TOKEN:
+        raise HTTPException(status_code=404, detail="Not Found")
+    if not check_admin_token(x_profile_token):
+        raise HTTPException(status_code=403, detail="Invalid profile token")
+
+
+@router.get("", dependencies=[Depends(require_admin)])
+async def list_profiles(limit: int = Query(50, ge=1, le=500)) -> List[Dict[str, Any]]:
+    """
+    Stored request profiles, newest first
+    """
+    return await asyncio.to_thread(get_profile_store().list, limit)
+
+
+@router.get("/{profile_id}", dependencies=[Depends(require_admin)])
+async def get_profile(profile_id: str, format: str = Query("json", pattern="^(json|collapsed)$")):
+    """
+    One request profile: stage timings, spans, hottest frames and sampled stacks
+    
+    format=collapsed returns the stacks in the folded format read by
+    flamegraph.pl and speedscope.
+    """
+    if not PROFILE_ID_PATTERN.match(profile_id):
+        raise HTTPException(status_code=404, detail="Profile not found")
+    
+    report = await asyncio.to_thread(get_profile_store().get, profile_id)
+    if report is None:
+        raise HTTPException(status_code=404, detail="Profile not found")
+    
+    if format == "collapsed":
+        stacks = report["stacks"].items()
+        return PlainTextResponse("".join(f"{stack} {count}\n" for stack, count in stacks))
+    return report
@@ -1,28 +1,50 @@
 import re
+import json
 import uuid
-from typing import List
+import asyncio
+import logging
+from typing import Dict, List, Optional, Tuple
 
 from fastapi import APIRouter, HTTPException, Depends
+from langchain_core.documents import Document
 from sqlalchemy.ext.asyncio import AsyncSession
 
 from models.schemas import SearchIn, SearchOut, CitationInfo
 from services.llm import build_qa_chain
-from services.retriever import make_retriever
-from services.database import get_session
+from services.retriever import make_retriever, uses_chunk_store
+from services.graph import GraphExpandedRetriever
+from services.database import async_session, get_session, get_note_titles, list_workspaces
+from services.cache import sha256_text
+from services.coalesce import SingleFlight, normalize_query
+from services.tenancy import DEFAULT_SCOPE, Scope, get_scope, shard_scopes
+from services.tracing import span
 
 router = APIRouter(prefix="/search", tags=["search"])
 
+# Configure logger
+logger = logging.getLogger(__name__)
+
 # Regex to extract citations in the format [note_id:UUID]
 CITATION_PATTERN = r'\[note_id:([0-9a-fA-F-]+)\]'
 
+# Maximum length of a citation snippet taken from the source chunk
+CITATION_SNIPPET_CHARS = 300
+
+# Concurrent identical queries share one retrieval and generation
+answer_flight = SingleFlight("search_answer")
+
 
 @router.post("/query", response_model=SearchOut)
 async def search_query(
     data: SearchIn,
-    session: AsyncSession = Depends(get_session)
+    session: AsyncSession = Depends(get_session),
+    scope: Scope = Depends(get_scope)
 ):
     """
     Perform semantic search and generate an answer with citations
+    
+    Searches the request's workspace, or the given workspaces of its tenant
+    (each a separate shard, searched concurrently and merged).
     """
     try:
         # Validate input
@@ -31,54 +53,164 @@ async def search_query(
         
         # Set default k if not provided
         k = data.k if data.k is not None else 6
+        scopes = await search_scopes(data, scope, session)
         
-        # Get retriever
-        retriever = make_retriever(k=k)
-        
-        # Build QA chain
-        qa_chain = build_qa_chain(retriever)
+        # Concurrent requests for the same normalized query in the same scopes join one answer
+        key = sha256_text(json.dumps(
+            [normalize_query(data.query), k, data.expand_hops, data.max_expansion, scopes]
+        ))
+        answer, sources = await answer_flight.do(key, lambda: answer_query_shared(data, k, scopes))
         
-        # Get answer
-        answer = qa_chain(data.query)
-        
-        # Extract citations
-        citations = extract_citations(answer)
+        # Resolve citations against the retrieved chunks
+        with span("rag.citations", sources=len(sources)):
+            citations = await resolve_citations(answer, sources, session, scopes)
         
         return SearchOut(
             answer=answer,
             citations=citations
         )
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error processing search query: {str(e)}")
 
 
-def extract_citations(text: str) -> List[CitationInfo]:
+async def search_scopes(data: SearchIn, scope: Scope, session: AsyncSession) -> List[Scope]:
+    """Scopes a search covers: the request's workspace or the listed workspaces of its tenant"""
+    workspaces = data.workspaces
+    if workspaces and "*" in workspaces:
+        workspaces = await list_workspaces(session, scope.tenant_id) or [scope.workspace_id]
+    return shard_scopes(scope, workspaces)
+
+
+async def answer_query_shared(
+    data: SearchIn,
+    k: int,
+    scopes: List[Scope]
+) -> Tuple[str, List[Document]]:
     """
-    Extract citation references from text in the format [note_id:UUID]
-    and convert them to CitationInfo objects
+    answer_query on a session of its own
+    
+    The work is shared by every coalesced caller and outlives any one of
+    them, so it must not use a request's session, which is closed when that
+    request ends or its client disconnects.
     """
-    citations = []
+    async with async_session() as session:
+        return await answer_query(data, k, session, scopes)
+
+
+async def answer_query(
+    data: SearchIn,
+    k: int,
+    session: AsyncSession,
+    scopes: List[Scope]
+) -> Tuple[str, List[Document]]:
+    """Retrieve context and generate the answer for a search request, with the retrieved chunks"""
+    # Get retriever (scatter-gather when several workspaces are searched)
+    retriever = make_retriever(k=k, session=session, scope=scopes)
     
-    # Find all citation matches
-    matches = re.finditer(CITATION_PATTERN, text)
+    if data.expand_hops > 0:
+        # Expand top hits along stored links before answering
+        retriever = GraphExpandedRetriever(
+            base_retriever=retriever,
+            session=session,
+            scopes=scopes,
+            hops=data.expand_hops,
+            max_expansion=data.max_expansion
+        )
+        qa_chain = build_qa_chain(retriever, asynchronous=True, return_sources=True)
+        return await qa_chain(data.query)
+    
+    if uses_chunk_store(session):
+        # The chunks table is searched on this request's session
+        qa_chain = build_qa_chain(retriever, asynchronous=True, return_sources=True)
+        return await qa_chain(data.query)
+    
+    # Build QA chain and answer on a worker thread
+    qa_chain = build_qa_chain(retriever, return_sources=True)
+    return await asyncio.to_thread(qa_chain, data.query)
+
+
+def extract_citation_ids(text: str) -> List[uuid.UUID]:
+    """
+    Extract the note IDs cited in text in the format [note_id:UUID]
     
-    for match in matches:
+    Each ID appears once, in order of first citation; invalid UUIDs are skipped.
+    """
+    note_ids = []
+    for match in re.finditer(CITATION_PATTERN, text):
+        try:
+            note_id = uuid.UUID(match.group(1))
+        except ValueError:
+            continue
+        if note_id not in note_ids:
+            note_ids.append(note_id)
+    return note_ids
+
+
+def source_chunks_by_note(sources: List[Document]) -> Dict[uuid.UUID, Document]:
+    """Best-ranked retrieved chunk of each note (retrievers return best first)"""
+    chunks = {}
+    for doc in sources:
         try:
-            note_id_str = match.group(1)
-            note_id = uuid.UUID(note_id_str)
-            
-            # Extract a snippet of context (up to 100 chars before the citation)
-            start_pos = max(0, match.start() - 100)
-            end_pos = match.start()
-            snippet = text[start_pos:end_pos].strip()
-            
-            citation = CitationInfo(
-                note_id=note_id,
-                snippet=snippet
-            )
-            citations.append(citation)
+            note_id = uuid.UUID(str(doc.metadata.get("note_id")))
         except ValueError:
-            # Skip invalid UUIDs
             continue
+        chunks.setdefault(note_id, doc)
+    return chunks
+
+
+def chunk_offsets(doc: Document) -> Tuple[Optional[int], Optional[int]]:
+    """
+    Character offsets of a chunk within its note
     
+    The chunks table stores start_char/end_char; splitter chunks in FAISS
+    or Pinecone carry start_index. Chunks indexed without either have none.
+    """
+    start = doc.metadata.get("start_char", doc.metadata.get("start_index"))
+    if start is None:
+        return None, None
+    end = doc.metadata.get("end_char", int(start) + len(doc.page_content))
+    return int(start), int(end)
+
+
+async def resolve_citations(
+    answer: str,
+    sources: List[Document],
+    session: AsyncSession,
+    scopes: Optional[List[Scope]] = None
+) -> List[CitationInfo]:
+    """
+    Turn [note_id:UUID] markers into de-duplicated citations of retrieved chunks
+    
+    IDs that were not among the retrieved chunks are dropped, since the
+    answer cannot have been grounded in them. Titles of every cited note
+    are fetched in one batched query; snippets and offsets come from the
+    source chunk itself.
+    """
+    chunks = source_chunks_by_note(sources)
+    cited = []
+    for note_id in extract_citation_ids(answer):
+        if note_id in chunks:
+            cited.append(note_id)
+        else:
+            logger.debug(f"Dropping citation of note {note_id}, which was not retrieved")
+    if not cited:
+        return []
+    
+    titles = await get_note_titles(session, cited, scope=scopes or [DEFAULT_SCOPE])
+    
+    citations = []
+    for note_id in cited:
+        doc = chunks[note_id]
+        start, end = chunk_offsets(doc)
+        chunk_id = doc.metadata.get("chunk_id")
+        citations.append(CitationInfo(
+            note_id=note_id,
+            snippet=doc.page_content[:CITATION_SNIPPET_CHARS].strip(),
+            title=titles.get(note_id, doc.metadata.get("title")),
+            chunk_id=uuid.UUID(chunk_id) if chunk_id else None,
+            start_char=start,
+            end_char=end
+        ))
     return citations
@@ -1,17 +1,26 @@
+import asyncio
+
 from fastapi import APIRouter, HTTPException
 from pydantic import ValidationError
 
 from models.schemas import SummarizeIn, SummarizeOut
 from services.llm import build_summarization_chain
+from services.cache import sha256_text
+from services.coalesce import SingleFlight
 
 router = APIRouter(prefix="/summarize", tags=["summarization"])
 
+# Concurrent requests for the same text share one summarization
+summarize_flight = SingleFlight("summarize")
+
 
 @router.post("", response_model=SummarizeOut)
 async def summarize_text(data: SummarizeIn):
     """
     Summarize text content using map-reduce summarization.
     
+    Concurrent requests with identical text share a single run.
+    
     Returns:
         - Summary text
         - Key highlights
@@ -26,8 +35,11 @@ async def summarize_text(data: SummarizeIn):
         # Get summarization chain
         summarize_chain = build_summarization_chain()
         
-        # Process the text
-        result = summarize_chain(data.text)
+        # Process the text on a worker thread, joining an identical in-flight run
+        result = await summarize_flight.do(
+            sha256_text(data.text),
+            lambda: asyncio.to_thread(summarize_chain, data.text)
+        )
         
         # Return formatted output
         return SummarizeOut(
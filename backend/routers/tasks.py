@@ -5,7 +5,9 @@ from typing import List, Optional
 
 from models.schemas import TaskExtractIn, TaskExtractOut, TaskItem
 from services.llm import build_task_chain
-from services.database import get_session, save_tasks, update_task
+from services.database import get_session, in_scope, save_tasks, update_task
+from services.serialization import json_response
+from services.tenancy import Scope, get_scope
 
 router = APIRouter(prefix="/tasks", tags=["tasks"])
 
@@ -13,7 +15,8 @@ router = APIRouter(prefix="/tasks", tags=["tasks"])
 @router.post("/extract", response_model=TaskExtractOut)
 async def extract_tasks(
     data: TaskExtractIn,
-    session: AsyncSession = Depends(get_session)
+    session: AsyncSession = Depends(get_session),
+    scope: Scope = Depends(get_scope)
 ):
     """
     Extract tasks from text content.
@@ -44,8 +47,8 @@ async def extract_tasks(
         if data.source_note_id:
             for task in tasks:
                 task.source_note_id = data.source_note_id
-                
-            await save_tasks(session, tasks)
+            
+            await save_tasks(session, tasks, scope=scope)
         
         return TaskExtractOut(tasks=tasks)
     except Exception as e:
@@ -56,6 +59,7 @@ async def extract_tasks(
 async def list_tasks(
     completed: Optional[bool] = None,
     session: AsyncSession = Depends(get_session),
+    scope: Scope = Depends(get_scope),
     limit: int = 50,
     offset: int = 0
 ):
@@ -67,27 +71,18 @@ async def list_tasks(
     
     try:
         # Build query
-        query = select(Task).offset(offset).limit(limit)
+        query = select(Task).where(in_scope(Task, scope)).offset(offset).limit(limit)
         
         # Apply filter if completed status is specified
         if completed is not None:
             query = query.where(Task.completed == completed)
-            
+        
         # Execute query
         result = await session.execute(query)
         tasks = result.scalars().all()
         
-        # Convert to response models
-        return [
-            TaskItem(
-                description=task.description,
-                due_date=task.due_date,
-                owner=task.owner,
-                source_note_id=task.source_note_id,
-                completed=task.completed
-            )
-            for task in tasks
-        ]
+        # Serialize the rows once, straight from their attributes
+        return json_response(List[TaskItem], tasks)
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error listing tasks: {str(e)}")
 
@@ -96,26 +91,21 @@ async def list_tasks(
 async def update_task_status(
     task_id: uuid.UUID = Path(...),
     completed: Optional[bool] = None,
-    session: AsyncSession = Depends(get_session)
+    session: AsyncSession = Depends(get_session),
+    scope: Scope = Depends(get_scope)
 ):
     """
     Update a task's status
     """
     try:
         # Update task
-        updated_task = await update_task(session, task_id, {"completed": completed})
+        updated_task = await update_task(session, task_id, {"completed": completed}, scope=scope)
         
         if not updated_task:
             raise HTTPException(status_code=404, detail=f"Task {task_id} not found")
         
         # Return updated task
-        return TaskItem(
-            description=updated_task.description,
-            due_date=updated_task.due_date,
-            owner=updated_task.owner,
-            source_note_id=updated_task.source_note_id,
-            completed=updated_task.completed
-        )
+        return json_response(TaskItem, updated_task)
     except HTTPException:
         raise
     except Exception as e:
@@ -0,0 +1,102 @@
+import asyncio
+import os
+import uuid
+from pathlib import Path as FilePath
+from typing import Optional
+
+from fastapi import APIRouter, HTTPException, Depends, Request
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from models.schemas import TranscribeOut, SummarizeOut, TaskItem
+from services.llm import build_summarization_chain, build_task_chain
+from services.speech import (
+    cache_transcription, get_cached_transcription, save_upload_stream, transcribe_file_async
+)
+from services.database import get_session, save_tasks
+from services.tenancy import Scope, get_scope
+
+router = APIRouter(prefix="/transcribe", tags=["transcription"])
+
+
+@router.post("", response_model=TranscribeOut)
+async def transcribe_upload(
+    request: Request,
+    filename: str = "audio.mp3",
+    summarize: bool = True,
+    extract_tasks: bool = True,
+    source_note_id: Optional[uuid.UUID] = None,
+    session: AsyncSession = Depends(get_session),
+    scope: Scope = Depends(get_scope)
+):
+    """
+    Transcribe an audio upload sent as the raw request body.
+    
+    The body is streamed to disk chunk by chunk, split into segments that are
+    transcribed concurrently, and the transcript is then summarized and
+    mined for tasks in parallel. Transcripts are cached by audio SHA-256,
+    backend and model, and the chains serve repeated LLM calls from the LLM
+    response cache, so repeat uploads skip the models.
+    
+    Returns:
+        - Transcript text and segment count
+        - Summary (if summarize is set)
+        - Extracted tasks (if extract_tasks is set)
+    """
+    suffix = FilePath(filename).suffix or ".mp3"
+    audio_path, audio_hash = await save_upload_stream(request.stream(), suffix=suffix)
+    
+    try:
+        if os.path.getsize(audio_path) == 0:
+            raise HTTPException(status_code=400, detail="Audio content is required")
+        
+        result = get_cached_transcription(audio_hash)
+        cached = result is not None
+        if not cached:
+            result = await transcribe_file_async(audio_path)
+            cache_transcription(audio_hash, result)
+        transcript = result["transcript"]
+        
+        # Run summarization and task extraction side by side
+        summary_job = (
+            asyncio.to_thread(build_summarization_chain(), transcript)
+            if summarize else asyncio.sleep(0, result=None)
+        )
+        tasks_job = (
+            asyncio.to_thread(build_task_chain(), transcript)
+            if extract_tasks else asyncio.sleep(0, result=None)
+        )
+        summary_result, task_result = await asyncio.gather(summary_job, tasks_job)
+        
+        summary = SummarizeOut(
+            summary=summary_result.get("summary", ""),
+            highlights=summary_result.get("highlights", []),
+            decisions=summary_result.get("decisions", []),
+            action_items=summary_result.get("action_items", [])
+        ) if summary_result else None
+        
+        tasks = [
+            TaskItem(**t) if isinstance(t, dict) else t
+            for t in (task_result or {}).get("tasks", [])
+        ]
+        
+        # If source_note_id is provided, save tasks to database
+        if source_note_id and tasks:
+            for task in tasks:
+                task.source_note_id = source_note_id
+            await save_tasks(session, tasks, scope=scope)
+        
+        return TranscribeOut(
+            transcript=transcript,
+            segments=result["segments"],
+            backend=result.get("backend", "api"),
+            real_time_factor=result.get("real_time_factor"),
+            cached=cached,
+            summary=summary,
+            tasks=tasks
+        )
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error transcribing audio: {str(e)}")
+    finally:
+        os.remove(audio_path)
@@ -0,0 +1,228 @@
+"""
+Compare the Markdown-aware token chunker with the previous character splitter.
+Reports chunk counts, embedded tokens, chunks cut mid-sentence and retrieval hit@k
+on Markdown notes from the database, a directory, or synthetic meeting notes.
+"""
+
+import argparse
+import asyncio
+import math
+import os
+import re
+import sys
+from collections import Counter
+from typing import Dict, List, Tuple
+
+import numpy as np
+
+# Add the parent directory to the sys path to import from the application
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from langchain_text_splitters import RecursiveCharacterTextSplitter
+
+from services.chunking import (
+    CHUNK_TOKENS, CHUNK_OVERLAP_TOKENS, MarkdownTokenChunker, count_tokens, parse_blocks
+)
+
+SECTIONS = ["Attendees", "Agenda", "Discussion", "Decisions", "Action Items"]
+
+
+def synthetic_notes(n: int, seed: int = 0) -> List[str]:
+    """Meeting notes with headings, lists and paragraphs over a random vocabulary"""
+    rng = np.random.default_rng(seed)
+    letters = list("abcdefghijklmnopqrstuvwxyz")
+    vocab = ["".join(rng.choice(letters, size=rng.integers(3, 9))) for _ in range(3000)]
+    weights = 1.0 / np.arange(1, len(vocab) + 1)
+    weights /= weights.sum()
+    
+    def sentence() -> str:
+        words = rng.choice(vocab, size=rng.integers(8, 17), p=weights)
+        return " ".join(words).capitalize() + "."
+    
+    notes = []
+    for i in range(n):
+        lines = [f"# Meeting {i}", ""]
+        for section in SECTIONS:
+            lines += [f"## {section}", ""]
+            if section == "Discussion":
+                for _ in range(rng.integers(2, 6)):
+                    lines += [" ".join(sentence() for _ in range(rng.integers(3, 16))), ""]
+            else:
+                prefix = "1." if section == "Agenda" else "-"
+                lines += [f"{prefix} {sentence()}" for _ in range(rng.integers(2, 7))] + [""]
+        notes.append("\n".join(lines))
+    return notes
+
+
+async def load_note_texts() -> List[str]:
+    """Bodies of every stored note"""
+    from sqlalchemy import select
+    
+    from models.orm import Note
+    from services.database import async_session
+    
+    async with async_session() as session:
+        result = await session.execute(select(Note.body))
+        return [body for (body,) in result.all() if body]
+
+
+def character_chunks(text: str) -> List[Tuple[int, int]]:
+    """Spans produced by the previous splitter (1000 characters, 150 overlap)"""
+    splitter = RecursiveCharacterTextSplitter(
+        chunk_size=1000, chunk_overlap=150, add_start_index=True
+    )
+    return [
+        (doc.metadata["start_index"], doc.metadata["start_index"] + len(doc.page_content))
+        for doc in splitter.create_documents([text])
+    ]
+
+
+def token_chunks(text: str, max_tokens: int, overlap_tokens: int) -> List[Tuple[int, int]]:
+    spans = MarkdownTokenChunker(max_tokens, overlap_tokens).spans(text)
+    return [(start, end) for start, end, _, _ in spans]
+
+
+def facts(text: str, rng: np.random.Generator, per_note: int) -> List[Tuple[int, int]]:
+    """Spans of list items and sentences to be retrieved"""
+    spans = []
+    for block in parse_blocks(text):
+        if block.kind == "heading":
+            continue
+        body = text[block.start:block.end]
+        pattern = r"[^\n]+" if block.kind == "list" else r"[^.!?]+[.!?]"
+        spans += [
+            (
+                block.start + m.start() + len(m.group()) - len(m.group().lstrip()),
+                block.start + m.end()
+            )
+            for m in re.finditer(pattern, body)
+        ]
+    if len(spans) > per_note:
+        spans = [spans[i] for i in sorted(rng.choice(len(spans), size=per_note, replace=False))]
+    return spans
+
+
+def terms(text: str) -> List[str]:
+    return re.findall(r"\w+", text.lower())
+
+
+def bm25(
+    query: List[str],
+    docs: List[Counter],
+    lengths: np.ndarray,
+    idf: Dict[str, float]
+) -> np.ndarray:
+    """BM25 scores of a query against every chunk"""
+    k1, b = 1.2, 0.75
+    norm = k1 * (1 - b + b * lengths / lengths.mean())
+    scores = np.zeros(len(docs))
+    for term in set(query):
+        weight = idf.get(term)
+        if weight is None:
+            continue
+        tf = np.array([doc.get(term, 0) for doc in docs], dtype=float)
+        scores += weight * tf * (k1 + 1) / (tf + norm)
+    return scores
+
+
+def evaluate(texts: List[str], chunker, k: int, per_note: int, embeddings=None) -> Dict[str, float]:
+    """Chunk every text, then measure how often a top-k chunk contains each fact whole"""
+    rng = np.random.default_rng(7)
+    chunks = []  # (note index, start, end)
+    cuts = 0
+    for i, text in enumerate(texts):
+        for start, end in chunker(text):
+            chunks.append((i, start, end))
+            # A chunk ending mid-line and not after a sentence, splits a sentence or list item
+            cuts += text[end:end + 1] not in ("", "\n") and text[end - 1] not in ".!?"
+    chunk_texts = [texts[i][start:end] for i, start, end in chunks]
+    
+    queries = []
+    for i, text in enumerate(texts):
+        for start, end in facts(text, rng, per_note):
+            words = terms(text[start:end])
+            kept = [w for w in words if rng.random() > 0.3] or words
+            queries.append((i, start, end, " ".join(kept)))
+    
+    if embeddings is not None:
+        matrix = np.asarray(embeddings.embed_documents(chunk_texts), dtype=np.float32)
+        matrix /= np.maximum(np.linalg.norm(matrix, axis=1, keepdims=True), 1e-12)
+        query_vectors = np.asarray(
+            embeddings.embed_documents([q[3] for q in queries]), dtype=np.float32
+        )
+        all_scores = query_vectors @ matrix.T
+    else:
+        docs = [Counter(terms(text)) for text in chunk_texts]
+        lengths = np.array([sum(doc.values()) for doc in docs], dtype=float)
+        df = Counter(term for doc in docs for term in doc)
+        idf = {term: math.log(1 + (len(docs) - n + 0.5) / (n + 0.5)) for term, n in df.items()}
+        all_scores = [bm25(terms(q[3]), docs, lengths, idf) for q in queries]
+    
+    hits = 0
+    for (note, start, end, _), scores in zip(queries, all_scores, strict=True):
+        top = np.argsort(-np.asarray(scores))[:k]
+        hits += any(
+            chunks[j][0] == note and chunks[j][1] <= start and end <= chunks[j][2]
+            for j in top
+        )
+    
+    tokens = [count_tokens(text) for text in chunk_texts]
+    return {
+        "chunks": len(chunks),
+        "tokens": sum(tokens),
+        "mean_tokens": sum(tokens) / max(1, len(tokens)),
+        "mid_sentence_cuts": cuts / max(1, len(chunks)),
+        "hit_at_k": hits / max(1, len(queries)),
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--notes", action="store_true", help="Use every note in the database")
+    parser.add_argument("--dir", help="Directory of Markdown files")
+    parser.add_argument("--synthetic", type=int, default=200, help="Synthetic meeting note count")
+    parser.add_argument("--k", type=int, default=4, help="Chunks retrieved per query")
+    parser.add_argument("--facts", type=int, default=5, help="Queries per note")
+    parser.add_argument("--tokens", type=int, default=CHUNK_TOKENS, help="Token chunk size")
+    parser.add_argument("--overlap", type=int, default=CHUNK_OVERLAP_TOKENS,
+                        help="Token chunk overlap")
+    parser.add_argument("--embeddings", action="store_true",
+                        help="Retrieve with the configured embedding model instead of BM25")
+    args = parser.parse_args()
+    
+    if args.notes:
+        texts = asyncio.run(load_note_texts())
+    elif args.dir:
+        texts = [
+            open(os.path.join(args.dir, name), encoding="utf-8").read()
+            for name in sorted(os.listdir(args.dir))
+            if name.endswith(".md")
+        ]
+    else:
+        texts = synthetic_notes(args.synthetic)
+    
+    embeddings = None
+    if args.embeddings:
+        from services.embeddings import get_embeddings_model
+        embeddings = get_embeddings_model()
+    
+    splitters = [
+        ("chars 1000/150", character_chunks),
+        (
+            f"tokens {args.tokens}/{args.overlap}",
+            lambda text: token_chunks(text, args.tokens, args.overlap)
+        ),
+    ]
+    retrieval = "embeddings" if embeddings else "BM25"
+    print(f"{len(texts)} notes, {args.facts} queries per note, hit@{args.k} ({retrieval})")
+    print(
+        f"{'splitter':<18} {'chunks':>7} {'tokens':>9} {'tok/chunk':>10} "
+        f"{'mid-sentence':>14} {'hit@k':>7}"
+    )
+    for name, chunker in splitters:
+        result = evaluate(texts, chunker, args.k, args.facts, embeddings)
+        print(
+            f"{name:<18} {result['chunks']:>7} {result['tokens']:>9} "
+            f"{result['mean_tokens']:>10.0f} "
+            f"{result['mid_sentence_cuts']:>14.1%} {result['hit_at_k']:>7.3f}"
+        )
@@ -0,0 +1,106 @@
+"""
+Ingest process for VECTOR_STORE=segments.
+Indexes notes changed since the last published watermark into one new segment
+per pass, which every API worker memory-maps and swaps in without a restart.
+Each tenant workspace is a separate shard with its own segments and watermark.
+After each pass, shards whose share of deleted or superseded rows reached the
+compaction ratio are rewritten into dense segments.
+"""
+
+import argparse
+import asyncio
+import os
+import sys
+import time
+from datetime import datetime
+
+import numpy as np
+
+# Add the parent directory to the sys path to import from the application
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlalchemy import select
+
+from models.orm import Note
+from services.database import async_session, in_scope, list_scopes
+from services.embeddings import (
+    PINECONE_INDEX, create_chunks_from_text, get_embedding_backend, get_embeddings_model
+)
+from services.segment_index import VECTOR_COMPACT_RATIO, SegmentWriter, read_manifest, segment_root
+from services.tenancy import DEFAULT_SCOPE, Scope
+
+
+async def ingest_once(
+    writer: SegmentWriter,
+    index_name: str,
+    full: bool = False,
+    scope: Scope = DEFAULT_SCOPE
+) -> int:
+    """
+    Index every note of a scope updated after the watermark as one segment
+    
+    Returns the number of notes indexed.
+    """
+    watermark = None if full else read_manifest(writer.root).get("watermark")
+    
+    async with async_session() as session:
+        query = (
+            select(Note.id, Note.title, Note.body, Note.updated_at)
+            .where(in_scope(Note, scope))
+            .order_by(Note.updated_at)
+        )
+        if watermark:
+            query = query.where(Note.updated_at > datetime.fromisoformat(watermark))
+        notes = (await session.execute(query)).all()
+    if not notes:
+        return 0
+    
+    documents = []
+    for note in notes:
+        documents.extend(
+            create_chunks_from_text(note.body or "", str(note.id), {"title": note.title})
+        )
+    embeddings = get_embeddings_model(get_embedding_backend(index_name))
+    vectors = np.asarray(
+        await embeddings.aembed_documents([doc.page_content for doc in documents]),
+        dtype=np.float32
+    )
+    
+    name = writer.append(documents, vectors, watermark=notes[-1].updated_at.isoformat())
+    print(
+        f"Published {name} for {scope.tenant_id}/{scope.workspace_id}: "
+        f"{len(notes)} notes, {len(documents)} chunks"
+    )
+    return len(notes)
+
+
+async def run(index_name: str, full: bool, watch: float, compact_ratio: float):
+    while True:
+        started = time.perf_counter()
+        async with async_session() as session:
+            scopes = await list_scopes(session)
+        for scope in scopes:
+            writer = SegmentWriter(segment_root(index_name, scope))
+            await ingest_once(writer, index_name, full, scope)
+            summary = await asyncio.to_thread(writer.compact, compact_ratio)
+            if summary:
+                print(f"Compacted {scope.tenant_id}/{scope.workspace_id}: {summary}")
+        full = False
+        if watch <= 0:
+            return
+        await asyncio.sleep(max(0.0, watch - (time.perf_counter() - started)))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--index", default=PINECONE_INDEX,
+                        help="Index name (a directory under VECTOR_SEGMENT_DIR)")
+    parser.add_argument("--full", action="store_true",
+                        help="Re-index every note, not only changed ones")
+    parser.add_argument("--watch", type=float, default=0,
+                        help="Keep running, polling every this many seconds")
+    parser.add_argument("--compact-ratio", type=float, default=VECTOR_COMPACT_RATIO,
+                        help="Share of dead rows at which a shard is compacted")
+    args = parser.parse_args()
+    
+    asyncio.run(run(args.index, args.full, args.watch, args.compact_ratio))
@@ -0,0 +1,52 @@
+"""
+Recompute semantic links for every note in one vectorized pass.
+Run this after bulk imports instead of linking notes one at a time.
+Links never cross tenants or workspaces, so each scope is relinked on its own.
+"""
+
+import argparse
+import asyncio
+import os
+import sys
+
+# Add the parent directory to the sys path to import from the application
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from services.database import async_session, list_scopes
+from services.graph import (
+    relink_all_notes,
+    DEFAULT_TOP_K,
+    DEFAULT_SIMILARITY_THRESHOLD,
+    DEFAULT_BLOCK_SIZE,
+)
+
+
+async def relink_all(k: int, threshold: float, block_size: int):
+    """Relink the whole corpus and print a summary per scope"""
+    print("Relinking all notes...")
+    
+    async with async_session() as session:
+        for scope in await list_scopes(session):
+            stats = await relink_all_notes(
+                session,
+                k=k,
+                similarity_threshold=threshold,
+                block_size=block_size,
+                scope=scope
+            )
+            print(
+                f"{scope.tenant_id}/{scope.workspace_id}: relinked {stats['notes']} notes "
+                f"with {stats['links']} links in {stats['seconds']}s"
+            )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--k", type=int, default=DEFAULT_TOP_K, help="Neighbors per note")
+    parser.add_argument("--threshold", type=float, default=DEFAULT_SIMILARITY_THRESHOLD,
+                        help="Minimum cosine similarity")
+    parser.add_argument("--block-size", type=int, default=DEFAULT_BLOCK_SIZE,
+                        help="Rows per similarity block (bounds memory)")
+    args = parser.parse_args()
+    
+    asyncio.run(relink_all(args.k, args.threshold, args.block_size))
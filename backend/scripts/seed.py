@@ -15,7 +15,7 @@ sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 from sqlalchemy.ext.asyncio import AsyncSession
 from services.database import async_session, save_note
 from services.retriever import process_and_index_note
-from services.graph import link_related_notes
+from services.graph import relink_all_notes
 
 # Sample notes for seeding
 SAMPLE_NOTES = [
@@ -204,10 +204,10 @@ async def seed_database():
                 metadata={"title": SAMPLE_NOTES[i]["title"]}
             )
             print(f"  Indexed {chunks} chunks")
-            
-            # Generate links
-            links = await link_related_notes(session, note_id)
-            print(f"  Created {len(links)} semantic links")
+        
+        # Generate links for all notes in one pass
+        stats = await relink_all_notes(session)
+        print(f"Created {stats['links']} semantic links")
             
     print("Seeding completed successfully!")
 
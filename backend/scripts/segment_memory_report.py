@@ -0,0 +1,98 @@
+"""
+Report how index memory grows with the number of worker processes.
+Each worker either memory-maps the shared segments (VECTOR_STORE=segments) or
+loads its own copy of the vectors, runs searches over all of them, and reports
+the proportional set size (PSS, Linux only) its index added.
+"""
+
+import argparse
+import multiprocessing as mp
+import os
+import shutil
+import sys
+import tempfile
+
+import numpy as np
+
+# Add the parent directory to the sys path to import from the application
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from langchain_core.documents import Document
+
+from services.segment_index import SegmentIndex, SegmentWriter
+from services.vector_index import CompactVectorIndex
+
+
+def pss_bytes() -> int:
+    """Proportional set size of this process: shared pages count 1/N per sharer"""
+    with open("/proc/self/smaps_rollup") as f:
+        for line in f:
+            if line.startswith("Pss:"):
+                return int(line.split()[1]) * 1024
+    raise RuntimeError("Pss missing from /proc/self/smaps_rollup")
+
+
+def build_segments(root: str, n: int, dims: int, segments: int) -> None:
+    rng = np.random.default_rng(0)
+    writer = SegmentWriter(root)
+    for part in np.array_split(np.arange(n), segments):
+        documents = [
+            Document(page_content=f"chunk {i} " * 50, metadata={"note_id": str(i)}) for i in part
+        ]
+        writer.append(documents, rng.standard_normal((len(part), dims)).astype(np.float32))
+
+
+def worker(root: str, mode: str, queries: np.ndarray, loaded, measured, results) -> None:
+    before = pss_bytes()
+    index = SegmentIndex(root, refresh_seconds=3600)
+    if mode == "copy":
+        # What a per-process index costs: every worker holds its own arrays
+        for segment in index.view.segments:
+            path = os.path.join(root, segment.name, "index")
+            segment.index = CompactVectorIndex.load(path, mmap_mode=None)
+    for query in queries:
+        index.search(query, 10)
+    loaded.wait()
+    results.put(pss_bytes() - before)
+    measured.wait()
+
+
+def measure(root: str, mode: str, workers: int, queries: np.ndarray) -> float:
+    """Total PSS added by the index across workers, in MiB"""
+    ctx = mp.get_context("spawn")
+    loaded, measured, results = ctx.Barrier(workers), ctx.Barrier(workers), ctx.Queue()
+    processes = [
+        ctx.Process(target=worker, args=(root, mode, queries, loaded, measured, results))
+        for _ in range(workers)
+    ]
+    for process in processes:
+        process.start()
+    total = sum(results.get() for _ in processes)
+    for process in processes:
+        process.join()
+    return total / 2**20
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--vectors", type=int, default=20000, help="Synthetic vectors")
+    parser.add_argument("--dims", type=int, default=1536, help="Vector dimensions")
+    parser.add_argument("--segments", type=int, default=4, help="Segments to split them into")
+    parser.add_argument("--workers", default="1,2,4,8", help="Worker counts to compare")
+    args = parser.parse_args()
+    
+    root = tempfile.mkdtemp(prefix="segments-")
+    try:
+        build_segments(root, args.vectors, args.dims, args.segments)
+        queries = np.random.default_rng(1).standard_normal((20, args.dims)).astype(np.float32)
+        print(
+            f"{args.vectors} vectors x {args.dims} dims in {args.segments} segments; "
+            "index PSS summed over workers"
+        )
+        print(f"{'workers':>7} {'mmap MiB':>9} {'copy MiB':>9}")
+        for workers in [int(w) for w in args.workers.split(",")]:
+            mapped = measure(root, "mmap", workers, queries)
+            copied = measure(root, "copy", workers, queries)
+            print(f"{workers:>7} {mapped:>9.1f} {copied:>9.1f}")
+    finally:
+        shutil.rmtree(root, ignore_errors=True)
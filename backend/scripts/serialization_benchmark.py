@@ -0,0 +1,122 @@
+"""
+Measure per-item cost of serializing list responses.
+Compares building a response model per row and letting FastAPI validate and
+serialize them again through response_model, with serializing the rows once
+through services.serialization. Rows are synthetic notes shaped like ORM rows.
+"""
+
+import argparse
+import os
+import sys
+import time
+import uuid
+from datetime import datetime, timezone
+from types import SimpleNamespace
+from typing import Callable, List
+
+# Add the parent directory to the sys path to import from the application
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from models.schemas import NoteOut
+from services.serialization import get_adapter, json_response, orjson
+
+
+def synthetic_rows(n: int, body_chars: int) -> List[SimpleNamespace]:
+    """Objects with the attributes of Note rows"""
+    now = datetime.now(timezone.utc)
+    body = ("Discussed the launch plan and \"next steps\".\n" * (body_chars // 45 + 1))[:body_chars]
+    return [
+        SimpleNamespace(
+            id=uuid.uuid4(), title=f"Meeting {i}", body=body, created_at=now, updated_at=now
+        )
+        for i in range(n)
+    ]
+
+
+def build_models(rows: List[SimpleNamespace]) -> List[NoteOut]:
+    """What the routers did before: one model per row, field by field"""
+    return [
+        NoteOut(
+            id=row.id,
+            title=row.title,
+            body=row.body,
+            created_at=row.created_at,
+            updated_at=row.updated_at
+        )
+        for row in rows
+    ]
+
+
+def best_of(fn: Callable[[], object], repeat: int) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        started = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - started)
+    return best
+
+
+def make_app(rows: List[SimpleNamespace]) -> FastAPI:
+    """The same list endpoint on the model-per-row path and the single-pass path"""
+    app = FastAPI()
+    
+    @app.get("/models", response_model=List[NoteOut])
+    async def models():
+        return build_models(rows)
+    
+    @app.get("/rows", response_model=List[NoteOut])
+    async def fast():
+        return json_response(List[NoteOut], rows)
+    
+    return app
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--rows", type=int, default=5000, help="Rows per response")
+    parser.add_argument("--body-chars", type=int, default=2000, help="Characters per note body")
+    parser.add_argument("--repeat", type=int, default=5,
+                        help="Runs per measurement (best is reported)")
+    args = parser.parse_args()
+    
+    rows = synthetic_rows(args.rows, args.body_chars)
+    adapter = get_adapter(List[NoteOut])
+    models = build_models(rows)
+    
+    # Stages of each path, in microseconds per row
+    stages = [
+        ("build model per row", lambda: build_models(rows)),
+        (
+            "FastAPI revalidate + dump_json",
+            lambda: adapter.dump_json(adapter.validate_python(models))
+        ),
+        (
+            "validate once + dump_json",
+            lambda: adapter.dump_json(adapter.validate_python(rows, from_attributes=True))
+        ),
+        ("project columns + orjson", lambda: orjson.dumps([
+            {name: getattr(row, name) for name in NoteOut.model_fields} for row in rows
+        ]) if orjson else None),
+    ]
+    print(f"{args.rows} rows, {args.body_chars} character bodies")
+    print(f"{'stage':<34} {'us/row':>8}")
+    for name, fn in stages:
+        print(f"{name:<34} {best_of(fn, args.repeat) / args.rows * 1e6:>8.2f}")
+    
+    # End to end through the app; the slope between two sizes removes per-request overhead
+    small = max(1, args.rows // 10)
+    print(f"\n{'endpoint':<34} {'ms/request':>10} {'us/row':>8}")
+    for path in ("/models", "/rows"):
+        timings = []
+        for n in (small, args.rows):
+            client = TestClient(make_app(rows[:n]))
+            client.get(path)
+            timings.append(best_of(lambda client=client, path=path: client.get(path), args.repeat))
+        if args.rows > small:
+            per_row = (timings[1] - timings[0]) / (args.rows - small) * 1e6
+        else:
+            per_row = float("nan")
+        print(f"{path:<34} {timings[1] * 1000:>10.1f} {per_row:>8.2f}")
@@ -0,0 +1,111 @@
+"""
+Report memory footprint and recall@k of compact vector storage options.
+Vectors come from a .npy file, from embedding every note, or are synthetic.
+"""
+
+import argparse
+import asyncio
+import os
+import sys
+import time
+
+import numpy as np
+
+# Add the parent directory to the sys path to import from the application
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from services.vector_index import CompactVectorIndex, evaluate_recall
+
+# (storage, dims, rescore) combinations compared by default
+CONFIGURATIONS = [
+    ("float32", 0, False),
+    ("float16", 0, False),
+    ("int8", 0, False),
+    ("int8", 0, True),
+    ("int8", 512, True),
+    ("int8", 256, True),
+]
+
+
+async def load_note_vectors() -> np.ndarray:
+    """Embed every note the same way relinking does"""
+    from sqlalchemy import select
+    
+    from models.orm import Note
+    from services.database import async_session
+    from services.graph import NOTE_VECTOR_MAX_CHARS, embed_note_texts
+    
+    async with async_session() as session:
+        result = await session.execute(select(Note.title, Note.body))
+        texts = [
+            f"{row[0] or ''}\n{row[1] or ''}".strip()[:NOTE_VECTOR_MAX_CHARS]
+            for row in result.all()
+        ]
+    return embed_note_texts(texts)
+
+
+def synthetic_vectors(n: int, dims: int, seed: int = 0) -> np.ndarray:
+    """Clustered Gaussian vectors, a rough stand-in for embeddings"""
+    rng = np.random.default_rng(seed)
+    centers = rng.standard_normal((max(1, n // 200), dims))
+    return centers[rng.integers(0, len(centers), n)] + 0.5 * rng.standard_normal((n, dims))
+
+
+def report(vectors: np.ndarray, queries: int, k: int, rescore_dir: str):
+    """Print one line per storage configuration"""
+    rng = np.random.default_rng(1)
+    held_out = rng.choice(len(vectors), size=min(queries, len(vectors) // 10 or 1), replace=False)
+    mask = np.ones(len(vectors), dtype=bool)
+    mask[held_out] = False
+    corpus, probe = vectors[mask], vectors[held_out]
+    
+    print(f"{len(corpus)} vectors x {corpus.shape[1]} dims, {len(probe)} queries, recall@{k}")
+    print(
+        f"{'storage':<8} {'dims':>5} {'rescore':>7} {'resident MB':>12} {'ratio':>6} "
+        f"{'recall':>7} {'ms/query':>9}"
+    )
+    for storage, dims, rescore in CONFIGURATIONS:
+        index = CompactVectorIndex(
+            dims=dims,
+            storage=storage,
+            rescore=rescore,
+            rescore_path=(
+                os.path.join(rescore_dir, f"rescore-{storage}-{dims}.f16") if rescore else None
+            ),
+        )
+        index.add(corpus)
+        
+        started = time.perf_counter()
+        for query in probe:
+            index.search(query, k)
+        latency = (time.perf_counter() - started) * 1000 / len(probe)
+        
+        recall = evaluate_recall(index, corpus, probe, k)
+        memory = index.memory_report()
+        print(
+            f"{storage:<8} {memory['dims']:>5} {str(rescore):>7} "
+            f"{memory['resident_bytes'] / 1e6:>12.1f} {memory['compression']:>6} "
+            f"{recall:>7.3f} {latency:>9.2f}"
+        )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--vectors", help="Path to an (N, D) .npy file of embeddings")
+    parser.add_argument("--notes", action="store_true", help="Embed every note in the database")
+    parser.add_argument("--synthetic", type=int, default=20000, help="Synthetic vector count")
+    parser.add_argument("--dims", type=int, default=1536, help="Synthetic vector dimensions")
+    parser.add_argument("--queries", type=int, default=200, help="Held-out query vectors")
+    parser.add_argument("--k", type=int, default=10, help="Neighbors per query")
+    parser.add_argument("--rescore-dir", default="/tmp",
+                        help="Directory for memory-mapped rescoring vectors")
+    args = parser.parse_args()
+    
+    if args.vectors:
+        data = np.load(args.vectors)
+    elif args.notes:
+        data = asyncio.run(load_note_vectors())
+    else:
+        data = synthetic_vectors(args.synthetic, args.dims)
+    
+    report(np.asarray(data, dtype=np.float32), args.queries, args.k, args.rescore_dir)
@@ -0,0 +1,151 @@
+import os
+import json
+import time
+import hashlib
+import sqlite3
+import tempfile
+import threading
+from typing import Any, Callable, Optional
+import logging
+
+# Environment variables
+CACHE_PATH = os.getenv(
+    "CACHE_PATH",
+    os.path.join(tempfile.gettempdir(), "ai-second-brain-cache.sqlite3")
+)
+CACHE_ENABLED = os.getenv("CACHE_ENABLED", "true").lower() == "true"
+CACHE_MAX_ENTRIES = int(os.getenv("CACHE_MAX_ENTRIES", "50000"))
+
+# Configure logger
+logger = logging.getLogger(__name__)
+
+# Read size for streaming file hashes
+HASH_BLOCK_SIZE = 1024 * 1024
+
+# Check the size bound once every this many writes
+EVICT_EVERY = 100
+
+
+def sha256_text(text: str) -> str:
+    """Hex SHA-256 of a text"""
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+def sha256_file(path: str) -> str:
+    """Hex SHA-256 of a file, read in fixed-size blocks"""
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(HASH_BLOCK_SIZE), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+class ArtifactCache:
+    """
+    Content-addressed cache of JSON artifacts in a SQLite file
+    
+    Entries live in namespaces (e.g. "transcript", "summary", "llm") and are
+    keyed by a content hash, so identical inputs map to the same entry across
+    requests, restarts and uvicorn workers sharing the file. The file is kept
+    to max_entries by evicting the least recently used entries.
+    """
+    
+    def __init__(self, path: str = CACHE_PATH, max_entries: int = CACHE_MAX_ENTRIES):
+        self.path = path
+        self.max_entries = max_entries
+        self._writes = 0
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS artifacts (
+                namespace TEXT NOT NULL,
+                key TEXT NOT NULL,
+                value TEXT NOT NULL,
+                created_at REAL NOT NULL,
+                accessed_at REAL NOT NULL,
+                PRIMARY KEY (namespace, key)
+            )
+            """
+        )
+        # Cache files written before LRU eviction lack the access timestamp
+        columns = {row[1] for row in self._conn.execute("PRAGMA table_info(artifacts)")}
+        if "accessed_at" not in columns:
+            self._conn.execute(
+                "ALTER TABLE artifacts ADD COLUMN accessed_at REAL NOT NULL DEFAULT 0"
+            )
+        self._conn.execute(
+            "CREATE INDEX IF NOT EXISTS idx_artifacts_accessed_at ON artifacts (accessed_at)"
+        )
+    
+    def get(self, namespace: str, key: str) -> Optional[Any]:
+        """Get a cached value, or None on a miss"""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT value FROM artifacts WHERE namespace = ? AND key = ?",
+                (namespace, key),
+            ).fetchone()
+            if row:
+                self._conn.execute(
+                    "UPDATE artifacts SET accessed_at = ? WHERE namespace = ? AND key = ?",
+                    (time.time(), namespace, key),
+                )
+        return json.loads(row[0]) if row else None
+    
+    def set(self, namespace: str, key: str, value: Any) -> None:
+        """Store a JSON-serializable value"""
+        payload = json.dumps(value, default=str)
+        now = time.time()
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO artifacts (namespace, key, value, created_at, accessed_at) "
+                "VALUES (?, ?, ?, ?, ?)",
+                (namespace, key, payload, now, now),
+            )
+            self._writes += 1
+            if self.max_entries and self._writes % EVICT_EVERY == 0:
+                self._evict()
+    
+    def get_or_compute(self, namespace: str, key: str, compute: Callable[[], Any]) -> Any:
+        """Return the cached value or compute, store and return it"""
+        value = self.get(namespace, key)
+        if value is None:
+            value = compute()
+            self.set(namespace, key, value)
+        return value
+    
+    def clear(self, namespace: Optional[str] = None) -> None:
+        """Drop every entry, or every entry in one namespace"""
+        with self._lock:
+            if namespace is None:
+                self._conn.execute("DELETE FROM artifacts")
+            else:
+                self._conn.execute("DELETE FROM artifacts WHERE namespace = ?", (namespace,))
+    
+    def evict(self) -> None:
+        """Trim the cache to max_entries, least recently used first"""
+        with self._lock:
+            self._evict()
+    
+    def _evict(self) -> None:
+        self._conn.execute(
+            "DELETE FROM artifacts WHERE rowid IN ("
+            "SELECT rowid FROM artifacts ORDER BY accessed_at DESC LIMIT -1 OFFSET ?)",
+            (self.max_entries,),
+        )
+
+
+_cache: Optional[ArtifactCache] = None
+
+
+def get_cache() -> Optional[ArtifactCache]:
+    """Get the shared artifact cache (None when CACHE_ENABLED is false or it cannot open)"""
+    global _cache
+    if _cache is None and CACHE_ENABLED:
+        try:
+            _cache = ArtifactCache(CACHE_PATH)
+        except sqlite3.Error as e:
+            logger.warning(f"Artifact cache unavailable at {CACHE_PATH}: {e}")
+            return None
+    return _cache
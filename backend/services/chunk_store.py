@@ -0,0 +1,291 @@
+import os
+import uuid
+from collections import defaultdict
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Tuple
+import logging
+
+import numpy as np
+from langchain_core.documents import Document
+from langchain_core.embeddings import Embeddings
+from langchain_core.vectorstores import VectorStore
+from sqlalchemy import delete, select, text
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from models.orm import Chunk
+from services.cache import sha256_text
+from services.database import (
+    delete_note_chunks,
+    get_chunk_embeddings_by_hash,
+    in_scope,
+    replace_note_chunks,
+)
+from services.tenancy import DEFAULT_SCOPE, Scope
+
+# Environment variables
+CHUNK_EMBEDDING_DIMS = int(os.getenv("CHUNK_EMBEDDING_DIMS", "1536"))
+
+# Configure logger
+logger = logging.getLogger(__name__)
+
+# Whether the chunks table has the pgvector column (checked once per process)
+_pgvector_column: Optional[bool] = None
+
+
+def encode_vector(vector: Sequence[float]) -> bytes:
+    """Serialize an embedding as little-endian float32 bytes"""
+    return np.asarray(vector, dtype="<f4").tobytes()
+
+
+def decode_vectors(blobs: List[bytes]) -> np.ndarray:
+    """Deserialize embeddings stored by encode_vector into an (N, D) matrix"""
+    if not blobs:
+        return np.zeros((0, 0))
+    return np.stack([np.frombuffer(blob, dtype="<f4") for blob in blobs])
+
+
+def chunk_hash(content: str, model_id: str) -> str:
+    """
+    Hash that a chunk's stored embedding is reused by
+    
+    It covers the embedding model as well as the text, so switching models
+    (or an index's EMBEDDING_BACKENDS entry) re-embeds instead of reusing
+    vectors from another model.
+    """
+    return sha256_text(f"{model_id}\n{content}")
+
+
+def vector_literal(vector: Sequence[float]) -> str:
+    """pgvector text form of an embedding"""
+    return "[" + ",".join(f"{float(x):.7g}" for x in vector) + "]"
+
+
+async def has_pgvector(session: AsyncSession) -> bool:
+    """Whether migration 004 created the pgvector column"""
+    global _pgvector_column
+    if _pgvector_column is None:
+        result = await session.execute(text(
+            "SELECT 1 FROM information_schema.columns "
+            "WHERE table_name = 'chunks' AND column_name = 'embedding_vector'"
+        ))
+        _pgvector_column = result.scalar() is not None
+        method = "pgvector" if _pgvector_column else "bytea + NumPy"
+        logger.info(f"Chunk similarity search uses {method}")
+    return _pgvector_column
+
+
+class PostgresChunkStore(VectorStore):
+    """
+    Vector store over the chunks table
+    
+    Runs on the caller's AsyncSession and never commits, so chunk writes,
+    deletes and searches share the transaction of the surrounding note
+    writes. Similarity search uses the pgvector HNSW index when available
+    and falls back to scoring the stored float32 bytes with NumPy.
+    Async-only: use aadd_documents / asimilarity_search / adelete (a
+    retriever from as_retriever works through ainvoke).
+    
+    Chunks are written to the first of its scopes and searched across all
+    of them in one query, since one session cannot run queries concurrently.
+    model_id names the embedding model, so stored embeddings are only
+    reused for the model that produced them.
+    """
+    
+    def __init__(
+        self,
+        session: AsyncSession,
+        embedding: Embeddings,
+        scopes: Optional[List[Scope]] = None,
+        model_id: str = "",
+    ):
+        self.session = session
+        self.embedding = embedding
+        self.model_id = model_id
+        self.scopes = list(scopes or [DEFAULT_SCOPE])
+        if len({scope.tenant_id for scope in self.scopes}) > 1:
+            raise ValueError("PostgresChunkStore searches the workspaces of a single tenant")
+    
+    @property
+    def scope(self) -> Scope:
+        """Scope that new chunks are written to"""
+        return self.scopes[0]
+    
+    @property
+    def embeddings(self) -> Embeddings:
+        return self.embedding
+    
+    async def aadd_documents(self, documents: List[Document], **kwargs: Any) -> List[str]:
+        """
+        Replace the chunks of every note in documents
+        
+        Documents need a "note_id" in their metadata; "start_index" (from a
+        splitter with add_start_index=True) gives the character offsets.
+        Chunks whose text was already embedded by this model reuse that embedding.
+        """
+        by_note: Dict[str, List[Document]] = defaultdict(list)
+        for doc in documents:
+            by_note[str(doc.metadata["note_id"])].append(doc)
+        
+        hashes = [chunk_hash(doc.page_content, self.model_id) for doc in documents]
+        known = await get_chunk_embeddings_by_hash(
+            self.session, list(set(hashes)), scope=self.scope
+        )
+        missing = list(dict.fromkeys(h for h in hashes if h not in known))
+        if missing:
+            text_by_hash = {h: doc.page_content for h, doc in zip(hashes, documents, strict=True)}
+            vectors = await self.embedding.aembed_documents([text_by_hash[h] for h in missing])
+            known.update({h: encode_vector(v) for h, v in zip(missing, vectors, strict=True)})
+        
+        ids = []
+        pgvector = await has_pgvector(self.session)
+        for note_id, docs in by_note.items():
+            rows = []
+            for ordinal, doc in enumerate(docs):
+                start = int(doc.metadata.get("start_index", 0))
+                content_hash = chunk_hash(doc.page_content, self.model_id)
+                rows.append({
+                    "ordinal": ordinal,
+                    "start_char": start,
+                    "end_char": start + len(doc.page_content),
+                    "content": doc.page_content,
+                    "content_hash": content_hash,
+                    "embedding": known[content_hash],
+                })
+            chunks = await replace_note_chunks(
+                self.session, uuid.UUID(note_id), rows, scope=self.scope
+            )
+            ids.extend(str(chunk.id) for chunk in chunks)
+            if pgvector:
+                await self._set_vector_column(chunks)
+        return ids
+    
+    async def _set_vector_column(self, chunks: List[Chunk]) -> None:
+        params = []
+        for chunk in chunks:
+            vector = np.frombuffer(chunk.embedding, dtype="<f4")
+            if len(vector) != CHUNK_EMBEDDING_DIMS:
+                logger.warning(
+                    f"Embedding has {len(vector)} dims but the pgvector column has "
+                    f"{CHUNK_EMBEDDING_DIMS}; chunk {chunk.id} is searched from bytea only"
+                )
+                continue
+            params.append({"id": chunk.id, "vector": vector_literal(vector)})
+        if params:
+            await self.session.execute(
+                text("UPDATE chunks SET embedding_vector = CAST(:vector AS vector) WHERE id = :id"),
+                params,
+            )
+    
+    async def adelete(self, ids: Optional[List[str]] = None, **kwargs: Any) -> Optional[bool]:
+        """Delete chunks by chunk ID, or every chunk of note_ids=[...]"""
+        note_ids = kwargs.get("note_ids")
+        if note_ids:
+            await delete_note_chunks(self.session, [uuid.UUID(str(n)) for n in note_ids])
+        if ids:
+            await self.session.execute(
+                delete(Chunk).where(
+                    Chunk.id.in_([uuid.UUID(str(i)) for i in ids]), in_scope(Chunk, self.scopes)
+                )
+            )
+        return True
+    
+    async def asimilarity_search_with_score(
+        self,
+        query: str,
+        k: int = 4,
+        **kwargs: Any,
+    ) -> List[Tuple[Document, float]]:
+        vector = await self.embedding.aembed_query(query)
+        return await self.asimilarity_search_by_vector_with_score(vector, k, **kwargs)
+    
+    async def asimilarity_search(self, query: str, k: int = 4, **kwargs: Any) -> List[Document]:
+        return [doc for doc, _ in await self.asimilarity_search_with_score(query, k, **kwargs)]
+    
+    async def asimilarity_search_by_vector_with_score(
+        self,
+        embedding: List[float],
+        k: int = 4,
+        note_ids: Optional[List[uuid.UUID]] = None,
+        **kwargs: Any,
+    ) -> List[Tuple[Document, float]]:
+        """Top-k chunks by cosine similarity, optionally restricted to some notes"""
+        if await has_pgvector(self.session) and len(embedding) == CHUNK_EMBEDDING_DIMS:
+            rows = await self._search_pgvector(embedding, k, note_ids)
+        else:
+            rows = await self._search_bytea(embedding, k, note_ids)
+        return [(_to_document(row, score), score) for row, score in rows]
+    
+    async def _search_pgvector(
+        self, embedding: List[float], k: int, note_ids: Optional[List[uuid.UUID]]
+    ):
+        note_filter = "AND note_id = ANY(:note_ids)" if note_ids else ""
+        result = await self.session.execute(
+            text(
+                "SELECT id, note_id, ordinal, start_char, end_char, content, "
+                "1 - (embedding_vector <=> CAST(:query AS vector)) AS score "
+                "FROM chunks WHERE embedding_vector IS NOT NULL "
+                f"AND tenant_id = :tenant_id AND workspace_id = ANY(:workspace_ids) {note_filter} "
+                "ORDER BY embedding_vector <=> CAST(:query AS vector) LIMIT :k"
+            ),
+            {
+                "query": vector_literal(embedding),
+                "k": k,
+                "note_ids": list(note_ids or []),
+                "tenant_id": self.scope.tenant_id,
+                "workspace_ids": [scope.workspace_id for scope in self.scopes],
+            },
+        )
+        return [(row, float(row.score)) for row in result.all()]
+    
+    async def _search_bytea(
+        self, embedding: List[float], k: int, note_ids: Optional[List[uuid.UUID]]
+    ):
+        stmt = select(
+            Chunk.id, Chunk.note_id, Chunk.ordinal, Chunk.start_char, Chunk.end_char,
+            Chunk.content, Chunk.embedding
+        ).where(Chunk.embedding.is_not(None), in_scope(Chunk, self.scopes))
+        if note_ids:
+            stmt = stmt.where(Chunk.note_id.in_(note_ids))
+        rows = (await self.session.execute(stmt)).all()
+        query = np.asarray(embedding, dtype=np.float32)
+        rows = [row for row in rows if len(row.embedding) == query.nbytes]
+        if not rows:
+            return []
+        
+        vectors = decode_vectors([row.embedding for row in rows])
+        scores = vectors @ query / np.maximum(
+            np.linalg.norm(vectors, axis=1) * np.linalg.norm(query), 1e-12
+        )
+        top = np.argsort(-scores)[:k]
+        return [(rows[i], float(scores[i])) for i in top]
+    
+    def add_texts(
+        self, texts: Iterable[str], metadatas: Optional[List[dict]] = None, **kwargs: Any
+    ) -> List[str]:
+        raise NotImplementedError("PostgresChunkStore is async-only; use aadd_documents")
+    
+    def similarity_search(self, query: str, k: int = 4, **kwargs: Any) -> List[Document]:
+        raise NotImplementedError("PostgresChunkStore is async-only; use asimilarity_search")
+    
+    @classmethod
+    def from_texts(
+        cls,
+        texts: List[str],
+        embedding: Embeddings,
+        metadatas: Optional[List[dict]] = None,
+        **kwargs: Any,
+    ) -> "PostgresChunkStore":
+        raise NotImplementedError("PostgresChunkStore needs a session; construct it directly")
+
+
+def _to_document(row: Any, score: float) -> Document:
+    return Document(
+        page_content=row.content,
+        metadata={
+            "note_id": str(row.note_id),
+            "chunk_id": str(row.id),
+            "ordinal": row.ordinal,
+            "start_char": row.start_char,
+            "end_char": row.end_char,
+            "score": score,
+        },
+    )
@@ -0,0 +1,277 @@
+import os
+import re
+from functools import lru_cache
+from itertools import pairwise
+from typing import Any, Callable, Dict, List, NamedTuple, Optional, Tuple
+import logging
+
+from langchain_core.documents import Document
+
+from services.rate_limit import estimate_tokens
+
+# Environment variables
+CHUNK_TOKENS = int(os.getenv("CHUNK_TOKENS", "256"))
+CHUNK_OVERLAP_TOKENS = int(os.getenv("CHUNK_OVERLAP_TOKENS", "0"))
+SUMMARY_CHUNK_TOKENS = int(os.getenv("SUMMARY_CHUNK_TOKENS", "500"))
+CHUNK_ENCODING = os.getenv("CHUNK_ENCODING", "cl100k_base")
+CHUNK_CACHE_SIZE = int(os.getenv("CHUNK_CACHE_SIZE", "512"))
+
+# Configure logger
+logger = logging.getLogger(__name__)
+
+HEADING_PATTERN = re.compile(r"^(#{1,6})\s+(.*?)\s*#*\s*$")
+LIST_ITEM_PATTERN = re.compile(r"^\s*(?:[-*+]|\d+[.)])\s+")
+FENCE_PATTERN = re.compile(r"^\s*(```|~~~)")
+SENTENCE_END_PATTERN = re.compile(r"(?<=[.!?])\s+")
+
+
+class Span(NamedTuple):
+    """A stripped slice text[start:end] of the source text"""
+    start: int
+    end: int
+    tokens: int
+    kind: str
+    section: str
+
+
+@lru_cache(maxsize=None)
+def get_token_counter(encoding: str = CHUNK_ENCODING) -> Callable[[str], int]:
+    """
+    Token counter for an encoding (loaded once per process)
+    
+    tiktoken downloads the encoding on first use; when that is not possible
+    the four-characters-per-token estimate is used instead.
+    """
+    try:
+        import tiktoken
+        
+        encoder = tiktoken.get_encoding(encoding)
+    except Exception as e:
+        logger.warning(
+            f"Could not load tiktoken encoding {encoding} ({type(e).__name__}); "
+            "estimating token counts"
+        )
+        return estimate_tokens
+    return lambda text: len(encoder.encode(text, disallowed_special=()))
+
+
+def count_tokens(text: str) -> int:
+    return get_token_counter()(text)
+
+
+def _strip_span(text: str, start: int, end: int) -> Tuple[int, int]:
+    while start < end and text[start].isspace():
+        start += 1
+    while end > start and text[end - 1].isspace():
+        end -= 1
+    return start, end
+
+
+def parse_blocks(text: str) -> List[Span]:
+    """
+    Split Markdown into headings, lists, fenced code and paragraphs
+    
+    A list (with its indented continuation lines) and a fenced code block are
+    one block each. Every block records the heading path it sits under.
+    """
+    blocks = []
+    headings: List[Tuple[int, str]] = []
+    kind = None
+    block_start = 0
+    fence = None
+    
+    def close(end: int) -> None:
+        nonlocal kind
+        if kind is not None:
+            start, stop = _strip_span(text, block_start, end)
+            if start < stop:
+                section = " > ".join(title for _, title in headings)
+                blocks.append(Span(start, stop, count_tokens(text[start:stop]), kind, section))
+        kind = None
+    
+    offset = 0
+    for line in text.splitlines(keepends=True):
+        line_start, offset = offset, offset + len(line)
+        stripped = line.strip()
+        
+        if fence is not None:
+            if stripped.startswith(fence):
+                fence = None
+                close(offset)
+            continue
+        
+        fence_match = FENCE_PATTERN.match(line)
+        heading_match = HEADING_PATTERN.match(line)
+        if fence_match:
+            close(line_start)
+            kind, block_start, fence = "code", line_start, fence_match.group(1)
+        elif heading_match:
+            close(line_start)
+            level = len(heading_match.group(1))
+            headings = [h for h in headings if h[0] < level] + [(level, heading_match.group(2))]
+            kind, block_start = "heading", line_start
+            close(offset)
+        elif not stripped:
+            # A blank line inside a list only ends it if the list does not continue
+            if kind != "list":
+                close(line_start)
+        elif LIST_ITEM_PATTERN.match(line):
+            if kind != "list":
+                close(line_start)
+                kind, block_start = "list", line_start
+        elif kind == "list" and (line[0].isspace() or text[line_start - 2:line_start] != "\n\n"):
+            # Indented or wrapped continuation of the current item
+            pass
+        elif kind != "paragraph":
+            close(line_start)
+            kind, block_start = "paragraph", line_start
+    close(len(text))
+    return blocks
+
+
+def _boundaries(text: str, span: Span, level: int) -> List[int]:
+    """Natural split points inside a span: list items or lines, then sentences"""
+    body = text[span.start:span.end]
+    if level == 0:
+        if span.kind == "list":
+            items = re.finditer(r"^\s*(?:[-*+]|\d+[.)])\s+", body, re.MULTILINE)
+            points = [m.start() for m in items]
+        else:
+            points = [m.end() for m in re.finditer(r"\n", body)]
+    else:
+        points = [m.end() for m in SENTENCE_END_PATTERN.finditer(body)]
+    return sorted({span.start + p for p in points if 0 < p < len(body)})
+
+
+def split_oversized(text: str, span: Span, max_tokens: int, level: int = 0) -> List[Span]:
+    """Split a block larger than max_tokens at the finest boundary that fits"""
+    if span.tokens <= max_tokens:
+        return [span]
+    if level >= 2:
+        # No natural boundary left: cut into equal character windows
+        width = max(1, (span.end - span.start) * max_tokens // span.tokens)
+        cuts = list(range(span.start, span.end, width)) + [span.end]
+        edges = list(pairwise(cuts))
+    else:
+        cuts = [span.start] + _boundaries(text, span, level) + [span.end]
+        edges = list(pairwise(cuts))
+    
+    pieces = []
+    for start, end in edges:
+        start, end = _strip_span(text, start, end)
+        if start >= end:
+            continue
+        piece = Span(start, end, count_tokens(text[start:end]), span.kind, span.section)
+        pieces.extend(split_oversized(text, piece, max_tokens, level + 1) if level < 2 else [piece])
+    return pieces
+
+
+def pack_spans(
+    spans: List[Span],
+    max_tokens: int,
+    overlap_tokens: int,
+    min_tokens: int
+) -> List[List[Span]]:
+    """
+    Greedily pack consecutive spans into chunks of at most max_tokens
+    
+    A heading starts a new chunk once the current one holds min_tokens, so
+    sections are not cut in the middle while small sections still share a
+    chunk. Overlap repeats trailing spans of the previous chunk, never
+    across a heading.
+    """
+    chunks: List[List[Span]] = []
+    current: List[Span] = []
+    size = 0
+    for span in spans:
+        new_section = span.kind == "heading" and size >= min_tokens
+        if current and (size + span.tokens > max_tokens or new_section):
+            # Trailing headings move on with the content they introduce
+            headings = []
+            while len(current) > 1 and current[-1].kind == "heading":
+                headings.insert(0, current.pop())
+            chunks.append(current)
+            carried: List[Span] = headings
+            if overlap_tokens > 0 and not new_section and not headings:
+                for previous in reversed(current):
+                    carried_tokens = sum(s.tokens for s in carried) + previous.tokens
+                    if previous.kind == "heading" or carried_tokens > overlap_tokens:
+                        break
+                    carried.insert(0, previous)
+            while carried and sum(s.tokens for s in carried) + span.tokens > max_tokens:
+                carried.pop(0)
+            current, size = carried, sum(s.tokens for s in carried)
+        current.append(span)
+        size += span.tokens
+    if current:
+        chunks.append(current)
+    return chunks
+
+
+@lru_cache(maxsize=CHUNK_CACHE_SIZE)
+def _chunk_spans(
+    text: str,
+    max_tokens: int,
+    overlap_tokens: int,
+    min_tokens: int
+) -> Tuple[Tuple[int, int, int, str], ...]:
+    spans = []
+    for block in parse_blocks(text):
+        spans.extend(split_oversized(text, block, max_tokens))
+    return tuple(
+        (group[0].start, group[-1].end, sum(s.tokens for s in group), group[0].section)
+        for group in pack_spans(spans, max_tokens, overlap_tokens, min_tokens)
+    )
+
+
+class MarkdownTokenChunker:
+    """
+    Token-sized chunker that follows Markdown structure
+    
+    Text is parsed into headings, lists, code fences and paragraphs, which
+    are packed into chunks of up to max_tokens. Blocks are only split when
+    they alone exceed max_tokens (at list items, lines, then sentences).
+    Each chunk is an exact slice of the input, so start_index locates it.
+    Results are cached per text, since the same note is chunked for
+    indexing, graph expansion and summarization.
+    """
+    
+    def __init__(
+        self,
+        max_tokens: int = CHUNK_TOKENS,
+        overlap_tokens: int = CHUNK_OVERLAP_TOKENS,
+        min_tokens: Optional[int] = None
+    ):
+        self.max_tokens = max_tokens
+        self.overlap_tokens = overlap_tokens
+        self.min_tokens = max_tokens // 2 if min_tokens is None else min_tokens
+    
+    def spans(self, text: str) -> Tuple[Tuple[int, int, int, str], ...]:
+        """(start, end, tokens, section) of every chunk"""
+        return _chunk_spans(text, self.max_tokens, self.overlap_tokens, self.min_tokens)
+    
+    def split_text(self, text: str) -> List[str]:
+        return [text[start:end] for start, end, _, _ in self.spans(text)]
+    
+    def create_documents(
+        self, texts: List[str], metadatas: Optional[List[Dict[str, Any]]] = None
+    ) -> List[Document]:
+        """Chunk documents with start_index and the Markdown section path in their metadata"""
+        documents = []
+        for i, text in enumerate(texts):
+            base = metadatas[i] if metadatas else {}
+            for start, end, _, section in self.spans(text):
+                metadata = {**base, "start_index": start}
+                if section:
+                    metadata["section"] = section
+                documents.append(Document(page_content=text[start:end], metadata=metadata))
+        return documents
+
+
+@lru_cache(maxsize=None)
+def get_chunker(
+    max_tokens: int = CHUNK_TOKENS,
+    overlap_tokens: int = CHUNK_OVERLAP_TOKENS
+) -> MarkdownTokenChunker:
+    """Get the shared chunker for a chunk size"""
+    return MarkdownTokenChunker(max_tokens, overlap_tokens)
@@ -0,0 +1,158 @@
+import asyncio
+import threading
+from concurrent.futures import Future
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+import logging
+
+from langchain_core.embeddings import Embeddings
+
+from services.cache import sha256_text
+from services.tracing import span
+
+# Configure logger
+logger = logging.getLogger(__name__)
+
+
+def normalize_query(query: str) -> str:
+    """Normalize a search query so trivially different spellings share one answer"""
+    return " ".join(query.lower().split()).rstrip("?!. ")
+
+
+class SingleFlight:
+    """
+    Coalesce concurrent identical async work onto one in-flight task
+    
+    The first caller for a key starts the work as a task; callers arriving
+    while it runs await the same task instead of repeating it. Waiters are
+    shielded, so a cancelled caller does not cancel the shared work. The key
+    is forgotten as soon as the task finishes; results are not cached.
+    """
+    
+    def __init__(self, name: str):
+        self.name = name
+        self.coalesced = 0
+        self._tasks: Dict[str, asyncio.Task] = {}
+    
+    async def do(self, key: str, fn: Callable[[], Awaitable[Any]]) -> Any:
+        task = self._tasks.get(key)
+        if task is None:
+            task = asyncio.ensure_future(fn())
+            self._tasks[key] = task
+            task.add_done_callback(lambda done: self._forget(key, done))
+        else:
+            self.coalesced += 1
+            logger.debug(f"{self.name}: joined in-flight work for {key[:12]}")
+        return await asyncio.shield(task)
+    
+    def _forget(self, key: str, task: asyncio.Task) -> None:
+        if self._tasks.get(key) is task:
+            del self._tasks[key]
+        # Mark the exception retrieved in case every waiter was cancelled
+        if not task.cancelled():
+            task.exception()
+
+
+class ThreadSingleFlight:
+    """Thread-based counterpart of SingleFlight for blocking work in worker threads"""
+    
+    def __init__(self, name: str):
+        self.name = name
+        self.coalesced = 0
+        self._futures: Dict[str, Future] = {}
+        self._lock = threading.Lock()
+    
+    def claim(self, keys: List[str]) -> Tuple[Dict[str, Future], Dict[str, Future]]:
+        """
+        Claim keys for this caller
+        
+        Returns:
+            (futures, owned): a future for every key, and the subset of keys
+            nobody else was working on, which this caller must resolve
+        """
+        owned = {}
+        futures = {}
+        with self._lock:
+            for key in keys:
+                future = self._futures.get(key)
+                if future is None:
+                    future = Future()
+                    self._futures[key] = future
+                    owned[key] = future
+                else:
+                    self.coalesced += 1
+                futures[key] = future
+        return futures, owned
+    
+    def resolve(
+        self,
+        owned: Dict[str, Future],
+        results: Optional[Dict[str, Any]] = None,
+        error: Optional[BaseException] = None,
+    ) -> None:
+        """Publish results (or an error) for owned keys and forget them"""
+        with self._lock:
+            for key, future in owned.items():
+                if self._futures.get(key) is future:
+                    del self._futures[key]
+        for key, future in owned.items():
+            if error is not None:
+                future.set_exception(error)
+            else:
+                future.set_result(results[key])
+    
+    def do(self, key: str, fn: Callable[[], Any]) -> Any:
+        """Run fn once for concurrent callers with the same key"""
+        futures, owned = self.claim([key])
+        if owned:
+            try:
+                result = fn()
+            except BaseException as e:
+                self.resolve(owned, error=e)
+                raise
+            self.resolve(owned, {key: result})
+        return futures[key].result()
+
+
+# Shared by every embeddings wrapper so coalescing spans requests
+document_flight = ThreadSingleFlight("embed_documents")
+query_flight = ThreadSingleFlight("embed_query")
+
+
+class CoalescingEmbeddings(Embeddings):
+    """
+    Embeddings wrapper that shares in-flight embeddings of identical texts
+    
+    Within a batch, texts already being embedded by another thread are
+    awaited instead of resent; the rest go out in one call. Duplicates inside
+    a batch are embedded once.
+    """
+    
+    def __init__(self, embeddings: Embeddings, namespace: str = ""):
+        self.embeddings = embeddings
+        self.namespace = namespace
+        self.documents = document_flight
+        self.queries = query_flight
+    
+    def _key(self, text: str) -> str:
+        return sha256_text(f"{self.namespace}\n{text}")
+    
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        with span("embed.documents", stage="embedding", texts=len(texts)):
+            keys = [self._key(text) for text in texts]
+            futures, owned = self.documents.claim(list(dict.fromkeys(keys)))
+            if owned:
+                first_text = {key: text for key, text in zip(keys, texts, strict=True)}
+                owned_keys = list(owned)
+                try:
+                    vectors = self.embeddings.embed_documents(
+                        [first_text[key] for key in owned_keys]
+                    )
+                except BaseException as e:
+                    self.documents.resolve(owned, error=e)
+                    raise
+                self.documents.resolve(owned, dict(zip(owned_keys, vectors, strict=True)))
+            return [futures[key].result() for key in keys]
+    
+    def embed_query(self, text: str) -> List[float]:
+        with span("embed.query", stage="embedding"):
+            return self.queries.do(self._key(text), lambda: self.embeddings.embed_query(text))
@@ -1,21 +1,30 @@
 import os
 import uuid
-from typing import List, Optional, Any, Dict, Type
+from datetime import datetime
+from typing import List, Optional, Any, Dict, Sequence, Tuple, Type, Union
 
+from sqlalchemy import and_, delete, exists, func, insert, or_, tuple_, union_all
+from sqlalchemy.dialects.postgresql import insert as pg_insert
 from sqlalchemy.ext.asyncio import create_async_engine, AsyncSession
 from sqlalchemy.orm import sessionmaker
 from sqlmodel import SQLModel, select
 from fastapi import Depends
 
-from models.orm import Note, Task, Link
+from models.orm import Note, Task, Link, Chunk
 from models.schemas import TaskItem, LinkInfo
+from services.profiling import instrument_engine
+from services.tenancy import DEFAULT_SCOPE, Scope
 
 
 # Database URL from environment variable
 DATABASE_URL = os.getenv("DATABASE_URL", "postgresql+psycopg://postgres:postgres@db:5432/aisecondbrain")
 
+# Maximum number of links stored per note (keeps the links table linear in notes)
+MAX_LINKS_PER_NOTE = int(os.getenv("MAX_LINKS_PER_NOTE", "20"))
+
 # Create async engine
 engine = create_async_engine(DATABASE_URL, echo=True)
+instrument_engine(engine)
 
 # Create async session
 async_session = sessionmaker(
@@ -35,13 +44,38 @@ async def get_session() -> AsyncSession:
         yield session
 
 
+def in_scope(model: Any, scope: Union[Scope, Sequence[Scope]]) -> Any:
+    """Filter for the rows of a scoped table in a scope (or in any of several scopes)"""
+    scopes = [scope] if isinstance(scope, Scope) else list(scope)
+    if len(scopes) == 1:
+        return and_(
+            model.tenant_id == scopes[0].tenant_id, model.workspace_id == scopes[0].workspace_id
+        )
+    return tuple_(model.tenant_id, model.workspace_id).in_([tuple(s) for s in scopes])
+
+
+def scope_values(scope: Scope) -> Dict[str, str]:
+    """Scope columns for a new row"""
+    return {"tenant_id": scope.tenant_id, "workspace_id": scope.workspace_id}
+
+
+def unscoped(data: Dict[str, Any]) -> Dict[str, Any]:
+    """Drop scope columns from client data, so rows only take the request's scope"""
+    return {key: value for key, value in data.items() if key not in ("tenant_id", "workspace_id")}
+
+
 # CRUD operations
-async def save_note(session: AsyncSession, note_data: Dict[str, Any]) -> Note:
-    """Save or update a note"""
+async def save_note(
+    session: AsyncSession,
+    note_data: Dict[str, Any],
+    scope: Scope = DEFAULT_SCOPE
+) -> Note:
+    """Save or update a note in a scope"""
+    note_data = unscoped(note_data)
     if "id" in note_data and note_data["id"]:
         # Update existing note
         note_id = note_data["id"]
-        stmt = select(Note).where(Note.id == note_id)
+        stmt = select(Note).where(Note.id == note_id, in_scope(Note, scope))
         result = await session.execute(stmt)
         note = result.scalar_one_or_none()
         
@@ -50,7 +84,7 @@ async def save_note(session: AsyncSession, note_data: Dict[str, Any]) -> Note:
                 setattr(note, key, value)
     else:
         # Create new note
-        note = Note(**note_data)
+        note = Note(**note_data, **scope_values(scope))
         session.add(note)
     
     await session.commit()
@@ -58,26 +92,122 @@ async def save_note(session: AsyncSession, note_data: Dict[str, Any]) -> Note:
     return note
 
 
-async def get_note(session: AsyncSession, note_id: uuid.UUID) -> Optional[Note]:
-    """Get a note by ID"""
-    stmt = select(Note).where(Note.id == note_id)
+async def stage_note_with_tasks(
+    session: AsyncSession,
+    note_data: Dict[str, Any],
+    tasks: List[TaskItem],
+    scope: Scope = DEFAULT_SCOPE
+) -> Note:
+    """Add a note and its tasks to the session without committing (caller owns the transaction)"""
+    note = Note(**unscoped(note_data), **scope_values(scope))
+    session.add(note)
+    await session.flush()
+    
+    for task_data in tasks:
+        task = Task(
+            **task_data.model_dump(exclude={"source_note_id"}),
+            source_note_id=note.id,
+            **scope_values(scope)
+        )
+        session.add(task)
+    
+    await session.flush()
+    return note
+
+
+async def get_note(
+    session: AsyncSession,
+    note_id: uuid.UUID,
+    scope: Scope = DEFAULT_SCOPE
+) -> Optional[Note]:
+    """Get a note by ID (None if it is not in the scope)"""
+    stmt = select(Note).where(Note.id == note_id, in_scope(Note, scope))
     result = await session.execute(stmt)
     return result.scalar_one_or_none()
 
 
-async def list_notes(session: AsyncSession, skip: int = 0, limit: int = 100) -> List[Note]:
-    """List all notes with pagination"""
-    stmt = select(Note).order_by(Note.created_at.desc()).offset(skip).limit(limit)
+async def delete_note(
+    session: AsyncSession,
+    note_id: uuid.UUID,
+    scope: Scope = DEFAULT_SCOPE
+) -> bool:
+    """
+    Delete a note without committing (caller owns the transaction)
+    
+    Its tasks, links and chunks go with it through ON DELETE CASCADE.
+    Returns False if the note is not in the scope.
+    """
+    result = await session.execute(delete(Note).where(Note.id == note_id, in_scope(Note, scope)))
+    return result.rowcount > 0
+
+
+async def get_notes_by_ids(
+    session: AsyncSession,
+    note_ids: List[uuid.UUID],
+    scope: Union[Scope, Sequence[Scope]] = DEFAULT_SCOPE
+) -> List[Note]:
+    """Get several notes of one or more scopes in one query"""
+    if not note_ids:
+        return []
+    stmt = select(Note).where(Note.id.in_(note_ids), in_scope(Note, scope))
+    result = await session.execute(stmt)
+    return result.scalars().all()
+
+
+async def get_note_titles(
+    session: AsyncSession,
+    note_ids: List[uuid.UUID],
+    scope: Union[Scope, Sequence[Scope]] = DEFAULT_SCOPE
+) -> Dict[uuid.UUID, Optional[str]]:
+    """Get the titles of several notes of one or more scopes in one query (bodies are not loaded)"""
+    if not note_ids:
+        return {}
+    stmt = select(Note.id, Note.title).where(Note.id.in_(note_ids), in_scope(Note, scope))
+    result = await session.execute(stmt)
+    return {row[0]: row[1] for row in result.all()}
+
+
+async def list_notes(
+    session: AsyncSession,
+    skip: int = 0,
+    limit: int = 100,
+    scope: Scope = DEFAULT_SCOPE
+) -> List[Note]:
+    """List the notes of a scope with pagination"""
+    stmt = (
+        select(Note)
+        .where(in_scope(Note, scope))
+        .order_by(Note.created_at.desc())
+        .offset(skip)
+        .limit(limit)
+    )
     result = await session.execute(stmt)
     return result.scalars().all()
 
 
-async def save_tasks(session: AsyncSession, tasks: List[TaskItem]) -> List[Task]:
-    """Save multiple tasks"""
+async def list_workspaces(session: AsyncSession, tenant_id: str) -> List[str]:
+    """Workspaces of a tenant that hold notes"""
+    stmt = select(Note.workspace_id).where(Note.tenant_id == tenant_id).distinct()
+    result = await session.execute(stmt)
+    return sorted(result.scalars().all())
+
+
+async def list_scopes(session: AsyncSession) -> List[Scope]:
+    """Every (tenant, workspace) that holds notes"""
+    result = await session.execute(select(Note.tenant_id, Note.workspace_id).distinct())
+    return sorted(Scope(*row) for row in result.all())
+
+
+async def save_tasks(
+    session: AsyncSession,
+    tasks: List[TaskItem],
+    scope: Scope = DEFAULT_SCOPE
+) -> List[Task]:
+    """Save multiple tasks in a scope"""
     db_tasks = []
     
     for task_data in tasks:
-        task = Task(**task_data.model_dump())
+        task = Task(**task_data.model_dump(), **scope_values(scope))
         session.add(task)
         db_tasks.append(task)
     
@@ -90,14 +220,19 @@ async def save_tasks(session: AsyncSession, tasks: List[TaskItem]) -> List[Task]
     return db_tasks
 
 
-async def update_task(session: AsyncSession, task_id: uuid.UUID, task_data: Dict[str, Any]) -> Optional[Task]:
-    """Update a task"""
-    stmt = select(Task).where(Task.id == task_id)
+async def update_task(
+    session: AsyncSession,
+    task_id: uuid.UUID,
+    task_data: Dict[str, Any],
+    scope: Scope = DEFAULT_SCOPE
+) -> Optional[Task]:
+    """Update a task (None if it is not in the scope)"""
+    stmt = select(Task).where(Task.id == task_id, in_scope(Task, scope))
     result = await session.execute(stmt)
     task = result.scalar_one_or_none()
     
     if task:
-        for key, value in task_data.items():
+        for key, value in unscoped(task_data).items():
             setattr(task, key, value)
         
         await session.commit()
@@ -106,64 +241,256 @@ async def update_task(session: AsyncSession, task_id: uuid.UUID, task_data: Dict
     return task
 
 
-async def get_tasks_by_note(session: AsyncSession, note_id: uuid.UUID) -> List[Task]:
+async def get_tasks_by_note(
+    session: AsyncSession,
+    note_id: uuid.UUID,
+    scope: Scope = DEFAULT_SCOPE
+) -> List[Task]:
     """Get all tasks for a note"""
-    stmt = select(Task).where(Task.source_note_id == note_id)
+    stmt = select(Task).where(Task.source_note_id == note_id, in_scope(Task, scope))
     result = await session.execute(stmt)
     return result.scalars().all()
 
 
-async def upsert_links(session: AsyncSession, links: List[LinkInfo]) -> List[Link]:
-    """Create or update links between notes"""
-    db_links = []
-    
+def canonical_pair(note_a: uuid.UUID, note_b: uuid.UUID) -> Tuple[uuid.UUID, uuid.UUID]:
+    """Order a note pair so each undirected link is stored exactly once"""
+    return (note_a, note_b) if note_a < note_b else (note_b, note_a)
+
+
+async def upsert_links(
+    session: AsyncSession,
+    links: List[LinkInfo],
+    max_links_per_note: int = MAX_LINKS_PER_NOTE,
+    scope: Scope = DEFAULT_SCOPE
+) -> List[Link]:
+    """Create or update links between notes of a scope, then prune the touched neighborhoods"""
+    # Collapse to one row per unordered pair, keeping the highest similarity
+    pairs: Dict[Tuple[uuid.UUID, uuid.UUID], float] = {}
     for link_data in links:
-        # Check if link already exists
-        stmt = select(Link).where(
-            Link.source_note_id == link_data.source_note,
-            Link.target_note_id == link_data.target_note
-        )
-        result = await session.execute(stmt)
-        link = result.scalar_one_or_none()
-        
-        if link:
-            # Update similarity
-            link.similarity = link_data.similarity
-        else:
-            # Create new link
-            link = Link(
-                source_note_id=link_data.source_note,
-                target_note_id=link_data.target_note,
-                similarity=link_data.similarity
-            )
-            session.add(link)
-        
-        db_links.append(link)
+        if link_data.source_note == link_data.target_note:
+            continue
+        pair = canonical_pair(link_data.source_note, link_data.target_note)
+        pairs[pair] = max(pairs.get(pair, link_data.similarity), link_data.similarity)
     
-    await session.commit()
+    if not pairs:
+        return []
     
-    # Refresh links to get their IDs
-    for link in db_links:
-        await session.refresh(link)
+    # Single INSERT ... ON CONFLICT statement for the whole batch
+    now = datetime.utcnow()
+    stmt = pg_insert(Link).values([
+        {
+            "id": uuid.uuid4(),
+            "source_note_id": source,
+            "target_note_id": target,
+            "similarity": similarity,
+            "created_at": now,
+            **scope_values(scope),
+        }
+        for (source, target), similarity in pairs.items()
+    ])
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[Link.source_note_id, Link.target_note_id],
+        set_={"similarity": stmt.excluded.similarity}
+    ).returning(Link)
+    result = await session.execute(stmt)
+    db_links = result.scalars().all()
     
+    touched = {note_id for pair in pairs for note_id in pair}
+    await prune_note_links(session, list(touched), max_links_per_note)
+    
+    await session.commit()
     return db_links
 
 
-async def get_note_links(session: AsyncSession, note_id: uuid.UUID, limit: int = 5) -> List[Link]:
-    """Get links related to a note (both incoming and outgoing)"""
-    # Get outgoing links
-    outgoing_stmt = select(Link).where(Link.source_note_id == note_id).order_by(Link.similarity.desc()).limit(limit)
-    outgoing_result = await session.execute(outgoing_stmt)
-    outgoing_links = outgoing_result.scalars().all()
-    
-    # Get incoming links
-    incoming_stmt = select(Link).where(Link.target_note_id == note_id).order_by(Link.similarity.desc()).limit(limit)
-    incoming_result = await session.execute(incoming_stmt)
-    incoming_links = incoming_result.scalars().all()
+async def prune_note_links(
+    session: AsyncSession,
+    note_ids: List[uuid.UUID],
+    max_links_per_note: int = MAX_LINKS_PER_NOTE
+) -> None:
+    """Delete the weakest links of each given note beyond the per-note cap"""
+    # Every link seen from both of its endpoints, ranked per note by similarity
+    endpoints = union_all(
+        select(
+            Link.id.label("id"),
+            Link.source_note_id.label("note_id"),
+            Link.similarity.label("similarity")
+        ),
+        select(
+            Link.id.label("id"),
+            Link.target_note_id.label("note_id"),
+            Link.similarity.label("similarity")
+        ),
+    ).subquery()
+    ranked = (
+        select(
+            endpoints.c.id,
+            func.row_number().over(
+                partition_by=endpoints.c.note_id,
+                order_by=endpoints.c.similarity.desc()
+            ).label("rank")
+        )
+        .where(endpoints.c.note_id.in_(note_ids))
+        .subquery()
+    )
+    await session.execute(
+        delete(Link).where(
+            Link.id.in_(select(ranked.c.id).where(ranked.c.rank > max_links_per_note))
+        )
+    )
+
+
+async def get_note_links(
+    session: AsyncSession,
+    note_id: uuid.UUID,
+    limit: int = 5,
+    scope: Scope = DEFAULT_SCOPE
+) -> List[Link]:
+    """Get the strongest links touching a note in one indexed query"""
+    stmt = (
+        select(Link)
+        .where(
+            or_(Link.source_note_id == note_id, Link.target_note_id == note_id),
+            in_scope(Link, scope)
+        )
+        .order_by(Link.similarity.desc())
+        .limit(limit)
+    )
+    result = await session.execute(stmt)
+    return result.scalars().all()
+
+
+async def replace_all_links(
+    session: AsyncSession,
+    links: List[Dict[str, Any]],
+    batch_size: int = 5000,
+    scope: Scope = DEFAULT_SCOPE
+) -> int:
+    """Replace every link of a scope with bulk inserts in a single transaction"""
+    await session.execute(delete(Link).where(in_scope(Link, scope)))
+    links = [{**link, **scope_values(scope)} for link in links]
     
-    # Combine and deduplicate
-    combined_links = list(set(outgoing_links + incoming_links))
-    # Sort by similarity
-    combined_links.sort(key=lambda x: x.similarity, reverse=True)
+    for start in range(0, len(links), batch_size):
+        await session.execute(insert(Link), links[start:start + batch_size])
     
-    return combined_links[:limit]
+    await session.commit()
+    return len(links)
+
+
+async def get_links_for_notes(
+    session: AsyncSession,
+    note_ids: List[uuid.UUID],
+    min_similarity: float = 0.0,
+    scope: Union[Scope, Sequence[Scope]] = DEFAULT_SCOPE
+) -> List[Any]:
+    """Get (source, target, similarity) rows touching any of the given notes in one query"""
+    if not note_ids:
+        return []
+    stmt = select(Link.source_note_id, Link.target_note_id, Link.similarity).where(
+        or_(Link.source_note_id.in_(note_ids), Link.target_note_id.in_(note_ids)),
+        Link.similarity >= min_similarity,
+        in_scope(Link, scope)
+    )
+    result = await session.execute(stmt)
+    return result.all()
+
+
+async def get_central_notes(
+    session: AsyncSession,
+    limit: int = 10,
+    scope: Scope = DEFAULT_SCOPE
+) -> List[Note]:
+    """Get the most central notes of a scope by stored PageRank"""
+    stmt = (
+        select(Note)
+        .where(Note.pagerank.is_not(None), in_scope(Note, scope))
+        .order_by(Note.pagerank.desc())
+        .limit(limit)
+    )
+    result = await session.execute(stmt)
+    return result.scalars().all()
+
+
+async def get_community_notes(
+    session: AsyncSession,
+    note_id: uuid.UUID,
+    limit: int = 50,
+    scope: Scope = DEFAULT_SCOPE
+) -> List[Note]:
+    """Get the notes in the same community as a note, most central first"""
+    # Community IDs are computed per scope, so the scope is part of the match
+    community = (
+        select(Note.community_id)
+        .where(Note.id == note_id, in_scope(Note, scope))
+        .scalar_subquery()
+    )
+    stmt = (
+        select(Note)
+        .where(Note.community_id == community, in_scope(Note, scope))
+        .order_by(Note.pagerank.desc())
+        .limit(limit)
+    )
+    result = await session.execute(stmt)
+    return result.scalars().all()
+
+
+async def list_orphan_notes(
+    session: AsyncSession,
+    limit: int = 100,
+    scope: Scope = DEFAULT_SCOPE
+) -> List[Note]:
+    """Get notes of a scope that have no incoming or outgoing links"""
+    linked = or_(Link.source_note_id == Note.id, Link.target_note_id == Note.id)
+    stmt = (
+        select(Note)
+        .where(~exists().where(linked), in_scope(Note, scope))
+        .order_by(Note.created_at.desc())
+        .limit(limit)
+    )
+    result = await session.execute(stmt)
+    return result.scalars().all()
+
+
+async def get_note_chunks(session: AsyncSession, note_id: uuid.UUID) -> List[Chunk]:
+    """Get the chunks of a note in order"""
+    stmt = select(Chunk).where(Chunk.note_id == note_id).order_by(Chunk.ordinal)
+    result = await session.execute(stmt)
+    return result.scalars().all()
+
+
+async def get_chunk_embeddings_by_hash(
+    session: AsyncSession,
+    content_hashes: List[str],
+    scope: Scope = DEFAULT_SCOPE
+) -> Dict[str, bytes]:
+    """Get stored embeddings of a scope for chunk hashes (to skip re-embedding unchanged text)"""
+    if not content_hashes:
+        return {}
+    stmt = select(Chunk.content_hash, Chunk.embedding).where(
+        Chunk.content_hash.in_(content_hashes),
+        Chunk.embedding.is_not(None),
+        in_scope(Chunk, scope)
+    )
+    result = await session.execute(stmt)
+    return {row[0]: row[1] for row in result.all()}
+
+
+async def delete_note_chunks(session: AsyncSession, note_ids: List[uuid.UUID]) -> int:
+    """Delete every chunk of the given notes without committing"""
+    if not note_ids:
+        return 0
+    result = await session.execute(delete(Chunk).where(Chunk.note_id.in_(note_ids)))
+    return result.rowcount
+
+
+async def replace_note_chunks(
+    session: AsyncSession,
+    note_id: uuid.UUID,
+    chunks: List[Dict[str, Any]],
+    scope: Scope = DEFAULT_SCOPE
+) -> List[Chunk]:
+    """Replace a note's chunks without committing (caller owns the transaction)"""
+    await delete_note_chunks(session, [note_id])
+    rows = [Chunk(note_id=note_id, **chunk, **scope_values(scope)) for chunk in chunks]
+    session.add_all(rows)
+    await session.flush()
+    return rows
@@ -1,13 +1,21 @@
 import os
+import asyncio
 from typing import Optional, List, Dict, Any
 
-from langchain_openai import OpenAIEmbeddings
-from langchain_community.vectorstores.faiss import FAISS
-from langchain_pinecone import PineconeVectorStore
-from langchain_text_splitters import RecursiveCharacterTextSplitter
+from langchain_core.embeddings import Embeddings
 from langchain_core.documents import Document
 import logging
 
+from services.chunk_store import PostgresChunkStore
+from services.chunking import get_chunker
+from services.coalesce import CoalescingEmbeddings
+from services.local_embeddings import LOCAL_EMBEDDING_MODEL_PATH, get_local_embeddings
+from services.rate_limit import RateLimitedEmbeddings
+from services.segment_index import SegmentVectorStore, get_segment_index, segment_root
+from services.tenancy import Scope
+from services.tracing import span
+from services.vector_index import VECTOR_DIMS, VECTOR_STORAGE, CompactVectorStore
+
 # Environment variables
 OPENAI_API_KEY = os.getenv("OPENAI_API_KEY")
 OPENAI_EMBEDDING_MODEL = os.getenv("OPENAI_EMBEDDING_MODEL", "text-embedding-3-small")
@@ -16,33 +24,94 @@ PINECONE_ENV = os.getenv("PINECONE_ENV")
 PINECONE_INDEX = os.getenv("PINECONE_INDEX", "ai-second-brain")
 USE_FAISS_FALLBACK = os.getenv("USE_FAISS_FALLBACK", "true").lower() == "true"
 
+# Vector store: "auto" (Pinecone, else the local fallback), "postgres" (chunks table)
+# or "segments" (memory-mapped local segments shared by every worker)
+VECTOR_STORE = os.getenv("VECTOR_STORE", "auto").lower()
+
+# Embedding backend: "openai" or "local" (ONNX model on the CPU). EMBEDDING_BACKENDS
+# overrides it per index, e.g. "ai-second-brain=openai,offline-notes=local"
+EMBEDDING_BACKEND = os.getenv("EMBEDDING_BACKEND", "openai").lower()
+EMBEDDING_BACKENDS = dict(
+    item.strip().split("=", 1)
+    for item in os.getenv("EMBEDDING_BACKENDS", "").split(",")
+    if "=" in item
+)
+
 # Configure logger
 logger = logging.getLogger(__name__)
 
 
-def get_embeddings_model() -> OpenAIEmbeddings:
-    """Get the embeddings model with environment defaults"""
-    return OpenAIEmbeddings(
+def get_embedding_backend(index_name: Optional[str] = None) -> str:
+    """Get the embedding backend configured for an index"""
+    index = index_name or PINECONE_INDEX
+    return EMBEDDING_BACKENDS.get(index, EMBEDDING_BACKEND).strip().lower()
+
+
+def embedding_model_id(backend: Optional[str] = None) -> str:
+    """Identity of the vectors a backend produces (backend and model)"""
+    backend = (backend or EMBEDDING_BACKEND).lower()
+    if backend == "local":
+        return f"local:{LOCAL_EMBEDDING_MODEL_PATH}"
+    return f"{backend}:{OPENAI_EMBEDDING_MODEL}"
+
+
+def get_embeddings_model(backend: Optional[str] = None) -> Embeddings:
+    """
+    Get the embeddings model with environment defaults
+    
+    The "openai" backend goes through the shared rate limiter; the "local"
+    backend runs an ONNX model on the CPU with no network access. Either way,
+    concurrent requests to embed the same text share one computation.
+    
+    Args:
+        backend: "openai" or "local" (defaults to EMBEDDING_BACKEND)
+    """
+    backend = (backend or EMBEDDING_BACKEND).lower()
+    if backend == "local":
+        return CoalescingEmbeddings(
+            get_local_embeddings(),
+            namespace=f"local:{LOCAL_EMBEDDING_MODEL_PATH}",
+        )
+    if backend != "openai":
+        raise ValueError(f"Unknown embedding backend: {backend}")
+    
+    # Provider packages are imported by the backend that needs them
+    from langchain_openai import OpenAIEmbeddings
+    
+    # Retries are handled by the limiter so it can see 429s
+    embeddings = RateLimitedEmbeddings(OpenAIEmbeddings(
         model=OPENAI_EMBEDDING_MODEL,
         api_key=OPENAI_API_KEY,
-    )
+        max_retries=0,
+    ))
+    return CoalescingEmbeddings(embeddings, namespace=OPENAI_EMBEDDING_MODEL)
 
 
-def get_vector_store(index_name: Optional[str] = None) -> Any:
+def get_vector_store(index_name: Optional[str] = None, scope: Optional[Scope] = None) -> Any:
     """
     Get vector store based on environment configuration
     Falls back to FAISS if Pinecone config is missing
+    
+    A scope selects the tenant workspace's shard: a Pinecone namespace or
+    its own segment directory. Without one the default scope is used.
     """
-    embeddings = get_embeddings_model()
     index = index_name or PINECONE_INDEX
+    embeddings = get_embeddings_model(get_embedding_backend(index))
+    
+    if VECTOR_STORE == "segments":
+        # Persistent local index, memory-mapped once per process
+        return SegmentVectorStore(embeddings, get_segment_index(segment_root(index, scope)))
     
     # Check if Pinecone configuration is available
     if PINECONE_API_KEY and PINECONE_ENV and not USE_FAISS_FALLBACK:
         try:
             # Initialize Pinecone vector store
+            from langchain_pinecone import PineconeVectorStore
+            
             vector_store = PineconeVectorStore(
                 index_name=index,
                 embedding=embeddings,
+                namespace=scope.namespace if scope else None,
             )
             logger.info(f"Using Pinecone vector store with index: {index}")
             return vector_store
@@ -51,7 +120,19 @@ def get_vector_store(index_name: Optional[str] = None) -> Any:
             if not USE_FAISS_FALLBACK:
                 raise
     
+    # Compact local store when quantized or truncated storage is configured
+    if VECTOR_STORAGE != "float32" or VECTOR_DIMS > 0:
+        logger.info(
+            f"Using compact vector store (local, {VECTOR_STORAGE}, dims={VECTOR_DIMS or 'full'})"
+        )
+        return lambda documents: CompactVectorStore.from_documents(
+            documents=documents,
+            embedding=embeddings,
+        )
+    
     # Fallback to FAISS
+    from langchain_community.vectorstores.faiss import FAISS
+    
     logger.info("Using FAISS vector store (local)")
     # For FAISS, we'll return a function that creates a new store since
     # it needs documents to initialize
@@ -63,11 +144,8 @@ def get_vector_store(index_name: Optional[str] = None) -> Any:
 
 def create_chunks_from_text(text: str, note_id: str, metadata: Optional[Dict[str, Any]] = None) -> List[Document]:
     """Create document chunks from text with metadata"""
-    # Text splitter
-    text_splitter = RecursiveCharacterTextSplitter(
-        chunk_size=1000,
-        chunk_overlap=150,
-    )
+    # Shared Markdown-aware, token-sized chunker (results cached per text)
+    text_splitter = get_chunker()
     
     # Create base metadata
     meta = {"note_id": note_id}
@@ -75,10 +153,11 @@ def create_chunks_from_text(text: str, note_id: str, metadata: Optional[Dict[str
         meta.update(metadata)
     
     # Create documents
-    documents = text_splitter.create_documents(
-        texts=[text],
-        metadatas=[meta]
-    )
+    with span("ingest.chunk", stage="chunking", characters=len(text)):
+        documents = text_splitter.create_documents(
+            texts=[text],
+            metadatas=[meta]
+        )
     
     return documents
 
@@ -88,15 +167,30 @@ async def index_note(vector_store, text: str, note_id: str, metadata: Optional[D
     # Create chunks
     chunks = create_chunks_from_text(text, note_id, metadata)
     
-    # Add to vector store
-    if isinstance(vector_store, PineconeVectorStore):
-        # For Pinecone
-        vector_store.add_documents(chunks)
-    else:
-        # For FAISS (or other stores requiring initialization with documents)
-        if not hasattr(vector_store, 'add_documents'):
-            vector_store = vector_store(chunks)
+    # Add to vector store (embedding and writing)
+    with span("ingest.index", chunks=len(chunks)):
+        if isinstance(vector_store, PostgresChunkStore):
+            # Written in the caller's transaction
+            await vector_store.aadd_documents(chunks)
+        elif hasattr(vector_store, 'add_documents'):
+            # For Pinecone or segments (or any initialized store); embedding and writing block
+            await asyncio.to_thread(vector_store.add_documents, chunks)
         else:
-            vector_store.add_documents(chunks)
+            # For FAISS (or other stores requiring initialization with documents)
+            vector_store = vector_store(chunks)
     
     return len(chunks)
+
+
+async def delete_note_vectors(vector_store, note_ids: List[str]) -> None:
+    """Remove every chunk of the given notes from the vector store"""
+    if isinstance(vector_store, PostgresChunkStore):
+        # Deleted in the caller's transaction
+        await vector_store.adelete(note_ids=note_ids)
+    elif isinstance(vector_store, SegmentVectorStore):
+        # Tombstoned; compaction reclaims the rows later
+        await asyncio.to_thread(vector_store.delete, note_ids=note_ids)
+    elif hasattr(vector_store, 'delete'):
+        # For Pinecone, by metadata filter
+        await asyncio.to_thread(vector_store.delete, filter={"note_id": {"$in": note_ids}})
+    # Stores built per request (FAISS, compact) hold nothing to delete
@@ -1,13 +1,35 @@
+import os
+import re
+import time
+import asyncio
 import uuid
-from typing import List, Dict, Any, Optional
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from typing import Callable, List, Dict, Any, Optional, Sequence, Tuple, Union
 import logging
 
+import numpy as np
+from sqlalchemy import select
+
+from langchain_core.documents import Document
 from langchain_core.retrievers import BaseRetriever
 from sqlalchemy.ext.asyncio import AsyncSession
 
 from services.retriever import make_retriever
-from services.database import upsert_links, get_note_links
+from services.embeddings import create_chunks_from_text, get_embeddings_model
+from services.database import (
+    MAX_LINKS_PER_NOTE,
+    canonical_pair,
+    in_scope,
+    upsert_links,
+    get_note_links,
+    get_links_for_notes,
+    get_notes_by_ids,
+    replace_all_links,
+)
+from models.orm import Note
 from models.schemas import LinkInfo
+from services.tenancy import DEFAULT_SCOPE, Scope
 
 # Configure logger
 logger = logging.getLogger(__name__)
@@ -15,6 +37,11 @@ logger = logging.getLogger(__name__)
 # Default parameters
 DEFAULT_SIMILARITY_THRESHOLD = 0.7
 DEFAULT_TOP_K = 5
+MAX_EXPANSION_HOPS = 2
+DEFAULT_MAX_EXPANSION = 4
+DEFAULT_BLOCK_SIZE = 1024
+DEFAULT_EMBED_BATCH_SIZE = 256
+NOTE_VECTOR_MAX_CHARS = 8000
 
 
 async def link_related_notes(
@@ -24,9 +51,10 @@ async def link_related_notes(
     k: int = DEFAULT_TOP_K,
     index_name: Optional[str] = None,
     similarity_threshold: float = DEFAULT_SIMILARITY_THRESHOLD,
+    scope: Scope = DEFAULT_SCOPE,
 ) -> List[LinkInfo]:
     """
-    Find and store links to semantically related notes
+    Find and store links to semantically related notes of the same scope
     
     Args:
         session: Database session
@@ -35,6 +63,7 @@ async def link_related_notes(
         k: Number of related notes to find
         index_name: Name of the vector index
         similarity_threshold: Minimum similarity score to create a link
+        scope: Tenant and workspace of the note
     
     Returns:
         List of created links
@@ -42,7 +71,8 @@ async def link_related_notes(
     try:
         # Get or create a retriever
         if retriever is None:
-            retriever = make_retriever(index_name=index_name, k=k+1)  # +1 to account for self-match
+            # +1 to account for self-match
+            retriever = make_retriever(index_name=index_name, k=k+1, scope=scope)
         
         # Create a simple query from the note ID to find similar content
         # In a real application, you might use the note content as the query
@@ -59,7 +89,7 @@ async def link_related_notes(
             # Skip self-matches and notes below threshold
             if str(target_note_id) == str(note_id) or similarity < similarity_threshold:
                 continue
-                
+            
             # Create link
             link = LinkInfo(
                 source_note=note_id,
@@ -73,7 +103,7 @@ async def link_related_notes(
         
         # Save links to database
         if links:
-            await upsert_links(session, links)
+            await upsert_links(session, links, scope=scope)
         
         return links
     except Exception as e:
@@ -84,7 +114,8 @@ async def link_related_notes(
 async def get_note_neighborhood(
     session: AsyncSession,
     note_id: uuid.UUID,
-    limit: int = DEFAULT_TOP_K
+    limit: int = DEFAULT_TOP_K,
+    scope: Scope = DEFAULT_SCOPE
 ) -> List[LinkInfo]:
     """
     Get a note's neighborhood (incoming and outgoing links)
@@ -97,13 +128,15 @@ async def get_note_neighborhood(
     Returns:
         List of links
     """
-    links = await get_note_links(session, note_id, limit)
+    links = await get_note_links(session, note_id, limit, scope=scope)
     
-    # Convert to LinkInfo format
+    # Convert to LinkInfo format, oriented away from the requested note
     return [
         LinkInfo(
-            source_note=link.source_note_id,
-            target_note=link.target_note_id,
+            source_note=note_id,
+            target_note=(
+                link.target_note_id if link.source_note_id == note_id else link.source_note_id
+            ),
             similarity=link.similarity
         )
         for link in links
@@ -112,7 +145,8 @@ async def get_note_neighborhood(
 
 async def get_graph_data(
     session: AsyncSession,
-    limit: int = 100
+    limit: int = 100,
+    scope: Scope = DEFAULT_SCOPE
 ) -> Dict[str, Any]:
     """
     Get graph data for visualization
@@ -120,14 +154,20 @@ async def get_graph_data(
     Args:
         session: Database session
         limit: Maximum number of links to return
+        scope: Tenant and workspace to draw
     
     Returns:
         Dict with nodes and edges for visualization
     """
     from models.orm import Link as LinkORM
     from sqlalchemy import select
-
-    stmt = select(LinkORM).order_by(LinkORM.similarity.desc()).limit(limit)
+    
+    stmt = (
+        select(LinkORM)
+        .where(in_scope(LinkORM, scope))
+        .order_by(LinkORM.similarity.desc())
+        .limit(limit)
+    )
     result = await session.execute(stmt)
     links = result.scalars().all()
     
@@ -150,3 +190,275 @@ async def get_graph_data(
             for link in links
         ]
     }
+
+
+async def expand_note_neighborhood(
+    session: AsyncSession,
+    seed_note_ids: List[uuid.UUID],
+    hops: int = 1,
+    max_expansion: int = DEFAULT_MAX_EXPANSION,
+    min_similarity: float = DEFAULT_SIMILARITY_THRESHOLD,
+    scope: Union[Scope, Sequence[Scope]] = DEFAULT_SCOPE,
+) -> Dict[uuid.UUID, float]:
+    """
+    Expand seed notes along stored links, weighting each hop by similarity
+    
+    Args:
+        session: Database session
+        seed_note_ids: Notes already retrieved (score 1.0)
+        hops: Number of link hops to follow (capped at MAX_EXPANSION_HOPS)
+        max_expansion: Maximum number of new notes to return
+        min_similarity: Minimum link similarity to follow
+        scope: Scope (or scopes) whose links may be followed
+    
+    Returns:
+        Mapping of newly reached note IDs to their path score (product of similarities)
+    """
+    visited = set(seed_note_ids)
+    frontier = {note_id: 1.0 for note_id in seed_note_ids}
+    reached: Dict[uuid.UUID, float] = {}
+    
+    for _ in range(min(hops, MAX_EXPANSION_HOPS)):
+        if not frontier:
+            break
+        
+        # One query per hop for every edge touching the frontier
+        rows = await get_links_for_notes(session, list(frontier), min_similarity, scope=scope)
+        
+        next_frontier: Dict[uuid.UUID, float] = {}
+        for source, target, similarity in rows:
+            for near, far in ((source, target), (target, source)):
+                if near in frontier and far not in visited:
+                    score = frontier[near] * similarity
+                    if score > next_frontier.get(far, 0.0):
+                        next_frontier[far] = score
+        
+        visited.update(next_frontier)
+        reached.update(next_frontier)
+        frontier = next_frontier
+    
+    top = sorted(reached.items(), key=lambda item: item[1], reverse=True)[:max_expansion]
+    return dict(top)
+
+
+def select_best_chunk(text: str, note_id: str, query: str) -> Optional[Document]:
+    """Pick the chunk of a note with the largest term overlap with the query"""
+    chunks = create_chunks_from_text(text, note_id)
+    if not chunks:
+        return None
+    
+    terms = set(re.findall(r"\w+", query.lower()))
+    return max(
+        chunks,
+        key=lambda chunk: len(terms & set(re.findall(r"\w+", chunk.page_content.lower())))
+    )
+
+
+class GraphExpandedRetriever(BaseRetriever):
+    """
+    Retriever that adds chunks from notes linked to the top hits
+    
+    Linked notes are fetched in one batched query and contribute their most
+    query-relevant chunk, so no extra embedding calls or larger k are needed.
+    Async-only, since link expansion reads from the database. Expansion
+    stays within the scopes that were searched.
+    """
+    
+    base_retriever: BaseRetriever
+    session: Any
+    scopes: List[Any] = [DEFAULT_SCOPE]
+    hops: int = 1
+    max_expansion: int = DEFAULT_MAX_EXPANSION
+    min_similarity: float = DEFAULT_SIMILARITY_THRESHOLD
+    
+    def _get_relevant_documents(self, query: str) -> List[Document]:
+        logger.warning("GraphExpandedRetriever called synchronously; skipping link expansion")
+        return self.base_retriever.invoke(query)
+    
+    async def _aget_relevant_documents(self, query: str) -> List[Document]:
+        docs = await self.base_retriever.ainvoke(query)
+        
+        seed_ids = []
+        for doc in docs:
+            try:
+                seed_ids.append(uuid.UUID(str(doc.metadata.get("note_id"))))
+            except ValueError:
+                continue
+        
+        if not seed_ids or self.hops <= 0:
+            return docs
+        
+        neighbors = await expand_note_neighborhood(
+            self.session,
+            seed_ids,
+            hops=self.hops,
+            max_expansion=self.max_expansion,
+            min_similarity=self.min_similarity,
+            scope=self.scopes,
+        )
+        notes = await get_notes_by_ids(self.session, list(neighbors), scope=self.scopes)
+        
+        expanded = []
+        for note in sorted(notes, key=lambda n: neighbors[n.id], reverse=True):
+            chunk = select_best_chunk(note.body or "", str(note.id), query)
+            if chunk is None:
+                continue
+            chunk.metadata.update({
+                "title": note.title,
+                "expanded": True,
+                "graph_score": neighbors[note.id],
+            })
+            expanded.append(chunk)
+        
+        return docs + expanded
+
+
+def top_k_neighbors(
+    vectors: np.ndarray,
+    k: int = DEFAULT_TOP_K,
+    similarity_threshold: float = DEFAULT_SIMILARITY_THRESHOLD,
+    block_size: int = DEFAULT_BLOCK_SIZE,
+    max_workers: Optional[int] = None,
+) -> List[Tuple[int, int, float]]:
+    """
+    All-pairs top-k cosine neighbors via blocked matrix multiplication
+    
+    Rows are processed in blocks of block_size so the similarity matrix held
+    in memory is at most block_size x N; blocks run on a thread pool (NumPy
+    releases the GIL inside matmul).
+    
+    Args:
+        vectors: (N, D) matrix of note vectors
+        k: Neighbors to keep per note
+        similarity_threshold: Minimum cosine similarity to keep
+        block_size: Rows per block
+        max_workers: Thread pool size (defaults to the CPU count)
+    
+    Returns:
+        List of (row, neighbor_row, similarity) triples
+    """
+    n = len(vectors)
+    if n < 2 or k <= 0:
+        return []
+    
+    matrix = np.asarray(vectors, dtype=np.float32)
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    matrix = matrix / np.maximum(norms, 1e-12)
+    k = min(k, n - 1)
+    
+    def process_block(start: int) -> List[Tuple[int, int, float]]:
+        block = matrix[start:start + block_size]
+        sims = block @ matrix.T
+        rows = np.arange(len(block))
+        sims[rows, start + rows] = -np.inf  # exclude self-matches
+        
+        top = np.argpartition(-sims, k - 1, axis=1)[:, :k]
+        top_sims = np.take_along_axis(sims, top, axis=1)
+        
+        keep = top_sims >= similarity_threshold
+        block_rows = np.broadcast_to((start + rows)[:, None], top.shape)
+        return list(zip(
+            block_rows[keep].tolist(),
+            top[keep].tolist(),
+            top_sims[keep].astype(float).tolist(),
+            strict=True,
+        ))
+    
+    with ThreadPoolExecutor(max_workers=max_workers or os.cpu_count()) as executor:
+        blocks = executor.map(process_block, range(0, n, block_size))
+        return [triple for block in blocks for triple in block]
+
+
+def prune_pairs(
+    triples: List[Tuple[int, int, float]],
+    max_links_per_note: int = MAX_LINKS_PER_NOTE,
+) -> List[Tuple[int, int, float]]:
+    """
+    Collapse directed neighbor triples to unordered pairs under a per-note cap
+    
+    Pairs are accepted strongest first while both endpoints are below the
+    cap, so no note ends up with more than max_links_per_note links.
+    """
+    pairs: Dict[Tuple[int, int], float] = {}
+    for source, target, similarity in triples:
+        pair = (source, target) if source < target else (target, source)
+        pairs[pair] = max(pairs.get(pair, similarity), similarity)
+    
+    degree: Dict[int, int] = {}
+    kept = []
+    for (a, b), similarity in sorted(pairs.items(), key=lambda item: item[1], reverse=True):
+        if degree.get(a, 0) < max_links_per_note and degree.get(b, 0) < max_links_per_note:
+            degree[a] = degree.get(a, 0) + 1
+            degree[b] = degree.get(b, 0) + 1
+            kept.append((a, b, similarity))
+    return kept
+
+
+def embed_note_texts(texts: List[str], batch_size: int = DEFAULT_EMBED_BATCH_SIZE) -> np.ndarray:
+    """Embed one vector per note in batched embedding calls"""
+    embeddings = get_embeddings_model()
+    vectors = []
+    for start in range(0, len(texts), batch_size):
+        vectors.extend(embeddings.embed_documents(texts[start:start + batch_size]))
+    return np.asarray(vectors, dtype=np.float32)
+
+
+async def relink_all_notes(
+    session: AsyncSession,
+    k: int = DEFAULT_TOP_K,
+    similarity_threshold: float = DEFAULT_SIMILARITY_THRESHOLD,
+    block_size: int = DEFAULT_BLOCK_SIZE,
+    embed_fn: Optional[Callable[[List[str]], np.ndarray]] = None,
+    scope: Scope = DEFAULT_SCOPE,
+) -> Dict[str, Any]:
+    """
+    Recompute links for every note of a scope in one vectorized pass and bulk-write them
+    
+    Args:
+        session: Database session
+        k: Neighbors to keep per note
+        similarity_threshold: Minimum similarity to create a link
+        block_size: Rows per similarity block
+        embed_fn: Maps note texts to an (N, D) matrix (defaults to embed_note_texts)
+        scope: Tenant and workspace to relink (links never cross scopes)
+    
+    Returns:
+        Summary with note count, link count and elapsed seconds
+    """
+    started = time.perf_counter()
+    
+    result = await session.execute(
+        select(Note.id, Note.title, Note.body).where(in_scope(Note, scope))
+    )
+    rows = result.all()
+    if not rows:
+        return {"notes": 0, "links": 0, "seconds": 0.0}
+    
+    note_ids = [row[0] for row in rows]
+    texts = [
+        f"{row[1] or ''}\n{row[2] or ''}".strip()[:NOTE_VECTOR_MAX_CHARS]
+        for row in rows
+    ]
+    # Embedding calls and the blocked matmul run off the event loop
+    vectors = await asyncio.to_thread(embed_fn or embed_note_texts, texts)
+    
+    neighbors = await asyncio.to_thread(
+        top_k_neighbors, vectors, k, similarity_threshold, block_size
+    )
+    
+    now = datetime.utcnow()
+    links = []
+    for source, target, similarity in prune_pairs(neighbors):
+        source_id, target_id = canonical_pair(note_ids[source], note_ids[target])
+        links.append({
+            "id": uuid.uuid4(),
+            "source_note_id": source_id,
+            "target_note_id": target_id,
+            "similarity": similarity,
+            "created_at": now,
+        })
+    written = await replace_all_links(session, links, scope=scope)
+    
+    elapsed = time.perf_counter() - started
+    logger.info(f"Relinked {len(note_ids)} notes with {written} links in {elapsed:.1f}s")
+    return {"notes": len(note_ids), "links": written, "seconds": round(elapsed, 3)}
@@ -0,0 +1,361 @@
+import uuid
+from typing import Any, Dict, List, Optional, Sequence
+import logging
+
+import numpy as np
+from sqlalchemy import select, update
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from models.orm import Note, Link
+from services.database import in_scope
+from services.tenancy import DEFAULT_SCOPE, Scope
+
+# Configure logger
+logger = logging.getLogger(__name__)
+
+# Default parameters
+DEFAULT_DAMPING = 0.85
+DEFAULT_TOLERANCE = 1e-6
+DEFAULT_MAX_ITER = 100
+DEFAULT_COMMUNITY_MAX_ITER = 20
+
+
+class CSRGraph:
+    """
+    Compact undirected weighted graph in CSR (compressed sparse row) form
+    
+    Note UUIDs are mapped to dense integer positions; the neighbors of node i
+    are indices[indptr[i]:indptr[i + 1]] with matching weights.
+    """
+    
+    def __init__(
+        self,
+        node_ids: List[uuid.UUID],
+        indptr: np.ndarray,
+        indices: np.ndarray,
+        weights: np.ndarray,
+    ):
+        self.node_ids = node_ids
+        self.indptr = indptr
+        self.indices = indices
+        self.weights = weights
+        self.position = {node_id: i for i, node_id in enumerate(node_ids)}
+    
+    @property
+    def num_nodes(self) -> int:
+        return len(self.node_ids)
+    
+    @property
+    def num_edges(self) -> int:
+        # Every undirected edge is stored once per endpoint
+        return len(self.indices) // 2
+    
+    @property
+    def degree(self) -> np.ndarray:
+        return np.diff(self.indptr)
+    
+    def row_ids(self) -> np.ndarray:
+        """Source position of every stored edge (the expanded form of indptr)"""
+        return np.repeat(np.arange(self.num_nodes), self.degree)
+
+
+def build_csr_graph(
+    node_ids: Sequence[uuid.UUID],
+    sources: Sequence[uuid.UUID],
+    targets: Sequence[uuid.UUID],
+    similarities: Sequence[float],
+) -> CSRGraph:
+    """
+    Build a symmetric CSR graph from link rows
+    
+    Args:
+        node_ids: All note IDs (notes without links become isolated nodes)
+        sources: Link source note IDs
+        targets: Link target note IDs
+        similarities: Link weights
+    
+    Returns:
+        CSRGraph with one entry per link direction; duplicate pairs keep the max weight
+    """
+    node_ids = list(node_ids)
+    position = {node_id: i for i, node_id in enumerate(node_ids)}
+    n = len(node_ids)
+    
+    src = np.fromiter((position.get(s, -1) for s in sources), dtype=np.int64, count=len(sources))
+    dst = np.fromiter((position.get(t, -1) for t in targets), dtype=np.int64, count=len(targets))
+    w = np.asarray(similarities, dtype=np.float64)
+    
+    # Drop links to unknown notes and self-loops
+    valid = (src >= 0) & (dst >= 0) & (src != dst)
+    src, dst, w = src[valid], dst[valid], w[valid]
+    
+    # Mirror every edge, then collapse duplicate (row, col) pairs keeping the max weight
+    rows = np.concatenate([src, dst])
+    cols = np.concatenate([dst, src])
+    w = np.concatenate([w, w])
+    
+    order = np.lexsort((-w, cols, rows))
+    rows, cols, w = rows[order], cols[order], w[order]
+    if len(rows):
+        first = np.ones(len(rows), dtype=bool)
+        first[1:] = (rows[1:] != rows[:-1]) | (cols[1:] != cols[:-1])
+        rows, cols, w = rows[first], cols[first], w[first]
+    
+    indptr = np.zeros(n + 1, dtype=np.int64)
+    np.cumsum(np.bincount(rows, minlength=n), out=indptr[1:])
+    
+    return CSRGraph(node_ids, indptr, cols.astype(np.int64), w)
+
+
+def pagerank(
+    graph: CSRGraph,
+    damping: float = DEFAULT_DAMPING,
+    tol: float = DEFAULT_TOLERANCE,
+    max_iter: int = DEFAULT_MAX_ITER,
+    initial: Optional[np.ndarray] = None,
+) -> Dict[str, Any]:
+    """
+    Weighted PageRank by power iteration over the CSR arrays
+    
+    Args:
+        graph: The link graph
+        damping: Probability of following a link instead of teleporting
+        tol: L1 convergence threshold
+        max_iter: Maximum number of iterations
+        initial: Optional warm-start vector (e.g. previously stored scores)
+    
+    Returns:
+        Dict with "scores" (sums to 1) and "iterations"
+    """
+    n = graph.num_nodes
+    if n == 0:
+        return {"scores": np.zeros(0), "iterations": 0}
+    
+    if initial is not None and len(initial) == n and initial.sum() > 0:
+        scores = initial / initial.sum()
+    else:
+        scores = np.full(n, 1.0 / n)
+    
+    rows = graph.row_ids()
+    out_weight = np.bincount(rows, weights=graph.weights, minlength=n)
+    dangling = out_weight == 0
+    inv_out = np.divide(1.0, out_weight, out=np.zeros(n), where=~dangling)
+    
+    iterations = 0
+    while iterations < max_iter:
+        iterations += 1
+        contrib = (scores * inv_out)[rows] * graph.weights
+        spread = np.bincount(graph.indices, weights=contrib, minlength=n)
+        dangling_mass = scores[dangling].sum()
+        updated = damping * (spread + dangling_mass / n) + (1.0 - damping) / n
+        
+        delta = np.abs(updated - scores).sum()
+        scores = updated
+        if delta < tol:
+            break
+    
+    return {"scores": scores, "iterations": iterations}
+
+
+def connected_components(graph: CSRGraph) -> np.ndarray:
+    """
+    Label connected components using min-label propagation with pointer jumping
+    
+    Returns:
+        Array of dense component IDs (0..k-1), numbered by first appearance
+    """
+    n = graph.num_nodes
+    labels = np.arange(n)
+    rows = graph.row_ids()
+    
+    while True:
+        previous = labels.copy()
+        # Pull the smallest label across every edge, then shortcut label chains
+        np.minimum.at(labels, rows, labels[graph.indices])
+        labels = labels[labels]
+        if np.array_equal(labels, previous):
+            break
+    
+    return _compact_labels(labels)
+
+
+def detect_communities(
+    graph: CSRGraph,
+    initial: Optional[np.ndarray] = None,
+    max_iter: int = DEFAULT_COMMUNITY_MAX_ITER,
+    components: Optional[np.ndarray] = None,
+) -> Dict[str, Any]:
+    """
+    Weighted label propagation community detection
+    
+    Each node adopts the label with the largest total edge weight among its
+    neighbors (its own label counts as a self-loop to damp oscillation).
+    Propagation never splits a label, so a warm-started label shared by notes
+    that are no longer linked is split by connected component afterwards:
+    a community never spans notes with no path between them.
+    
+    Args:
+        graph: The link graph
+        initial: Optional warm-start labels (e.g. previously stored communities)
+        max_iter: Maximum number of propagation rounds
+        components: Connected component labels, if already computed
+    
+    Returns:
+        Dict with dense "labels" and "iterations"
+    """
+    n = graph.num_nodes
+    if n == 0:
+        return {"labels": np.zeros(0, dtype=np.int64), "iterations": 0}
+    
+    labels = np.arange(n) if initial is None else np.asarray(initial, dtype=np.int64).copy()
+    
+    rows = graph.row_ids()
+    degree = graph.degree
+    # Self-loop weight: a node's mean link weight (1.0 for isolated nodes)
+    self_weight = np.divide(
+        np.bincount(rows, weights=graph.weights, minlength=n),
+        degree,
+        out=np.ones(n),
+        where=degree > 0,
+    )
+    voters = np.concatenate([rows, np.arange(n)])
+    vote_weights = np.concatenate([graph.weights, self_weight])
+    
+    iterations = 0
+    while iterations < max_iter:
+        iterations += 1
+        candidates = np.concatenate([labels[graph.indices], labels])
+        
+        # Sum vote weight per (node, label) pair
+        keys = voters * (labels.max() + 1) + candidates
+        unique_keys, inverse = np.unique(keys, return_inverse=True)
+        totals = np.bincount(inverse, weights=vote_weights)
+        key_nodes = unique_keys // (labels.max() + 1)
+        key_labels = unique_keys % (labels.max() + 1)
+        
+        # Pick the heaviest label per node (ties broken by the smaller label)
+        order = np.lexsort((key_labels, -totals, key_nodes))
+        best = np.ones(len(order), dtype=bool)
+        best[1:] = key_nodes[order][1:] != key_nodes[order][:-1]
+        updated = labels.copy()
+        updated[key_nodes[order][best]] = key_labels[order][best]
+        
+        changed = np.count_nonzero(updated != labels)
+        labels = updated
+        if changed == 0:
+            break
+    
+    if components is None:
+        components = connected_components(graph)
+    labels = _compact_labels(labels) * (int(components.max()) + 1) + components
+    
+    return {"labels": _compact_labels(labels), "iterations": iterations}
+
+
+def _compact_labels(labels: np.ndarray) -> np.ndarray:
+    """Renumber arbitrary labels to 0..k-1 in order of first appearance"""
+    _, first_index, inverse = np.unique(labels, return_index=True, return_inverse=True)
+    rank = np.empty(len(first_index), dtype=np.int64)
+    rank[np.argsort(first_index)] = np.arange(len(first_index))
+    return rank[inverse]
+
+
+async def load_link_graph(session: AsyncSession, scope: Scope = DEFAULT_SCOPE) -> CSRGraph:
+    """Load the notes and links of a scope into a CSR graph using column-only queries"""
+    note_result = await session.execute(select(Note.id).where(in_scope(Note, scope)))
+    node_ids = list(note_result.scalars().all())
+    
+    link_result = await session.execute(
+        select(Link.source_note_id, Link.target_note_id, Link.similarity)
+        .where(in_scope(Link, scope))
+    )
+    rows = link_result.all()
+    
+    return build_csr_graph(
+        node_ids,
+        [row[0] for row in rows],
+        [row[1] for row in rows],
+        [row[2] for row in rows],
+    )
+
+
+async def compute_graph_analytics(
+    session: AsyncSession,
+    incremental: bool = True,
+    scope: Scope = DEFAULT_SCOPE,
+) -> Dict[str, Any]:
+    """
+    Compute PageRank, connected components and communities and store them on notes
+    
+    Each scope is its own graph (links never cross tenants or workspaces),
+    so a run only loads and updates the notes of one scope.
+    
+    Args:
+        session: Database session
+        incremental: Warm-start from the scores and communities already stored
+            on notes, so small graph changes converge in a few iterations
+        scope: Tenant and workspace to analyze
+    
+    Returns:
+        Summary statistics of the run
+    """
+    graph = await load_link_graph(session, scope)
+    n = graph.num_nodes
+    
+    initial_scores = None
+    initial_labels = None
+    if incremental and n:
+        result = await session.execute(
+            select(Note.id, Note.pagerank, Note.community_id).where(in_scope(Note, scope))
+        )
+        previous = {row[0]: (row[1], row[2]) for row in result.all()}
+        initial_scores, initial_labels = _warm_start(graph, previous)
+    
+    ranked = pagerank(graph, initial=initial_scores)
+    components = connected_components(graph)
+    communities = detect_communities(graph, initial=initial_labels, components=components)
+    
+    # Bulk UPDATE by primary key in one executemany round trip
+    if n:
+        await session.execute(
+            update(Note),
+            [
+                {
+                    "id": node_id,
+                    "pagerank": float(ranked["scores"][i]),
+                    "component_id": int(components[i]),
+                    "community_id": int(communities["labels"][i]),
+                }
+                for i, node_id in enumerate(graph.node_ids)
+            ],
+        )
+        await session.commit()
+    
+    stats = {
+        "nodes": n,
+        "edges": graph.num_edges,
+        "components": int(components.max()) + 1 if n else 0,
+        "communities": int(communities["labels"].max()) + 1 if n else 0,
+        "orphans": int(np.count_nonzero(graph.degree == 0)),
+        "pagerank_iterations": ranked["iterations"],
+        "community_iterations": communities["iterations"],
+    }
+    logger.info(f"Graph analytics computed: {stats}")
+    return stats
+
+
+def _warm_start(graph: CSRGraph, previous: Dict[uuid.UUID, Any]) -> Any:
+    """Build warm-start vectors from stored values; new notes get neutral defaults"""
+    n = graph.num_nodes
+    scores = np.full(n, 1.0 / n)
+    labels = np.arange(n)
+    # Offset fresh labels past every stored community ID so they never collide
+    offset = max((c for _, c in previous.values() if c is not None), default=-1) + 1
+    
+    for i, node_id in enumerate(graph.node_ids):
+        stored_rank, stored_community = previous.get(node_id, (None, None))
+        if stored_rank is not None:
+            scores[i] = stored_rank
+        labels[i] = stored_community if stored_community is not None else offset + i
+    
+    return scores, labels
@@ -0,0 +1,190 @@
+import os
+import time
+import asyncio
+from typing import Any, Awaitable, Callable, Dict, NamedTuple
+import logging
+
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from models.schemas import ProbeResult
+from services.chunk_store import has_pgvector
+from services.coalesce import SingleFlight
+from services.database import async_session
+from services.segment_index import VECTOR_SEGMENT_DIR, get_segment_index
+from services.embeddings import (
+    EMBEDDING_BACKEND,
+    OPENAI_API_KEY,
+    PINECONE_API_KEY,
+    PINECONE_ENV,
+    PINECONE_INDEX,
+    USE_FAISS_FALLBACK,
+    VECTOR_STORE,
+    get_embeddings_model,
+)
+
+# Environment variables
+HEALTH_CACHE_SECONDS = float(os.getenv("HEALTH_CACHE_SECONDS", "5"))
+HEALTH_TIMEOUT_SECONDS = float(os.getenv("HEALTH_TIMEOUT_SECONDS", "2"))
+HEALTH_PROBE_LLM = os.getenv("HEALTH_PROBE_LLM", "false").lower() == "true"
+
+# Configure logger
+logger = logging.getLogger(__name__)
+
+OK = "ok"
+DEGRADED = "degraded"
+FAIL = "fail"
+
+# A check returns (status, detail, data); exceptions and timeouts count as FAIL
+CheckFn = Callable[[AsyncSession], Awaitable[tuple]]
+
+
+class Check(NamedTuple):
+    fn: CheckFn
+    critical: bool
+    optional: bool
+
+
+# Readiness checks by name; critical checks must be ok for the worker to take traffic
+_checks: Dict[str, Check] = {}
+
+# Cached results by name: (expires at, result)
+_results: Dict[str, tuple] = {}
+
+# Concurrent probes share one run of each check
+probe_flight = SingleFlight("health_probe")
+
+
+def register_check(name: str, fn: CheckFn, critical: bool = True, optional: bool = False) -> None:
+    """
+    Register a readiness check
+    
+    Optional checks only run when asked for (deep probes or HEALTH_PROBE_LLM).
+    Non-critical checks can report a problem without failing readiness.
+    """
+    _checks[name] = Check(fn, critical, optional)
+    _results.pop(name, None)
+
+
+async def run_check(name: str) -> ProbeResult:
+    """Run one check with a timeout, or return its cached result"""
+    cached = _results.get(name)
+    now = time.monotonic()
+    if cached and cached[0] > now:
+        return cached[1].model_copy(update={"cached": True})
+    return await probe_flight.do(name, lambda: _run_uncached(name))
+
+
+async def _run_uncached(name: str) -> ProbeResult:
+    """
+    Run a check on a session of its own
+    
+    The run is shared by concurrent probes and outlives any one of them, so
+    it must not use a request's session.
+    """
+    started = time.perf_counter()
+    try:
+        async with async_session() as session:
+            status, detail, data = await asyncio.wait_for(
+                _checks[name].fn(session), HEALTH_TIMEOUT_SECONDS
+            )
+    except asyncio.TimeoutError:
+        status, detail, data = FAIL, f"timed out after {HEALTH_TIMEOUT_SECONDS:g}s", {}
+    except Exception as e:
+        logger.warning(f"Health check {name} failed: {e}")
+        status, detail, data = FAIL, f"{type(e).__name__}: {e}", {}
+    
+    result = ProbeResult(
+        status=status,
+        latency_ms=round((time.perf_counter() - started) * 1000, 2),
+        detail=detail,
+        data=data,
+        critical=_checks[name].critical,
+    )
+    # Failures are cached too, so a struggling dependency is not probed by every request
+    _results[name] = (time.monotonic() + HEALTH_CACHE_SECONDS, result)
+    return result
+
+
+async def readiness(deep: bool = False) -> Dict[str, Any]:
+    """
+    Run every readiness check
+    
+    Returns:
+        {"status", "ready", "checks"}: ready is False if any critical check
+        is not ok; status is "degraded" if a non-critical check is not ok
+    """
+    names = [
+        name for name, check in _checks.items()
+        if not check.optional or deep or HEALTH_PROBE_LLM
+    ]
+    # One after another, so a probe holds at most one pooled connection
+    checks = {}
+    for name in names:
+        checks[name] = await run_check(name)
+    
+    ready = all(result.status == OK for result in checks.values() if result.critical)
+    healthy = all(result.status == OK for result in checks.values())
+    return {
+        "status": OK if healthy else (DEGRADED if ready else FAIL),
+        "ready": ready,
+        "checks": checks,
+    }
+
+
+def clear_cache() -> None:
+    _results.clear()
+
+
+async def check_database(session: AsyncSession) -> tuple:
+    """Round trip to Postgres"""
+    await session.execute(text("SELECT 1"))
+    return OK, None, {}
+
+
+async def check_vector_index(session: AsyncSession) -> tuple:
+    """Whether the configured vector index is reachable, and how many vectors it holds"""
+    if VECTOR_STORE == "postgres":
+        # Planner statistics avoid a full count on every probe (-1 until first ANALYZE)
+        result = await session.execute(text(
+            "SELECT reltuples::bigint FROM pg_class WHERE relname = 'chunks'"
+        ))
+        estimate = result.scalar()
+        if estimate is None:
+            return FAIL, "chunks table is missing (run migrations)", {"backend": "postgres"}
+        return OK, None, {
+            "backend": "postgres",
+            "pgvector": await has_pgvector(session),
+            "vectors": max(int(estimate), 0),
+        }
+    
+    if VECTOR_STORE == "segments":
+        stats = get_segment_index(os.path.join(VECTOR_SEGMENT_DIR, PINECONE_INDEX)).stats()
+        detail = None if stats["version"] else "no segment published yet"
+        return OK, detail, {"backend": "segments", **stats}
+    
+    if PINECONE_API_KEY and PINECONE_ENV and not USE_FAISS_FALLBACK:
+        def describe() -> int:
+            from pinecone import Pinecone
+            
+            stats = Pinecone(api_key=PINECONE_API_KEY).Index(PINECONE_INDEX).describe_index_stats()
+            return int(stats.total_vector_count)
+        
+        vectors = await asyncio.to_thread(describe)
+        return OK, None, {"backend": "pinecone", "index": PINECONE_INDEX, "vectors": vectors}
+    
+    # Local stores are built from the documents of each request
+    return OK, "local store is built per request", {"backend": "local", "vectors": None}
+
+
+async def check_llm(session: AsyncSession) -> tuple:
+    """Embed a short text with the configured embedding backend"""
+    if EMBEDDING_BACKEND == "openai" and not OPENAI_API_KEY:
+        return DEGRADED, "OPENAI_API_KEY is not set", {"backend": EMBEDDING_BACKEND}
+    vector = await get_embeddings_model().aembed_query("health check")
+    return OK, None, {"backend": EMBEDDING_BACKEND, "dims": len(vector)}
+
+
+register_check("database", check_database)
+register_check("vector_index", check_vector_index)
+register_check("llm", check_llm, critical=False, optional=True)
@@ -1,30 +1,65 @@
 import os
-from typing import Dict, List, Any, Optional
+import re
+import json
+import logging
+import contextvars
+from concurrent.futures import ThreadPoolExecutor
+from operator import itemgetter
+from typing import Callable, Dict, List, Any, Optional
+
+import numpy as np
 
 from langchain_core.prompts import ChatPromptTemplate, PromptTemplate
 from langchain_core.output_parsers import JsonOutputParser, StrOutputParser
-from langchain_core.runnables import RunnablePassthrough
-from langchain_openai import ChatOpenAI
+from langchain_core.runnables import Runnable, RunnableLambda, RunnableParallel, RunnablePassthrough
 from langchain_core.documents import Document
-from langchain_text_splitters import RecursiveCharacterTextSplitter
 from pydantic import BaseModel, Field
 
 from models.schemas import TaskItem
+from services.cache import get_cache, sha256_text
+from services.chunking import SUMMARY_CHUNK_TOKENS, get_chunker
+from services.embeddings import get_embeddings_model
+from services.rate_limit import BULK, INTERACTIVE, rate_limited
+from services.tracing import span, traced_runnable
 
 
 # Environment variables for OpenAI
 OPENAI_API_KEY = os.getenv("OPENAI_API_KEY")
 OPENAI_MODEL = os.getenv("OPENAI_MODEL", "gpt-4o-mini")
+TASK_DEDUP_SIMILARITY = float(os.getenv("TASK_DEDUP_SIMILARITY", "0.9"))
+
+# Configure logger
+logger = logging.getLogger(__name__)
+
+# Bump to invalidate every cached LLM response (prompt text edits invalidate
+# their own entries automatically through the template hash)
+PROMPT_VERSION = "1"
+LLM_CACHE_NAMESPACE = "llm"
 
 
-def get_llm(model_name: Optional[str] = None, temperature: float = 0.0) -> ChatOpenAI:
-    """Get LLM instance with environment defaults"""
+def get_llm(
+    model_name: Optional[str] = None,
+    temperature: float = 0.0,
+    lane: str = BULK,
+) -> Runnable:
+    """
+    Get LLM instance with environment defaults
+    
+    Calls go through the shared OpenAI rate limiter in the given priority
+    lane (INTERACTIVE for user-facing Q&A, BULK for ingestion).
+    """
+    # Imported on first use to keep startup fast
+    from langchain_openai import ChatOpenAI
+    
     model = model_name or OPENAI_MODEL
-    return ChatOpenAI(
+    # Retries are handled by the limiter so it can see 429s
+    llm = ChatOpenAI(
         model=model,
         temperature=temperature,
         api_key=OPENAI_API_KEY,
+        max_retries=0,
     )
+    return rate_limited(llm, lane)
 
 
 # Constants for prompts
@@ -54,6 +89,8 @@ Previous summaries:
 {summaries}
 """
 
+TASK_SYSTEM_PROMPT = "You are a task extraction assistant that creates structured JSON output."
+
 TASK_EXTRACT_PROMPT = """Extract tasks from the following text. 
 For each task provide:
 1. A clear description of what needs to be done
@@ -87,18 +124,216 @@ Question:
 """
 
 
+MEETING_SYSTEM_PROMPT = "You are a meeting analysis assistant that creates structured JSON output."
+
+MEETING_MAP_PROMPT = """You are an expert at analyzing meeting notes.
+From this content chunk, extract in a single pass:
+- bullets: 3-5 bullet points of key information
+- decisions: any decisions that were made
+- tasks: action items, each with
+  - description: string (required)
+  - due_date: ISO date string or null
+  - owner: string or null
+  - completed: always false for new tasks
+
+Return a JSON object with the fields "bullets", "decisions" and "tasks".
+
+Content chunk:
+{text}
+"""
+
+
+def llm_cache_key(
+    template: str,
+    inputs: Dict[str, Any],
+    temperature: float = 0.0,
+    model: Optional[str] = None,
+) -> str:
+    """Cache key of one LLM call: model, prompt version, template, temperature and inputs"""
+    return sha256_text(json.dumps(
+        {
+            "model": model or OPENAI_MODEL,
+            "version": PROMPT_VERSION,
+            "template": sha256_text(template),
+            "temperature": temperature,
+            "inputs": inputs,
+        },
+        sort_keys=True,
+    ))
+
+
+def cached_batch(
+    chain,
+    template: str,
+    inputs: List[Dict[str, Any]],
+    max_concurrency: Optional[int] = None,
+    temperature: float = 0.0,
+) -> List[Any]:
+    """
+    Run a chain over many inputs, serving repeated calls from the LLM response cache
+    
+    Args:
+        chain: Runnable ending in an output parser (results must be JSON-serializable)
+        template: Prompt text the chain was built from, hashed into the cache key
+        inputs: Prompt variables for each call
+        max_concurrency: Concurrency limit for the calls that miss the cache
+        temperature: Sampling temperature of the chain's LLM
+    
+    Returns:
+        One result per input, in order
+    """
+    cache = get_cache()
+    keys = [llm_cache_key(template, item, temperature) for item in inputs]
+    results = [cache.get(LLM_CACHE_NAMESPACE, key) if cache is not None else None for key in keys]
+    
+    missing = [i for i, result in enumerate(results) if result is None]
+    if len(missing) == 1:
+        fresh = [chain.invoke(inputs[missing[0]])]
+    elif missing:
+        fresh = chain.batch(
+            [inputs[i] for i in missing],
+            config={"max_concurrency": max_concurrency},
+        )
+    else:
+        fresh = []
+    
+    for i, result in zip(missing, fresh, strict=True):
+        results[i] = result
+        if cache is not None:
+            cache.set(LLM_CACHE_NAMESPACE, keys[i], result)
+    
+    if cache is not None and len(missing) < len(inputs):
+        logger.debug(
+            f"LLM cache: {len(inputs) - len(missing)}/{len(inputs)} calls served from cache"
+        )
+    return results
+
+
 class TaskListSchema(BaseModel):
     """Schema for task list output"""
     tasks: List[TaskItem] = Field(description="List of extracted tasks")
 
 
-def build_summarization_chain():
-    """Build a LangChain for document summarization"""
-    # Text splitter
-    text_splitter = RecursiveCharacterTextSplitter(
-        chunk_size=2000,
-        chunk_overlap=200,
-    )
+def format_summary_output(result: str) -> Dict[str, Any]:
+    """Parse the reduce step's markdown sections into summary fields"""
+    # Split sections based on markdown headers
+    sections = result.split("##")
+    
+    summary = ""
+    highlights = []
+    decisions = []
+    action_items = []
+    
+    for section in sections:
+        if not section.strip():
+            continue
+        
+        lines = section.strip().split("\n")
+        header = lines[0].strip().lower()
+        content = [line.strip()[2:] for line in lines[1:] if line.strip().startswith("- ")]
+        
+        if "summary" in header:
+            summary = " ".join(content)
+            highlights = content
+        elif "decision" in header:
+            decisions = content
+        elif "action" in header:
+            action_items = content
+    
+    return {
+        "summary": summary,
+        "highlights": highlights,
+        "decisions": decisions,
+        "action_items": action_items,
+    }
+
+
+class MeetingChunkSchema(BaseModel):
+    """Schema for the combined per-chunk meeting extraction"""
+    bullets: List[str] = Field(default_factory=list, description="Key points")
+    decisions: List[str] = Field(default_factory=list, description="Decisions made")
+    tasks: List[TaskItem] = Field(default_factory=list, description="Action items")
+
+
+def embed_task_descriptions(descriptions: List[str]) -> List[List[float]]:
+    """Embed task descriptions in one batched call for duplicate detection"""
+    return get_embeddings_model().embed_documents(descriptions)
+
+
+def normalize_task_text(description: str) -> str:
+    """Normalize a task description for duplicate detection"""
+    return " ".join(re.findall(r"\w+", description.lower()))
+
+
+def _combine_tasks(existing: Dict[str, Any], task: Dict[str, Any]) -> None:
+    """Fold a duplicate into an existing task: earliest due date, first known owner"""
+    due_dates = [d for d in (existing.get("due_date"), task.get("due_date")) if d]
+    existing["due_date"] = min(due_dates, key=str) if due_dates else None
+    existing["owner"] = existing.get("owner") or task.get("owner")
+
+
+def merge_tasks(
+    tasks: List[Dict[str, Any]],
+    embed_fn: Optional[Callable[[List[str]], List[List[float]]]] = None,
+    similarity_threshold: float = TASK_DEDUP_SIMILARITY,
+) -> List[Dict[str, Any]]:
+    """
+    Merge duplicate tasks extracted from different chunks
+    
+    Tasks with the same normalized description are merged first. If embed_fn
+    is given, the remaining descriptions are embedded in one call and tasks
+    whose cosine similarity reaches similarity_threshold are merged too.
+    Merged tasks keep the earliest due date and the first known owner.
+    """
+    merged: Dict[str, Dict[str, Any]] = {}
+    for task in tasks:
+        description = (task.get("description") or "").strip()
+        if not description:
+            continue
+        key = normalize_task_text(description)
+        if key not in merged:
+            merged[key] = {**task, "description": description, "completed": False}
+        else:
+            _combine_tasks(merged[key], task)
+    
+    unique = list(merged.values())
+    if embed_fn is None or len(unique) < 2:
+        return unique
+    
+    try:
+        vectors = np.asarray(embed_fn([task["description"] for task in unique]), dtype=np.float32)
+    except Exception as e:
+        logger.warning(f"Task embedding failed, keeping text-only dedup: {e}")
+        return unique
+    
+    # Pairwise cosine similarity in one matrix product
+    vectors /= np.maximum(np.linalg.norm(vectors, axis=1, keepdims=True), 1e-12)
+    similar = (vectors @ vectors.T) >= similarity_threshold
+    
+    # Each unassigned task claims every unassigned task similar to it
+    group = np.full(len(unique), -1)
+    for i in range(len(unique)):
+        if group[i] < 0:
+            group[similar[i] & (group < 0)] = i
+    
+    result = []
+    for i, task in enumerate(unique):
+        if group[i] == i:
+            result.append(task)
+        else:
+            _combine_tasks(unique[group[i]], task)
+    return result
+
+
+def build_summarization_chain(max_concurrency: int = 4):
+    """
+    Build a LangChain for document summarization
+    
+    Map and reduce calls go through the LLM response cache, so unchanged
+    chunks of a re-summarized document are not sent to the model again.
+    """
+    # Text splitter (Markdown sections and lists stay whole, no overlap)
+    text_splitter = get_chunker(SUMMARY_CHUNK_TOKENS, 0)
     
     # Map chain
     map_prompt = PromptTemplate.from_template(SUMMARIZE_MAP_PROMPT)
@@ -108,105 +343,204 @@ def build_summarization_chain():
     reduce_prompt = PromptTemplate.from_template(SUMMARIZE_REDUCE_PROMPT)
     reduce_chain = reduce_prompt | get_llm() | StrOutputParser()
     
-    # Function to process and format output
-    def format_output(result: str) -> Dict[str, Any]:
-        # Split sections based on markdown headers
-        sections = result.split("##")
-        
-        summary = ""
-        highlights = []
-        decisions = []
-        action_items = []
-        
-        for section in sections:
-            if not section.strip():
-                continue
-                
-            lines = section.strip().split("\n")
-            header = lines[0].strip().lower()
-            content = [line.strip()[2:] for line in lines[1:] if line.strip().startswith("- ")]
-            
-            if "summary" in header:
-                summary = " ".join(content)
-                highlights = content
-            elif "decision" in header:
-                decisions = content
-            elif "action" in header:
-                action_items = content
-        
-        return {
-            "summary": summary,
-            "highlights": highlights,
-            "decisions": decisions,
-            "action_items": action_items,
-        }
-    
     # Build the full chain
     def run_chain(text: str) -> Dict[str, Any]:
         # Split text
-        docs = text_splitter.create_documents([text])
-        texts = [doc.page_content for doc in docs]
+        with span("summarize.split", characters=len(text)):
+            docs = text_splitter.create_documents([text])
+            texts = [doc.page_content for doc in docs]
         
         # Map step
-        summaries = []
-        for doc_text in texts:
-            summary = map_chain.invoke({"text": doc_text})
-            summaries.append(summary)
+        with span("summarize.map", chunks=len(texts)):
+            summaries = cached_batch(
+                map_chain,
+                SUMMARIZE_MAP_PROMPT,
+                [{"text": doc_text} for doc_text in texts],
+                max_concurrency=max_concurrency,
+            )
         
         # Reduce step
-        combined = reduce_chain.invoke({"summaries": "\n\n".join(summaries)})
+        with span("summarize.reduce"):
+            combined = cached_batch(
+                reduce_chain,
+                SUMMARIZE_REDUCE_PROMPT,
+                [{"summaries": "\n\n".join(summaries)}],
+            )[0]
         
         # Format output
-        return format_output(combined)
+        return format_summary_output(combined)
     
     return run_chain
 
 
-def build_task_chain():
-    """Build a LangChain for task extraction"""
+def build_task_chain(max_concurrency: int = 4):
+    """
+    Build a LangChain for task extraction
+    
+    Long inputs are split into chunks that are extracted concurrently, then
+    near-duplicate tasks across chunks are merged, so latency stays flat as
+    the input grows. Per-chunk extractions are served from the LLM response
+    cache when the chunk was seen before.
+    """
+    # Text splitter (same chunking as summarization)
+    text_splitter = get_chunker(SUMMARY_CHUNK_TOKENS, 0)
+    
     # Output parser
     parser = JsonOutputParser(pydantic_object=TaskListSchema)
     
     # Create prompt (use tuple format so {text} is treated as a template variable)
     prompt = ChatPromptTemplate.from_messages([
-        ("system", "You are a task extraction assistant that creates structured JSON output."),
+        ("system", TASK_SYSTEM_PROMPT),
         ("human", TASK_EXTRACT_PROMPT),
     ])
     
     # Build chain
     chain = prompt | get_llm() | parser
     
+    def extracted_tasks(result: Any) -> List[Dict[str, Any]]:
+        # The model may return {"tasks": [...]} or a bare JSON array
+        return result.get("tasks", []) if isinstance(result, dict) else list(result or [])
+    
     # Define function to run chain
+    template = TASK_SYSTEM_PROMPT + TASK_EXTRACT_PROMPT
+    
     def run_chain(text: str) -> Dict[str, List[TaskItem]]:
-        result = chain.invoke({"text": text})
-        return result
+        docs = text_splitter.create_documents([text])
+        if len(docs) <= 1:
+            result = cached_batch(chain, template, [{"text": text}])[0]
+            return {"tasks": merge_tasks(extracted_tasks(result))}
+        
+        # Map step: one extraction per chunk, run concurrently
+        results = cached_batch(
+            chain,
+            template,
+            [{"text": doc.page_content} for doc in docs],
+            max_concurrency=max_concurrency,
+        )
+        tasks = [task for result in results for task in extracted_tasks(result)]
+        
+        # Reduce step: merge duplicates that straddle chunk boundaries
+        return {"tasks": merge_tasks(tasks, embed_fn=embed_task_descriptions)}
     
     return run_chain
 
 
-def build_qa_chain(retriever):
-    """Build a LangChain for question answering"""
+def build_meeting_chain(max_concurrency: int = 4):
+    """
+    Build a single-pass chain producing both a summary and tasks
+    
+    The map step makes one LLM call per chunk that returns bullets,
+    decisions and structured tasks together; the reduce step then merges the
+    summaries with an LLM call while tasks are merged alongside it (with
+    several chunks that merge embeds the task descriptions, another network
+    call, so the two run in parallel).
+    """
+    # Text splitter (same chunking as summarization)
+    text_splitter = get_chunker(SUMMARY_CHUNK_TOKENS, 0)
+    
+    # Map chain
+    map_prompt = ChatPromptTemplate.from_messages([
+        ("system", MEETING_SYSTEM_PROMPT),
+        ("human", MEETING_MAP_PROMPT),
+    ])
+    map_chain = map_prompt | get_llm() | JsonOutputParser(pydantic_object=MeetingChunkSchema)
+    
+    # Reduce chain (summary only; tasks are merged without another LLM call)
+    reduce_prompt = PromptTemplate.from_template(SUMMARIZE_REDUCE_PROMPT)
+    reduce_chain = reduce_prompt | get_llm() | StrOutputParser()
+    
+    def format_chunk(chunk: Dict[str, Any]) -> str:
+        lines = [f"- {bullet}" for bullet in chunk.get("bullets", [])]
+        lines += [f"- Decision: {decision}" for decision in chunk.get("decisions", [])]
+        lines += [
+            f"- Action item: {task.get('description', '')}" for task in chunk.get("tasks", [])
+        ]
+        return "\n".join(lines)
+    
+    def run_chain(text: str) -> Dict[str, Any]:
+        # Split text
+        with span("summarize.split", characters=len(text)):
+            docs = text_splitter.create_documents([text])
+        
+        # Map step: one call per chunk, run concurrently
+        with span("summarize.map", chunks=len(docs)):
+            chunks = cached_batch(
+                map_chain,
+                MEETING_SYSTEM_PROMPT + MEETING_MAP_PROMPT,
+                [{"text": doc.page_content} for doc in docs],
+                max_concurrency=max_concurrency,
+            )
+        
+        # Reduce step: summary reduce on a worker thread, task merge alongside it
+        with span("summarize.reduce"), ThreadPoolExecutor(max_workers=1) as executor:
+            # The copied context keeps the reduce call inside this span and request profile
+            summary_future = executor.submit(
+                contextvars.copy_context().run,
+                cached_batch,
+                reduce_chain,
+                SUMMARIZE_REDUCE_PROMPT,
+                [{"summaries": "\n\n".join(format_chunk(chunk) for chunk in chunks)}],
+            )
+            tasks = merge_tasks(
+                [task for chunk in chunks for task in chunk.get("tasks", [])],
+                embed_fn=embed_task_descriptions if len(chunks) > 1 else None,
+            )
+            summary = format_summary_output(summary_future.result()[0])
+        
+        return {**summary, "tasks": tasks}
+    
+    return run_chain
+
+
+def build_qa_chain(retriever, asynchronous: bool = False, return_sources: bool = False):
+    """
+    Build a LangChain for question answering
+    
+    Set asynchronous=True for retrievers that only work on the async path
+    (e.g. GraphExpandedRetriever); the returned function is then a coroutine.
+    With return_sources=True it returns (answer, retrieved documents) so
+    citations can be resolved against the chunks the answer was built from.
+    """
     # Create prompt
     prompt = ChatPromptTemplate.from_template(QA_CONTEXT_PROMPT)
     
     # Format documents for context
     def format_docs(docs: List[Document]) -> str:
-        formatted_docs = []
-        for doc in docs:
-            note_id = doc.metadata.get("note_id", "unknown")
-            formatted_docs.append(f"[NOTE ID: {note_id}]\n{doc.page_content}\n")
-        return "\n".join(formatted_docs)
+        with span("rag.format_docs", documents=len(docs)):
+            formatted_docs = []
+            for doc in docs:
+                note_id = doc.metadata.get("note_id", "unknown")
+                formatted_docs.append(f"[NOTE ID: {note_id}]\n{doc.page_content}\n")
+            return "\n".join(formatted_docs)
     
-    # Build retrieval chain
-    retrieval_chain = (
-        {"context": retriever | format_docs, "question": RunnablePassthrough()}
+    # Build retrieval chain (documents are kept next to the answer)
+    answer_chain = (
+        {
+            "context": itemgetter("docs") | RunnableLambda(format_docs),
+            "question": itemgetter("question")
+        }
         | prompt
-        | get_llm(temperature=0.1)
+        | traced_runnable("rag.llm", get_llm(temperature=0.1, lane=INTERACTIVE))
         | StrOutputParser()
     )
+    retrieval_chain = (
+        RunnableParallel(
+            docs=traced_runnable("rag.retrieve", retriever), question=RunnablePassthrough()
+        )
+        .assign(answer=answer_chain)
+    )
+    
+    def output(result: Dict[str, Any]):
+        return (result["answer"], result["docs"]) if return_sources else result["answer"]
     
     # Define function to run chain
-    def run_chain(query: str) -> str:
-        return retrieval_chain.invoke(query)
+    if asynchronous:
+        async def run_chain_async(query: str):
+            return output(await retrieval_chain.ainvoke(query))
+        
+        return run_chain_async
+    
+    def run_chain(query: str):
+        return output(retrieval_chain.invoke(query))
     
     return run_chain
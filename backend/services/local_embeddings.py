@@ -0,0 +1,178 @@
+import os
+import time
+import queue
+import threading
+from concurrent.futures import Future
+from typing import Callable, List, Optional, Tuple
+import logging
+
+import numpy as np
+from langchain_core.embeddings import Embeddings
+
+# Environment variables
+LOCAL_EMBEDDING_MODEL_PATH = os.getenv("LOCAL_EMBEDDING_MODEL_PATH", "models/all-MiniLM-L6-v2")
+LOCAL_EMBEDDING_MAX_LENGTH = int(os.getenv("LOCAL_EMBEDDING_MAX_LENGTH", "256"))
+LOCAL_EMBEDDING_BATCH_SIZE = int(os.getenv("LOCAL_EMBEDDING_BATCH_SIZE", "32"))
+LOCAL_EMBEDDING_MAX_WAIT_MS = float(os.getenv("LOCAL_EMBEDDING_MAX_WAIT_MS", "5"))
+LOCAL_EMBEDDING_WORKERS = int(os.getenv("LOCAL_EMBEDDING_WORKERS", "2"))
+
+# Configure logger
+logger = logging.getLogger(__name__)
+
+# Models are loaded on first use so importing this module stays cheap
+_local_embeddings = {}
+_local_lock = threading.Lock()
+
+
+class DynamicBatcher:
+    """
+    Merge concurrent embedding requests into batched model calls
+    
+    Each worker thread takes the oldest pending request, then keeps adding
+    requests until the batch holds max_batch_size texts or max_wait_ms has
+    passed, and runs the model once for all of them. Under load, batches fill
+    immediately; a lone request waits at most max_wait_ms.
+    """
+    
+    def __init__(
+        self,
+        fn: Callable[[List[str]], np.ndarray],
+        max_batch_size: int = LOCAL_EMBEDDING_BATCH_SIZE,
+        max_wait_ms: float = LOCAL_EMBEDDING_MAX_WAIT_MS,
+        workers: int = LOCAL_EMBEDDING_WORKERS,
+    ):
+        self.fn = fn
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait_ms / 1000.0
+        self.batches = 0
+        self._queue: "queue.Queue[Tuple[List[str], Future]]" = queue.Queue()
+        for i in range(workers):
+            threading.Thread(target=self._run, name=f"embedding-batcher-{i}", daemon=True).start()
+    
+    def submit(self, texts: List[str]) -> Future:
+        """Queue texts for embedding; the future resolves to one vector per text"""
+        future: Future = Future()
+        if not texts:
+            future.set_result(np.zeros((0, 0), dtype=np.float32))
+        else:
+            self._queue.put((texts, future))
+        return future
+    
+    def _collect(self) -> List[Tuple[List[str], Future]]:
+        pending = [self._queue.get()]
+        size = len(pending[0][0])
+        deadline = time.monotonic() + self.max_wait
+        while size < self.max_batch_size:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                item = self._queue.get(timeout=remaining)
+            except queue.Empty:
+                break
+            pending.append(item)
+            size += len(item[0])
+        return pending
+    
+    def _run(self) -> None:
+        while True:
+            pending = self._collect()
+            texts = [text for item_texts, _ in pending for text in item_texts]
+            try:
+                # Oversized merges are split so a single model call stays bounded
+                vectors = np.concatenate([
+                    self.fn(texts[start:start + self.max_batch_size])
+                    for start in range(0, len(texts), self.max_batch_size)
+                ])
+            except Exception as e:
+                for _, future in pending:
+                    future.set_exception(e)
+                continue
+            self.batches += 1
+            offset = 0
+            for item_texts, future in pending:
+                future.set_result(vectors[offset:offset + len(item_texts)])
+                offset += len(item_texts)
+
+
+class ONNXSentenceEncoder:
+    """
+    Sentence embedding model exported to ONNX, run with onnxruntime on the CPU
+    
+    The model directory holds model.onnx and the Hugging Face tokenizer.json
+    (e.g. `optimum-cli export onnx --model sentence-transformers/all-MiniLM-L6-v2 DIR`).
+    Token embeddings are mean-pooled over the attention mask and L2-normalized.
+    """
+    
+    def __init__(
+        self,
+        model_path: str,
+        max_length: int = LOCAL_EMBEDDING_MAX_LENGTH,
+        threads: int = 1
+    ):
+        try:
+            import onnxruntime as ort
+            from tokenizers import Tokenizer
+        except ImportError as e:
+            raise RuntimeError(
+                "EMBEDDING_BACKEND=local requires onnxruntime and tokenizers "
+                "(pip install onnxruntime tokenizers)"
+            ) from e
+        
+        self.model_path = model_path
+        self.tokenizer = Tokenizer.from_file(os.path.join(model_path, "tokenizer.json"))
+        self.tokenizer.enable_truncation(max_length=max_length)
+        self.tokenizer.enable_padding()
+        
+        options = ort.SessionOptions()
+        options.intra_op_num_threads = threads
+        options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        self.session = ort.InferenceSession(
+            os.path.join(model_path, "model.onnx"),
+            sess_options=options,
+            providers=["CPUExecutionProvider"],
+        )
+        self.input_names = {i.name for i in self.session.get_inputs()}
+    
+    def encode(self, texts: List[str]) -> np.ndarray:
+        encodings = self.tokenizer.encode_batch(texts)
+        mask = np.array([e.attention_mask for e in encodings], dtype=np.int64)
+        feeds = {
+            "input_ids": np.array([e.ids for e in encodings], dtype=np.int64),
+            "attention_mask": mask,
+            "token_type_ids": np.array([e.type_ids for e in encodings], dtype=np.int64),
+        }
+        inputs = {k: v for k, v in feeds.items() if k in self.input_names}
+        output = self.session.run(None, inputs)[0]
+        
+        if output.ndim == 3:
+            weights = mask[:, :, None].astype(np.float32)
+            output = (output * weights).sum(axis=1) / np.maximum(weights.sum(axis=1), 1e-9)
+        norms = np.linalg.norm(output, axis=1, keepdims=True)
+        return (output / np.maximum(norms, 1e-12)).astype(np.float32)
+
+
+class LocalEmbeddings(Embeddings):
+    """LangChain embeddings served by a local ONNX encoder behind a dynamic batcher"""
+    
+    def __init__(self, batcher: DynamicBatcher):
+        self.batcher = batcher
+    
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        return self.batcher.submit(texts).result().tolist()
+    
+    def embed_query(self, text: str) -> List[float]:
+        return self.batcher.submit([text]).result()[0].tolist()
+
+
+def get_local_embeddings(model_path: Optional[str] = None) -> LocalEmbeddings:
+    """Get the shared local embeddings for a model directory (loaded once per process)"""
+    path = model_path or LOCAL_EMBEDDING_MODEL_PATH
+    with _local_lock:
+        if path not in _local_embeddings:
+            # Split the cores between batcher workers so they do not oversubscribe the CPU
+            threads = max(1, (os.cpu_count() or 1) // LOCAL_EMBEDDING_WORKERS)
+            encoder = ONNXSentenceEncoder(path, threads=threads)
+            _local_embeddings[path] = LocalEmbeddings(DynamicBatcher(encoder.encode))
+            logger.info(f"Loaded local embedding model from {path}")
+    return _local_embeddings[path]
@@ -0,0 +1,419 @@
+import os
+import sys
+import hmac
+import json
+import time
+import uuid
+import random
+import asyncio
+import tempfile
+import threading
+from collections import Counter, defaultdict
+from contextvars import ContextVar
+from datetime import datetime
+from typing import Any, Dict, List, Optional
+import logging
+
+from langchain_core.callbacks import BaseCallbackHandler
+from langchain_core.tracers.context import register_configure_hook
+from sqlalchemy import event
+
+# Environment variables
+# Fraction of requests to profiling paths that are profiled at random (0 disables sampling)
+PROFILE_SAMPLE_RATE = float(os.getenv("PROFILE_SAMPLE_RATE", "0"))
+# Secret for the X-Profile-Token header; unset disables on-demand profiling and /admin/profiles
+PROFILE_ADMIN_TOKEN = os.getenv("PROFILE_ADMIN_TOKEN")
+PROFILE_PATHS = [
+    p.strip()
+    for p in os.getenv("PROFILE_PATHS", "/search/query,/notes/embed").split(",")
+    if p.strip()
+]
+PROFILE_INTERVAL_MS = float(os.getenv("PROFILE_INTERVAL_MS", "5"))
+PROFILE_DIR = os.getenv(
+    "PROFILE_DIR", os.path.join(tempfile.gettempdir(), "ai-second-brain-profiles")
+)
+PROFILE_MAX_RECORDS = int(os.getenv("PROFILE_MAX_RECORDS", "200"))
+
+# Configure logger
+logger = logging.getLogger(__name__)
+
+PROFILE_HEADER = "x-profile-token"
+PROFILE_ID_HEADER = "x-profile-id"
+
+# Spans and distinct stacks kept per profile
+MAX_SPANS = 500
+TOP_FRAMES = 25
+
+# Leaf frames of threads that are waiting rather than working
+IDLE_FRAMES = {
+    ("selectors", "select"),
+    ("threading", "wait"),
+    ("threading", "_wait_for_tstate_lock"),
+    ("queue", "get"),
+}
+
+# Profile of the request being handled (None when it is not profiled)
+_current: ContextVar[Optional["RequestProfile"]] = ContextVar("request_profile", default=None)
+
+# Callback handler that LangChain adds to every run while a request is profiled
+_stage_handler: ContextVar[Optional["StageCallbackHandler"]] = ContextVar(
+    "profile_stage_handler", default=None
+)
+register_configure_hook(_stage_handler, inheritable=True)
+
+
+class RequestProfile:
+    """Stage timings and stack samples collected while one request runs"""
+    
+    def __init__(self, method: str, path: str, trigger: str):
+        self.id = uuid.uuid4().hex[:16]
+        self.method = method
+        self.path = path
+        self.trigger = trigger
+        self.started_at = datetime.utcnow()
+        self.started = time.perf_counter()
+        self.duration = 0.0
+        self.status: Optional[int] = None
+        self.spans: List[Dict[str, Any]] = []
+        self.stages: Dict[str, List[float]] = defaultdict(lambda: [0, 0.0])
+        self.stacks: Counter = Counter()
+        self._lock = threading.Lock()
+    
+    def add_stage(self, name: str, started: float, ended: float) -> None:
+        with self._lock:
+            totals = self.stages[name]
+            totals[0] += 1
+            totals[1] += ended - started
+            if len(self.spans) < MAX_SPANS:
+                self.spans.append({
+                    "stage": name,
+                    "start_ms": round((started - self.started) * 1000, 3),
+                    "duration_ms": round((ended - started) * 1000, 3),
+                })
+    
+    def add_sample(self, stack: str) -> None:
+        with self._lock:
+            self.stacks[stack] += 1
+    
+    def finish(self, status: Optional[int]) -> None:
+        self.duration = time.perf_counter() - self.started
+        self.status = status
+    
+    def summary(self) -> Dict[str, Any]:
+        return {
+            "id": self.id,
+            "method": self.method,
+            "path": self.path,
+            "status": self.status,
+            "trigger": self.trigger,
+            "started_at": self.started_at.isoformat(),
+            "duration_ms": round(self.duration * 1000, 3),
+        }
+    
+    def report(self) -> Dict[str, Any]:
+        """Everything collected, with the hottest frames by own and cumulative samples"""
+        with self._lock:
+            stacks = dict(self.stacks)
+            spans = sorted(self.spans, key=lambda span: span["start_ms"])
+            stages = {
+                name: {"count": count, "total_ms": round(total * 1000, 3)}
+                for name, (count, total) in sorted(self.stages.items())
+            }
+        own: Counter = Counter()
+        cumulative: Counter = Counter()
+        for stack, count in stacks.items():
+            frames = stack.split(";")[1:]
+            own[frames[-1]] += count
+            for frame in set(frames):
+                cumulative[frame] += count
+        return {
+            **self.summary(),
+            "interval_ms": PROFILE_INTERVAL_MS,
+            "samples": sum(stacks.values()),
+            "stages": stages,
+            "spans": spans,
+            "top": [
+                {"frame": frame, "own": count, "cumulative": cumulative[frame]}
+                for frame, count in own.most_common(TOP_FRAMES)
+            ],
+            "stacks": stacks,
+        }
+
+
+def current_profile() -> Optional[RequestProfile]:
+    """
+    Profile of the current request, or None when it is not profiled
+    
+    Code stages (chunking, embedding) are timed by tracing.span(stage=...),
+    so one block feeds both the profile and the trace. Works across
+    asyncio.to_thread, which copies the context.
+    """
+    return _current.get()
+
+
+class StageCallbackHandler(BaseCallbackHandler):
+    """
+    Records LangChain retriever and LLM runs as vector_search and llm stages
+    
+    Retrievers nested in another retriever (graph expansion, scatter-gather
+    shards) are part of the outer run and not recorded again.
+    """
+    
+    run_inline = True
+    
+    def __init__(self, profile: RequestProfile):
+        self.profile = profile
+        self.runs: Dict[uuid.UUID, Any] = {}
+    
+    def _start(self, name: str, run_id: uuid.UUID, parent_run_id: Optional[uuid.UUID]) -> None:
+        if name == "vector_search" and self.runs.get(parent_run_id, ("",))[0] == "vector_search":
+            return
+        self.runs[run_id] = (name, time.perf_counter())
+    
+    def _end(self, run_id: uuid.UUID) -> None:
+        run = self.runs.pop(run_id, None)
+        if run is not None:
+            self.profile.add_stage(run[0], run[1], time.perf_counter())
+    
+    def on_retriever_start(
+        self, serialized, query, *, run_id, parent_run_id=None, **kwargs: Any
+    ) -> None:
+        self._start("vector_search", run_id, parent_run_id)
+    
+    def on_retriever_end(self, documents, *, run_id, **kwargs: Any) -> None:
+        self._end(run_id)
+    
+    def on_retriever_error(self, error, *, run_id, **kwargs: Any) -> None:
+        self._end(run_id)
+    
+    def on_llm_start(
+        self, serialized, prompts, *, run_id, parent_run_id=None, **kwargs: Any
+    ) -> None:
+        self._start("llm", run_id, parent_run_id)
+    
+    def on_chat_model_start(
+        self, serialized, messages, *, run_id, parent_run_id=None, **kwargs: Any
+    ) -> None:
+        self._start("llm", run_id, parent_run_id)
+    
+    def on_llm_end(self, response, *, run_id, **kwargs: Any) -> None:
+        self._end(run_id)
+    
+    def on_llm_error(self, error, *, run_id, **kwargs: Any) -> None:
+        self._end(run_id)
+
+
+def instrument_engine(engine: Any) -> None:
+    """Record the statements a profiled request runs as db stages"""
+    sync_engine = getattr(engine, "sync_engine", engine)
+    
+    @event.listens_for(sync_engine, "before_cursor_execute")
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        if _current.get() is not None:
+            conn.info.setdefault("profile_started", []).append(time.perf_counter())
+    
+    @event.listens_for(sync_engine, "after_cursor_execute")
+    def after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        profile = _current.get()
+        started = conn.info.get("profile_started")
+        if profile is not None and started:
+            profile.add_stage("db", started.pop(), time.perf_counter())
+
+
+class StackSampler:
+    """
+    Statistical profiler: samples every thread's Python stack at an interval
+    
+    The sampling thread only runs while some request is being profiled.
+    Samples cover the whole process (the event loop and worker threads), so
+    concurrent requests show up in each other's profiles; idle threads are
+    skipped.
+    """
+    
+    def __init__(self, interval: float = PROFILE_INTERVAL_MS / 1000):
+        self.interval = interval
+        self.active: List[RequestProfile] = []
+        self._lock = threading.Lock()
+        self._thread: Optional[threading.Thread] = None
+    
+    def start(self, profile: RequestProfile) -> None:
+        with self._lock:
+            self.active.append(profile)
+            if self._thread is None:
+                self._thread = threading.Thread(
+                    target=self._run, name="profile-sampler", daemon=True
+                )
+                self._thread.start()
+    
+    def stop(self, profile: RequestProfile) -> None:
+        with self._lock:
+            self.active.remove(profile)
+    
+    def _run(self) -> None:
+        me = threading.get_ident()
+        names = {}
+        while True:
+            with self._lock:
+                if not self.active:
+                    self._thread = None
+                    return
+                profiles = list(self.active)
+            for thread_id, frame in sys._current_frames().items():
+                if thread_id == me:
+                    continue
+                stack = []
+                while frame is not None:
+                    code = frame.f_code
+                    module = os.path.splitext(os.path.basename(code.co_filename))[0]
+                    stack.append((module, code.co_name))
+                    frame = frame.f_back
+                if not stack or stack[0] in IDLE_FRAMES:
+                    continue
+                if thread_id not in names:
+                    names = {thread.ident: thread.name for thread in threading.enumerate()}
+                frames = [f"{m}:{f}" for m, f in reversed(stack)]
+                folded = ";".join([names.get(thread_id, str(thread_id))] + frames)
+                for profile in profiles:
+                    profile.add_sample(folded)
+            time.sleep(self.interval)
+
+
+class ProfileStore:
+    """
+    Profiles saved as JSON files, newest PROFILE_MAX_RECORDS kept
+    
+    A directory rather than process memory, so every worker's profiles
+    can be read through whichever worker serves the admin endpoint.
+    """
+    
+    def __init__(self, root: str = PROFILE_DIR, max_records: int = PROFILE_MAX_RECORDS):
+        self.root = root
+        self.max_records = max_records
+        os.makedirs(root, exist_ok=True)
+    
+    def save(self, report: Dict[str, Any]) -> None:
+        path = os.path.join(self.root, f"{time.time_ns()}-{report['id']}.json")
+        with open(path + ".tmp", "w") as f:
+            json.dump(report, f)
+        os.replace(path + ".tmp", path)
+        for name in self._names()[self.max_records:]:
+            try:
+                os.remove(os.path.join(self.root, name))
+            except FileNotFoundError:
+                pass
+    
+    def _names(self) -> List[str]:
+        """Profile files, newest first"""
+        return sorted(
+            (name for name in os.listdir(self.root) if name.endswith(".json")), reverse=True
+        )
+    
+    def get(self, profile_id: str) -> Optional[Dict[str, Any]]:
+        for name in self._names():
+            if name.endswith(f"-{profile_id}.json"):
+                with open(os.path.join(self.root, name)) as f:
+                    return json.load(f)
+        return None
+    
+    def list(self, limit: int = 50) -> List[Dict[str, Any]]:
+        summaries = []
+        for name in self._names()[:limit]:
+            try:
+                with open(os.path.join(self.root, name)) as f:
+                    report = json.load(f)
+            except FileNotFoundError:
+                continue
+            summaries.append({key: report[key] for key in (
+                "id", "method", "path", "status", "trigger", "started_at", "duration_ms"
+            )})
+        return summaries
+
+
+_store: Optional[ProfileStore] = None
+
+
+def get_profile_store() -> ProfileStore:
+    global _store
+    if _store is None:
+        _store = ProfileStore()
+    return _store
+
+
+def check_admin_token(value: Optional[str]) -> bool:
+    """Whether a header value matches PROFILE_ADMIN_TOKEN (always False when it is unset)"""
+    if not (PROFILE_ADMIN_TOKEN and value):
+        return False
+    # Bytes: compare_digest rejects non-ASCII str, and headers arrive decoded as latin-1
+    return hmac.compare_digest(
+        value.encode("latin-1", errors="replace"), PROFILE_ADMIN_TOKEN.encode()
+    )
+
+
+class ProfilingMiddleware:
+    """
+    Opt-in request profiling (ASGI middleware)
+    
+    Requests to PROFILE_PATHS are profiled when they carry the admin token
+    in X-Profile-Token, or at random with probability PROFILE_SAMPLE_RATE.
+    A profiled response gets an X-Profile-ID header; the report is stored
+    for /admin/profiles. Unprofiled requests pass straight through.
+    """
+    
+    def __init__(
+        self,
+        app: Any,
+        sample_rate: Optional[float] = None,
+        paths: Optional[List[str]] = None,
+        store: Optional[ProfileStore] = None,
+        sampler: Optional[StackSampler] = None,
+    ):
+        self.app = app
+        self.sample_rate = PROFILE_SAMPLE_RATE if sample_rate is None else sample_rate
+        self.paths = set(PROFILE_PATHS if paths is None else paths)
+        self.store = store
+        self.sampler = sampler or StackSampler()
+    
+    def trigger(self, scope: Dict[str, Any]) -> Optional[str]:
+        """Why a request is profiled ("header" or "sample"), or None"""
+        if scope["type"] != "http" or scope["path"] not in self.paths:
+            return None
+        if PROFILE_ADMIN_TOKEN:
+            for key, value in scope["headers"]:
+                if key == PROFILE_HEADER.encode() and check_admin_token(value.decode("latin-1")):
+                    return "header"
+        if self.sample_rate > 0 and random.random() < self.sample_rate:
+            return "sample"
+        return None
+    
+    async def __call__(self, scope, receive, send) -> None:
+        trigger = self.trigger(scope)
+        if trigger is None:
+            await self.app(scope, receive, send)
+            return
+        
+        profile = RequestProfile(scope["method"], scope["path"], trigger)
+        status = None
+        
+        async def send_with_id(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+                message["headers"] = list(message.get("headers", [])) + [
+                    (PROFILE_ID_HEADER.encode(), profile.id.encode())
+                ]
+            await send(message)
+        
+        profile_token = _current.set(profile)
+        handler_token = _stage_handler.set(StageCallbackHandler(profile))
+        self.sampler.start(profile)
+        try:
+            await self.app(scope, receive, send_with_id)
+        finally:
+            self.sampler.stop(profile)
+            _stage_handler.reset(handler_token)
+            _current.reset(profile_token)
+            profile.finish(status)
+            try:
+                await asyncio.to_thread((self.store or get_profile_store()).save, profile.report())
+            except Exception as e:
+                logger.warning(f"Could not store profile {profile.id}: {e}")
@@ -0,0 +1,464 @@
+import os
+import json
+import time
+import fcntl
+import random
+import asyncio
+import tempfile
+import threading
+from contextlib import contextmanager, nullcontext
+from functools import lru_cache
+from typing import Any, Awaitable, Callable, Dict, Iterator, List, Optional, Tuple
+import logging
+
+from langchain_core.embeddings import Embeddings
+from langchain_core.runnables import Runnable, RunnableConfig, RunnableLambda
+
+# Environment variables
+OPENAI_RPM_LIMIT = int(os.getenv("OPENAI_RPM_LIMIT", "500"))
+OPENAI_TPM_LIMIT = int(os.getenv("OPENAI_TPM_LIMIT", "200000"))
+OPENAI_MAX_CONCURRENCY = int(os.getenv("OPENAI_MAX_CONCURRENCY", "16"))
+OPENAI_MAX_RETRIES = int(os.getenv("OPENAI_MAX_RETRIES", "6"))
+OPENAI_INTERACTIVE_RESERVE = float(os.getenv("OPENAI_INTERACTIVE_RESERVE", "0.2"))
+# File holding the budget shared by every process on the host (empty for a per-process budget)
+OPENAI_BUDGET_PATH = os.getenv(
+    "OPENAI_BUDGET_PATH", os.path.join(tempfile.gettempdir(), "ai-second-brain-openai-budget.json")
+)
+
+# Configure logger
+logger = logging.getLogger(__name__)
+
+# Priority lanes: interactive calls (search, Q&A) go ahead of bulk ingestion
+INTERACTIVE = "interactive"
+BULK = "bulk"
+
+# Backoff and polling parameters
+BACKOFF_BASE_SECONDS = 0.5
+BACKOFF_MAX_SECONDS = 30.0
+POLL_SECONDS = 0.05
+MAX_SLEEP_SECONDS = 1.0
+
+# Completion tokens budgeted per chat call before the real usage is known
+ESTIMATED_COMPLETION_TOKENS = 512
+
+
+
+@lru_cache(maxsize=None)
+def retryable_errors() -> Tuple[type, ...]:
+    """
+    Errors worth retrying; only RateLimitError shrinks the concurrency limit
+    
+    An insufficient_quota RateLimitError is raised at once (see is_quota_exhausted).
+    
+    The openai package is imported on the first failed call rather than at
+    startup, since it is one of the slowest imports in the app.
+    """
+    import openai
+    
+    return (openai.RateLimitError, openai.APIConnectionError, openai.InternalServerError)
+
+
+def is_rate_limit_error(error: BaseException) -> bool:
+    return isinstance(error, retryable_errors()[0])
+
+
+def is_quota_exhausted(error: BaseException) -> bool:
+    """A 429 for an exhausted account quota, which no amount of waiting fixes"""
+    return getattr(error, "code", None) == "insufficient_quota"
+
+
+def estimate_tokens(text: str) -> int:
+    """Rough token count of a text (about four characters per token)"""
+    return len(text) // 4 + 1
+
+
+def backoff_delay(attempt: int, error: Optional[Exception] = None) -> float:
+    """
+    Exponential backoff with full jitter
+    
+    A Retry-After header on the error, when present, is used as the lower bound.
+    """
+    delay = random.uniform(0, min(BACKOFF_MAX_SECONDS, BACKOFF_BASE_SECONDS * 2 ** attempt))
+    response = getattr(error, "response", None)
+    retry_after = response.headers.get("retry-after") if response is not None else None
+    try:
+        return max(delay, float(retry_after)) if retry_after else delay
+    except ValueError:
+        return delay
+
+
+class TokenBucket:
+    """
+    Continuously refilling budget holding at most one minute of allowance
+    
+    Refills use the wall clock so a bucket's state can move between processes.
+    """
+    
+    def __init__(self, per_minute: float):
+        self.capacity = float(per_minute)
+        self.rate = self.capacity / 60.0
+        self.level = self.capacity
+        self.updated = time.time()
+    
+    def _refill(self) -> None:
+        now = time.time()
+        self.level = min(self.capacity, self.level + (now - self.updated) * self.rate)
+        self.updated = now
+    
+    def wait_time(self, amount: float, floor: float = 0.0) -> float:
+        """Seconds until amount can be taken while leaving floor in the bucket"""
+        self._refill()
+        # Requests larger than the whole bucket only wait for a full bucket
+        needed = min(amount, self.capacity - floor) + floor - self.level
+        return max(0.0, needed / self.rate)
+    
+    def take(self, amount: float) -> None:
+        self._refill()
+        self.level -= min(amount, self.capacity)
+    
+    def adjust(self, amount: float) -> None:
+        """Charge (positive) or refund (negative) the difference to an estimate"""
+        self.level = min(self.capacity, self.level - amount)
+    
+    def state(self) -> List[float]:
+        return [self.level, self.updated]
+    
+    def load(self, state: List[float]) -> None:
+        self.level = min(self.capacity, state[0])
+        self.updated = state[1]
+
+
+class SharedBudget:
+    """
+    Bucket levels shared by every process on a host through a locked file
+    
+    API workers and the bulk scripts (relink, ingest, seed) run as separate
+    processes; sharing the file makes them draw from one budget, and lets a
+    queued interactive call in any process hold back bulk calls in all of
+    them. Concurrency limits stay per process.
+    """
+    
+    def __init__(self, path: str):
+        self.path = path
+    
+    @contextmanager
+    def sync(self, requests: TokenBucket, tokens: TokenBucket) -> Iterator[Dict[str, Any]]:
+        """Load the shared levels into the buckets, then store them back with the yielded state"""
+        with open(self.path, "a+") as f:
+            fcntl.flock(f, fcntl.LOCK_EX)
+            try:
+                f.seek(0)
+                raw = f.read()
+                try:
+                    state = json.loads(raw) if raw else {}
+                except ValueError:
+                    state = {}
+                if "requests" in state:
+                    requests.load(state["requests"])
+                    tokens.load(state["tokens"])
+                yield state
+                state.update(requests=requests.state(), tokens=tokens.state())
+                f.seek(0)
+                f.truncate()
+                f.write(json.dumps(state))
+            finally:
+                fcntl.flock(f, fcntl.LOCK_UN)
+
+
+class AIMDLimit:
+    """
+    Additive-increase / multiplicative-decrease concurrency limit
+    
+    Every success raises the limit by 1/limit (about +1 per round of calls);
+    a 429 halves it, at most once per cooldown so a burst of 429s from calls
+    already in flight counts as one signal.
+    """
+    
+    def __init__(self, maximum: int, minimum: int = 1, cooldown: float = 1.0):
+        self.maximum = float(maximum)
+        self.minimum = float(minimum)
+        self.cooldown = cooldown
+        self.limit = float(maximum)
+        self.last_decrease = 0.0
+    
+    def on_success(self) -> None:
+        self.limit = min(self.maximum, self.limit + 1.0 / self.limit)
+    
+    def on_throttle(self) -> None:
+        now = time.monotonic()
+        if now - self.last_decrease >= self.cooldown:
+            self.limit = max(self.minimum, self.limit / 2)
+            self.last_decrease = now
+
+
+class RateLimiter:
+    """
+    Limiter for OpenAI calls
+    
+    Combines request and token buckets, an AIMD concurrency limit and
+    retries with jittered exponential backoff. Bulk calls wait while any
+    interactive call is queued and never spend the last
+    interactive_reserve fraction of either bucket. With a budget_path the
+    buckets and the interactive queue are shared with other processes.
+    """
+    
+    def __init__(
+        self,
+        rpm: int = OPENAI_RPM_LIMIT,
+        tpm: int = OPENAI_TPM_LIMIT,
+        max_concurrency: int = OPENAI_MAX_CONCURRENCY,
+        max_retries: int = OPENAI_MAX_RETRIES,
+        interactive_reserve: float = OPENAI_INTERACTIVE_RESERVE,
+        budget_path: Optional[str] = None,
+    ):
+        self.requests = TokenBucket(rpm)
+        self.tokens = TokenBucket(tpm)
+        self.concurrency = AIMDLimit(max_concurrency)
+        self.max_retries = max_retries
+        self.interactive_reserve = interactive_reserve
+        self.shared = SharedBudget(budget_path) if budget_path else None
+        self.in_flight = 0
+        self.interactive_waiting = 0
+        self._lock = threading.Lock()
+        # Never held across file I/O, so the event loop may take it
+        self._waiting_lock = threading.Lock()
+    
+    def _budget(self):
+        """Shared state of the buckets (None for a per-process budget)"""
+        return self.shared.sync(self.requests, self.tokens) if self.shared else nullcontext()
+    
+    def _try_acquire(self, tokens: int, requests: int, lane: str) -> float:
+        """Take budget and a concurrency slot; return 0 on success, else seconds to wait"""
+        with self._lock, self._budget() as shared:
+            interactive_elsewhere = (
+                shared is not None and shared.get("interactive_until", 0) > time.time()
+            )
+            if lane == BULK and (self.interactive_waiting or interactive_elsewhere):
+                return POLL_SECONDS
+            reserve = self.interactive_reserve if lane == BULK else 0.0
+            wait = max(
+                self.requests.wait_time(requests, reserve * self.requests.capacity),
+                self.tokens.wait_time(tokens, reserve * self.tokens.capacity),
+            )
+            if wait == 0 and self.in_flight >= int(self.concurrency.limit):
+                wait = POLL_SECONDS
+            if wait > 0:
+                if lane == INTERACTIVE and shared is not None:
+                    # Hold back bulk calls in other processes until this call polls again
+                    shared["interactive_until"] = time.time() + MAX_SLEEP_SECONDS + POLL_SECONDS
+                return wait
+            self.requests.take(requests)
+            self.tokens.take(tokens)
+            self.in_flight += 1
+            return 0.0
+    
+    def _set_waiting(self, lane: str, delta: int) -> None:
+        if lane == INTERACTIVE:
+            with self._waiting_lock:
+                self.interactive_waiting += delta
+    
+    def acquire(self, tokens: int = 0, requests: int = 1, lane: str = BULK) -> None:
+        """Block until the call may start"""
+        self._set_waiting(lane, 1)
+        try:
+            while (wait := self._try_acquire(tokens, requests, lane)) > 0:
+                time.sleep(min(wait, MAX_SLEEP_SECONDS))
+        finally:
+            self._set_waiting(lane, -1)
+    
+    async def aacquire(self, tokens: int = 0, requests: int = 1, lane: str = BULK) -> None:
+        """
+        Wait without blocking the event loop until the call may start
+        
+        Each attempt runs on a worker thread: it takes the lock that threads
+        calling acquire() hold, and the shared budget's file lock that other
+        processes hold.
+        """
+        self._set_waiting(lane, 1)
+        try:
+            while (wait := await asyncio.to_thread(self._try_acquire, tokens, requests, lane)) > 0:
+                await asyncio.sleep(min(wait, MAX_SLEEP_SECONDS))
+        finally:
+            self._set_waiting(lane, -1)
+    
+    def release(self, throttled: bool = False, token_correction: int = 0) -> None:
+        """Free the concurrency slot and feed the outcome back into AIMD"""
+        with self._lock:
+            self.in_flight -= 1
+            if throttled:
+                self.concurrency.on_throttle()
+                logger.warning(
+                    f"OpenAI rate limited; concurrency limit now {int(self.concurrency.limit)}"
+                )
+            else:
+                self.concurrency.on_success()
+            if token_correction:
+                with self._budget():
+                    self.tokens.adjust(token_correction)
+    
+    def call(
+        self,
+        fn: Callable[[], Any],
+        tokens: int = 0,
+        requests: int = 1,
+        lane: str = BULK,
+        usage: Optional[Callable[[Any], Optional[int]]] = None,
+    ) -> Any:
+        """
+        Run fn under the limiter, retrying transient errors
+        
+        Args:
+            fn: Zero-argument function making the API call
+            tokens: Estimated tokens the call consumes
+            requests: Number of API requests fn makes
+            lane: INTERACTIVE or BULK
+            usage: Optional function returning the real token count from the result
+        
+        Returns:
+            The result of fn
+        """
+        for attempt in range(self.max_retries + 1):
+            self.acquire(tokens, requests, lane)
+            try:
+                result = fn()
+            except retryable_errors() as e:
+                quota_exhausted = is_quota_exhausted(e)
+                self.release(throttled=is_rate_limit_error(e) and not quota_exhausted)
+                if attempt == self.max_retries or quota_exhausted:
+                    raise
+                delay = backoff_delay(attempt, e)
+                logger.info(f"Retrying OpenAI call in {delay:.2f}s after {type(e).__name__}")
+                time.sleep(delay)
+            except Exception:
+                self.release()
+                raise
+            else:
+                self.release(token_correction=_correction(result, tokens, usage))
+                return result
+    
+    async def acall(
+        self,
+        fn: Callable[[], Awaitable[Any]],
+        tokens: int = 0,
+        requests: int = 1,
+        lane: str = BULK,
+        usage: Optional[Callable[[Any], Optional[int]]] = None,
+    ) -> Any:
+        """Async version of call; fn returns an awaitable"""
+        for attempt in range(self.max_retries + 1):
+            await self.aacquire(tokens, requests, lane)
+            try:
+                result = await fn()
+            except retryable_errors() as e:
+                quota_exhausted = is_quota_exhausted(e)
+                throttled = is_rate_limit_error(e) and not quota_exhausted
+                await asyncio.to_thread(self.release, throttled=throttled)
+                if attempt == self.max_retries or quota_exhausted:
+                    raise
+                delay = backoff_delay(attempt, e)
+                logger.info(f"Retrying OpenAI call in {delay:.2f}s after {type(e).__name__}")
+                await asyncio.sleep(delay)
+            except Exception:
+                await asyncio.to_thread(self.release)
+                raise
+            else:
+                correction = _correction(result, tokens, usage)
+                await asyncio.to_thread(self.release, token_correction=correction)
+                return result
+
+
+def _correction(
+    result: Any,
+    estimated: int,
+    usage: Optional[Callable[[Any], Optional[int]]]
+) -> int:
+    """Difference between the real and the estimated token usage (0 if unknown)"""
+    actual = usage(result) if usage is not None else None
+    return actual - estimated if actual is not None else 0
+
+
+_limiter: Optional[RateLimiter] = None
+_limiter_lock = threading.Lock()
+
+
+def get_rate_limiter() -> RateLimiter:
+    """Get the process's OpenAI rate limiter (its budget is shared through OPENAI_BUDGET_PATH)"""
+    global _limiter
+    with _limiter_lock:
+        if _limiter is None:
+            _limiter = RateLimiter(budget_path=OPENAI_BUDGET_PATH)
+    return _limiter
+
+
+def _message_tokens(message: Any) -> Optional[int]:
+    """Total tokens reported on a chat model response"""
+    metadata = getattr(message, "usage_metadata", None)
+    return metadata.get("total_tokens") if metadata else None
+
+
+def _prompt_tokens(value: Any) -> int:
+    text = value.to_string() if hasattr(value, "to_string") else str(value)
+    return estimate_tokens(text) + ESTIMATED_COMPLETION_TOKENS
+
+
+def rate_limited(llm: Runnable, lane: str = BULK) -> Runnable:
+    """Wrap a chat model so every invocation goes through the shared limiter"""
+    limiter = get_rate_limiter()
+    
+    def invoke(value: Any, config: RunnableConfig) -> Any:
+        return limiter.call(
+            lambda: llm.invoke(value, config),
+            tokens=_prompt_tokens(value),
+            lane=lane,
+            usage=_message_tokens,
+        )
+    
+    async def ainvoke(value: Any, config: RunnableConfig) -> Any:
+        return await limiter.acall(
+            lambda: llm.ainvoke(value, config),
+            tokens=_prompt_tokens(value),
+            lane=lane,
+            usage=_message_tokens,
+        )
+    
+    return RunnableLambda(invoke, afunc=ainvoke, name="rate_limited_llm")
+
+
+class RateLimitedEmbeddings(Embeddings):
+    """
+    Embeddings wrapper that routes calls through the shared limiter
+    
+    Query embeddings run in the interactive lane, document embeddings in the
+    bulk lane.
+    """
+    
+    def __init__(self, embeddings: Embeddings, batch_size: int = 1000):
+        self.embeddings = embeddings
+        self.batch_size = batch_size
+        self.limiter = get_rate_limiter()
+    
+    def _cost(self, texts: List[str]) -> dict:
+        return {
+            "tokens": sum(estimate_tokens(text) for text in texts),
+            "requests": max(1, -(-len(texts) // self.batch_size)),
+        }
+    
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        return self.limiter.call(
+            lambda: self.embeddings.embed_documents(texts), lane=BULK, **self._cost(texts)
+        )
+    
+    def embed_query(self, text: str) -> List[float]:
+        return self.limiter.call(
+            lambda: self.embeddings.embed_query(text), lane=INTERACTIVE, **self._cost([text])
+        )
+    
+    async def aembed_documents(self, texts: List[str]) -> List[List[float]]:
+        return await self.limiter.acall(
+            lambda: self.embeddings.aembed_documents(texts), lane=BULK, **self._cost(texts)
+        )
+    
+    async def aembed_query(self, text: str) -> List[float]:
+        return await self.limiter.acall(
+            lambda: self.embeddings.aembed_query(text), lane=INTERACTIVE, **self._cost([text])
+        )
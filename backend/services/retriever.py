@@ -1,11 +1,27 @@
 import os
-from typing import Any, Dict, List, Optional
+import heapq
+import asyncio
+from typing import Any, Dict, List, Optional, Sequence, Tuple, Union
 
 from langchain_core.retrievers import BaseRetriever
 from langchain_core.documents import Document
+from sqlalchemy.ext.asyncio import AsyncSession
 import logging
 
-from services.embeddings import get_vector_store, index_note
+from services.chunk_store import PostgresChunkStore
+from services.embeddings import (
+    PINECONE_INDEX,
+    VECTOR_STORE,
+    embedding_model_id,
+    get_embedding_backend,
+    get_embeddings_model,
+    delete_note_vectors,
+    get_vector_store,
+    index_note,
+)
+from services.segment_index import get_segment_writer, segment_root
+from services.tenancy import DEFAULT_SCOPE, Scope
+from services.tracing import span
 
 # Configure logger
 logger = logging.getLogger(__name__)
@@ -14,37 +30,79 @@ logger = logging.getLogger(__name__)
 DEFAULT_K = 6
 
 
-def make_retriever(index_name: Optional[str] = None, k: int = DEFAULT_K) -> BaseRetriever:
+def uses_chunk_store(session: Optional[AsyncSession]) -> bool:
+    """Whether retrieval and indexing go to the Postgres chunks table"""
+    return VECTOR_STORE == "postgres" and session is not None
+
+
+def get_chunk_store(
+    session: AsyncSession,
+    index_name: Optional[str] = None,
+    scopes: Optional[List[Scope]] = None
+) -> PostgresChunkStore:
+    """Get a chunk store bound to the caller's session"""
+    backend = get_embedding_backend(index_name)
+    return PostgresChunkStore(
+        session, get_embeddings_model(backend), scopes, model_id=embedding_model_id(backend)
+    )
+
+
+def make_retriever(
+    index_name: Optional[str] = None,
+    k: int = DEFAULT_K,
+    session: Optional[AsyncSession] = None,
+    scope: Union[Scope, Sequence[Scope]] = DEFAULT_SCOPE
+) -> BaseRetriever:
     """
     Create a retriever for the specified vector store
     
     Args:
         index_name: Name of the vector index
         k: Number of documents to retrieve
+        session: Database session; with VECTOR_STORE=postgres the retriever
+            searches the chunks table and must be used asynchronously
+        scope: Tenant workspace to search, or several workspaces of one
+            tenant to scatter-gather across
     
     Returns:
         A configured retriever
     """
-    vector_store = get_vector_store(index_name)
-    
-    # For FAISS which might return a factory function
-    if callable(vector_store) and not isinstance(vector_store, BaseRetriever):
-        # Initialize with empty documents as needed
-        try:
-            # Create an empty document to initialize the store
-            empty_doc = Document(page_content="", metadata={"note_id": "init"})
-            vector_store = vector_store([empty_doc])
-        except Exception as e:
-            logger.warning(f"Could not initialize empty vector store: {e}")
-            # Return a simple retriever that returns no results
-            return EmptyRetriever()
-    
-    # Create and return the retriever
-    retriever = vector_store.as_retriever(
-        search_kwargs={"k": k}
-    )
-    
-    return retriever
+    with span("rag.make_retriever", k=k):
+        scopes = [scope] if isinstance(scope, Scope) else list(scope)
+        if uses_chunk_store(session):
+            return get_chunk_store(session, index_name, scopes).as_retriever(search_kwargs={"k": k})
+        
+        if len(scopes) > 1:
+            # One shard per workspace; stores built per request have nothing indexed
+            stores = [get_vector_store(index_name, s) for s in scopes]
+            stores = [
+                store for store in stores
+                if hasattr(store, "similarity_search_by_vector_with_score")
+            ]
+            if not stores:
+                return EmptyRetriever()
+            return ScatterGatherRetriever(stores=stores, embedding=stores[0].embeddings, k=k)
+        
+        vector_store = get_vector_store(index_name, scopes[0])
+        
+        # For FAISS which might return a factory function
+        if callable(vector_store) and not isinstance(vector_store, BaseRetriever):
+            # Initialize with empty documents as needed
+            try:
+                # Create an empty document to initialize the store
+                empty_doc = Document(page_content="", metadata={"note_id": "init"})
+                vector_store = vector_store([empty_doc])
+            except Exception as e:
+                logger.warning(f"Could not initialize empty vector store: {e}")
+                # Return a simple retriever that returns no results
+                return EmptyRetriever()
+        
+        # Create and return the retriever
+        retriever = vector_store.as_retriever(
+            search_kwargs={"k": k}
+        )
+        
+        return retriever
 
 
 class EmptyRetriever(BaseRetriever):
@@ -53,16 +111,56 @@ class EmptyRetriever(BaseRetriever):
     def _get_relevant_documents(self, query: str) -> List[Document]:
         logger.warning("Using EmptyRetriever - no documents will be returned")
         return []
-
+    
     async def _aget_relevant_documents(self, query: str) -> List[Document]:
         return self._get_relevant_documents(query)
 
 
+def merge_top_k(results: List[List[Tuple[Document, float]]], k: int) -> List[Document]:
+    """Best k documents across shards by score, with the score in their metadata"""
+    best = heapq.nlargest(k, (hit for hits in results for hit in hits), key=lambda hit: hit[1])
+    for doc, score in best:
+        doc.metadata["score"] = score
+    return [doc for doc, _ in best]
+
+
+class ScatterGatherRetriever(BaseRetriever):
+    """
+    Retriever that searches several shards concurrently and merges their top-k
+    
+    The query is embedded once and every shard is searched with the vector
+    (on worker threads, since the stores are synchronous), so latency follows
+    the slowest shard searched rather than the size of the whole index.
+    Shards must score on the same scale (same index and embedding model).
+    """
+    
+    stores: List[Any]
+    embedding: Any
+    k: int = DEFAULT_K
+    
+    def _get_relevant_documents(self, query: str) -> List[Document]:
+        vector = self.embedding.embed_query(query)
+        return merge_top_k(
+            [store.similarity_search_by_vector_with_score(vector, self.k) for store in self.stores],
+            self.k
+        )
+    
+    async def _aget_relevant_documents(self, query: str) -> List[Document]:
+        vector = await self.embedding.aembed_query(query)
+        results = await asyncio.gather(*(
+            asyncio.to_thread(store.similarity_search_by_vector_with_score, vector, self.k)
+            for store in self.stores
+        ))
+        return merge_top_k(list(results), self.k)
+
+
 async def process_and_index_note(
     text: str,
     note_id: str,
     metadata: Optional[Dict[str, Any]] = None,
-    index_name: Optional[str] = None
+    index_name: Optional[str] = None,
+    session: Optional[AsyncSession] = None,
+    scope: Scope = DEFAULT_SCOPE
 ) -> int:
     """
     Process a note text and index it in the vector store
@@ -72,9 +170,54 @@ async def process_and_index_note(
         note_id: The UUID of the note
         metadata: Additional metadata to store with the embeddings
         index_name: Name of the vector index
+        session: Database session; with VECTOR_STORE=postgres chunks are
+            written in its transaction (the caller commits)
+        scope: Tenant workspace the note belongs to
     
     Returns:
         Number of chunks indexed
     """
-    vector_store = get_vector_store(index_name)
-    return await index_note(vector_store, text, str(note_id), metadata)
+    with span("ingest.note", note_id=str(note_id)):
+        if uses_chunk_store(session):
+            vector_store = get_chunk_store(session, index_name, [scope])
+        else:
+            vector_store = get_vector_store(index_name, scope)
+        return await index_note(vector_store, text, str(note_id), metadata)
+
+
+async def remove_note_vectors(
+    note_ids: List[str],
+    index_name: Optional[str] = None,
+    session: Optional[AsyncSession] = None,
+    scope: Scope = DEFAULT_SCOPE
+) -> None:
+    """
+    Remove the indexed chunks of notes from the vector store
+    
+    Args:
+        note_ids: The UUIDs of the notes
+        index_name: Name of the vector index
+        session: Database session; with VECTOR_STORE=postgres chunks are
+            deleted in its transaction (the caller commits)
+        scope: Tenant workspace the notes belong to
+    """
+    if uses_chunk_store(session):
+        vector_store = get_chunk_store(session, index_name, [scope])
+    else:
+        vector_store = get_vector_store(index_name, scope)
+    await delete_note_vectors(vector_store, [str(note_id) for note_id in note_ids])
+
+
+def compact_vectors(
+    index_name: Optional[str] = None,
+    scope: Scope = DEFAULT_SCOPE
+) -> Optional[Dict[str, int]]:
+    """
+    Compact a scope's segments once enough of their rows are dead
+    
+    Only VECTOR_STORE=segments keeps tombstones; other stores delete in
+    place, so this is a no-op for them. Blocking: run it in the background.
+    """
+    if VECTOR_STORE != "segments":
+        return None
+    return get_segment_writer(segment_root(index_name or PINECONE_INDEX, scope)).compact()
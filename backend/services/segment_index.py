@@ -0,0 +1,637 @@
+import os
+import json
+import math
+import time
+import uuid
+import fcntl
+import shutil
+import tempfile
+import threading
+from contextlib import contextmanager
+from functools import lru_cache
+from typing import Any, Dict, Iterable, Iterator, List, NamedTuple, Optional, Set, Tuple
+import logging
+
+import numpy as np
+from langchain_core.documents import Document
+from langchain_core.embeddings import Embeddings
+from langchain_core.vectorstores import VectorStore
+
+from services.tenancy import DEFAULT_SCOPE, Scope
+from services.vector_index import VECTOR_DIMS, VECTOR_RESCORE, VECTOR_STORAGE, CompactVectorIndex
+
+# Environment variables
+VECTOR_SEGMENT_DIR = os.getenv(
+    "VECTOR_SEGMENT_DIR",
+    os.path.join(tempfile.gettempdir(), "ai-second-brain-segments")
+)
+VECTOR_SEGMENT_REFRESH_SECONDS = float(os.getenv("VECTOR_SEGMENT_REFRESH_SECONDS", "2"))
+
+# Share of dead rows (deleted or superseded) at which compaction rewrites the segments holding them
+VECTOR_COMPACT_RATIO = float(os.getenv("VECTOR_COMPACT_RATIO", "0.2"))
+
+# Segments of one size tier (rows within a power of the factor) merged into one;
+# below 2 never merges
+VECTOR_MERGE_FACTOR = int(os.getenv("VECTOR_MERGE_FACTOR", "10"))
+
+# Configure logger
+logger = logging.getLogger(__name__)
+
+MANIFEST = "MANIFEST.json"
+LOCK = "LOCK"
+
+
+def empty_manifest() -> Dict[str, Any]:
+    return {"version": 0, "segments": [], "tombstones": {}, "watermark": None}
+
+
+def read_manifest(root: str) -> Dict[str, Any]:
+    """The published manifest of a segment directory (empty if none was published)"""
+    try:
+        with open(os.path.join(root, MANIFEST)) as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return empty_manifest()
+
+
+def read_tombstones(root: str, manifest: Dict[str, Any], segment: "Segment") -> np.ndarray:
+    """Boolean mask of a segment's deleted rows (bit-packed on disk)"""
+    name = manifest.get("tombstones", {}).get(segment.name)
+    if name is None:
+        return np.zeros(len(segment), dtype=bool)
+    packed = np.load(os.path.join(root, name))
+    return np.unpackbits(packed, count=len(segment)).astype(bool)
+
+
+class Segment:
+    """
+    One immutable, memory-mapped segment
+    
+    Vectors are a saved CompactVectorIndex; documents are JSON lines in
+    docs.jsonl located by offsets.npy, and note_rows.npy maps every row to
+    its note in notes.json. Everything but the note list is a read-only
+    memory map, so worker processes share one copy in the page cache.
+    """
+    
+    def __init__(self, path: str):
+        self.name = os.path.basename(path)
+        self.index = CompactVectorIndex.load(os.path.join(path, "index"), mmap_mode="r")
+        self.offsets = np.load(os.path.join(path, "offsets.npy"), mmap_mode="r")
+        self.docs = np.memmap(os.path.join(path, "docs.jsonl"), dtype=np.uint8, mode="r")
+        self.note_rows = np.load(os.path.join(path, "note_rows.npy"), mmap_mode="r")
+        with open(os.path.join(path, "notes.json")) as f:
+            self.notes: List[Optional[str]] = json.load(f)
+        self.positions = {note: i for i, note in enumerate(self.notes)}
+    
+    def __len__(self) -> int:
+        return len(self.index)
+    
+    def record(self, row: int) -> Dict[str, Any]:
+        """The stored record of a row (only its bytes of docs.jsonl are read)"""
+        return json.loads(bytes(self.docs[self.offsets[row]:self.offsets[row + 1]]))
+    
+    def document(self, row: int) -> Document:
+        """The document stored at a row"""
+        record = self.record(row)
+        return Document(page_content=record["page_content"], metadata=record["metadata"])
+    
+    def note_mask(self, note_ids: Iterable[str]) -> np.ndarray:
+        """Boolean mask of the rows belonging to any of the given notes"""
+        positions = [self.positions[note] for note in set(note_ids) if note in self.positions]
+        return np.isin(self.note_rows, positions) if positions else np.zeros(len(self), dtype=bool)
+
+
+class View(NamedTuple):
+    """
+    The segments of one manifest version, swapped in as a whole
+    
+    dead[i] masks the rows of segment i that searches skip: rows of notes
+    that a newer segment re-indexed (superseded) and rows tombstoned by a
+    delete. It is None when every row is live; skipped[i] counts the dead rows.
+    """
+    version: int
+    segments: Tuple[Segment, ...]
+    dead: Tuple[Optional[np.ndarray], ...]
+    skipped: Tuple[int, ...]
+    superseded: int
+    deleted: int
+
+
+def build_view(root: str, manifest: Dict[str, Any], segments: List[Segment]) -> View:
+    newest: Dict[str, int] = {}
+    for i, segment in enumerate(segments):
+        for note in segment.notes:
+            if note is not None:
+                newest[note] = i
+    
+    dead, skipped = [], []
+    superseded = deleted = 0
+    for i, segment in enumerate(segments):
+        shadowed = segment.note_mask(
+            note for note in segment.notes if note is not None and newest[note] != i
+        )
+        tombstoned = read_tombstones(root, manifest, segment) & ~shadowed
+        mask = shadowed | tombstoned
+        count = int(mask.sum())
+        dead.append(mask if count else None)
+        skipped.append(count)
+        superseded += int(shadowed.sum())
+        deleted += int(tombstoned.sum())
+    return View(
+        manifest["version"], tuple(segments), tuple(dead), tuple(skipped), superseded, deleted
+    )
+
+
+class SegmentIndex:
+    """
+    Read side of a segment directory, shared by every worker process
+    
+    Searches run against an immutable view of the published manifest.
+    The manifest is re-checked at most every refresh_seconds; when a
+    writer has published a new version, new segments are mapped and the
+    view is swapped in one assignment, so searches in flight finish on the
+    segments they started with and no restart is needed.
+    """
+    
+    def __init__(
+        self,
+        root: str = VECTOR_SEGMENT_DIR,
+        refresh_seconds: float = VECTOR_SEGMENT_REFRESH_SECONDS
+    ):
+        self.root = root
+        self.refresh_seconds = refresh_seconds
+        self._view = View(0, (), (), (), 0, 0)
+        self._stamp: Optional[Tuple[int, int]] = None
+        self._checked = 0.0
+        self._lock = threading.Lock()
+        self.refresh(force=True)
+    
+    @property
+    def view(self) -> View:
+        if time.monotonic() - self._checked >= self.refresh_seconds:
+            self.refresh()
+        return self._view
+    
+    def refresh(self, force: bool = False) -> bool:
+        """Swap in the latest published manifest; returns whether the view changed"""
+        with self._lock:
+            self._checked = time.monotonic()
+            try:
+                stat = os.stat(os.path.join(self.root, MANIFEST))
+                stamp = (stat.st_mtime_ns, stat.st_ino)
+            except FileNotFoundError:
+                stamp = None
+            if stamp == self._stamp and not force:
+                return False
+            
+            # Segments are immutable, so ones already mapped are reused
+            mapped = {segment.name: segment for segment in self._view.segments}
+            for attempt in range(3):
+                manifest = read_manifest(self.root)
+                if manifest["version"] == self._view.version and not force:
+                    self._stamp = stamp
+                    return False
+                try:
+                    segments = [
+                        mapped.get(name) or Segment(os.path.join(self.root, name))
+                        for name in manifest["segments"]
+                    ]
+                    view = build_view(self.root, manifest, segments)
+                    break
+                except FileNotFoundError:
+                    # Compaction removed the files of a manifest replaced since it was read
+                    if attempt == 2:
+                        raise
+            self._stamp = stamp
+            self._view = view
+            logger.info(
+                f"Vector segments at version {manifest['version']}: "
+                f"{len(segments)} segments, {sum(len(s) for s in segments)} vectors"
+            )
+            return True
+    
+    def search(self, query: np.ndarray, k: int) -> List[Tuple[Segment, int, float]]:
+        """Top-k (segment, row, cosine similarity) over every live row, best first"""
+        view = self.view
+        hits = []
+        for segment, dead, skipped in zip(view.segments, view.dead, view.skipped, strict=True):
+            # Fetching k + skipped rows still leaves k once dead rows are dropped
+            rows, scores = segment.index.search(query, k + skipped)
+            if dead is not None:
+                keep = ~dead[rows]
+                rows, scores = rows[keep], scores[keep]
+            hits.extend(
+                (segment, int(row), float(score))
+                for row, score in zip(rows[:k], scores[:k], strict=True)
+            )
+        hits.sort(key=lambda hit: -hit[2])
+        return hits[:k]
+    
+    def stats(self) -> Dict[str, Any]:
+        view = self.view
+        return {
+            "version": view.version,
+            "segments": len(view.segments),
+            "vectors": sum(len(segment) for segment in view.segments),
+            "superseded": view.superseded,
+            "deleted": view.deleted,
+        }
+
+
+class SegmentWriter:
+    """
+    Write side of a segment directory
+    
+    Each append writes a new segment under a temporary name, renames it
+    into place and then publishes a manifest that lists it, replacing the
+    manifest file atomically. Readers therefore only ever see complete
+    segments. An exclusive lock on the directory serializes writers across
+    processes, so the ingest process and any API worker can both append.
+    
+    Deletes never rewrite a segment: they publish a new tombstone bitmap
+    for each segment holding the notes. compact() later rewrites the
+    segments with dead rows into one dense segment.
+    
+    Small appends (an API worker indexes one note at a time) would leave
+    many tiny segments for every search to scan, so each append merges
+    size tiers that have filled up: merge_factor segments of about the
+    same size become one, and a row is rewritten once per tier it climbs.
+    """
+    
+    def __init__(self, root: str = VECTOR_SEGMENT_DIR, merge_factor: int = VECTOR_MERGE_FACTOR):
+        self.root = root
+        self.merge_factor = merge_factor
+        os.makedirs(root, exist_ok=True)
+        # Segments this writer has mapped, and the segments holding rows of each note
+        self._segments: Dict[str, Segment] = {}
+        self._holders: Dict[str, Set[str]] = {}
+    
+    @contextmanager
+    def locked(self) -> Iterator[Dict[str, Any]]:
+        """Hold the writer lock and yield the current manifest"""
+        with open(os.path.join(self.root, LOCK), "a") as lock:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+            try:
+                yield read_manifest(self.root)
+            finally:
+                fcntl.flock(lock, fcntl.LOCK_UN)
+    
+    def publish(self, manifest: Dict[str, Any]) -> None:
+        """Atomically replace the manifest (call while holding the lock)"""
+        path = os.path.join(self.root, MANIFEST)
+        with open(path + ".tmp", "w") as f:
+            json.dump(manifest, f)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(path + ".tmp", path)
+    
+    def sync(self, manifest: Dict[str, Any]) -> List[Segment]:
+        """
+        The manifest's segments (call while holding the lock)
+        
+        Only segments published since this writer last looked are opened.
+        """
+        names = manifest["segments"]
+        for name in set(self._segments) - set(names):
+            for note in self._segments.pop(name).notes:
+                holders = self._holders.get(note)
+                if holders is not None:
+                    holders.discard(name)
+                    if not holders:
+                        del self._holders[note]
+        for name in names:
+            if name not in self._segments:
+                segment = Segment(os.path.join(self.root, name))
+                self._segments[name] = segment
+                for note in segment.notes:
+                    if note is not None:
+                        self._holders.setdefault(note, set()).add(name)
+        return [self._segments[name] for name in names]
+    
+    def write_segment(self, documents: List[Document], vectors: np.ndarray, ids: List[str]) -> str:
+        """Write documents and their vectors as a new segment directory; returns its name"""
+        # Rescoring vectors are only worth storing when the scanned ones are lossy
+        lossy = VECTOR_STORAGE != "float32" or VECTOR_DIMS > 0
+        index = CompactVectorIndex(rescore=VECTOR_RESCORE and lossy, rescore_dir=None)
+        index.add(vectors)
+        records = [
+            {"id": doc_id, "page_content": doc.page_content, "metadata": doc.metadata}
+            for doc_id, doc in zip(ids, documents, strict=True)
+        ]
+        return self._write(index, records)
+    
+    def _write(self, index: CompactVectorIndex, records: List[Dict[str, Any]]) -> str:
+        staging = os.path.join(self.root, f".tmp-{uuid.uuid4().hex}")
+        os.makedirs(staging)
+        try:
+            index.save(os.path.join(staging, "index"))
+            
+            notes: Dict[Optional[str], int] = {}
+            offsets = [0]
+            with open(os.path.join(staging, "docs.jsonl"), "wb") as f:
+                for record in records:
+                    line = json.dumps(record, default=str).encode("utf-8") + b"\n"
+                    f.write(line)
+                    offsets.append(offsets[-1] + len(line))
+            note_rows = [
+                notes.setdefault(_note_key(record["metadata"]), len(notes)) for record in records
+            ]
+            np.save(os.path.join(staging, "offsets.npy"), np.asarray(offsets, dtype=np.int64))
+            np.save(os.path.join(staging, "note_rows.npy"), np.asarray(note_rows, dtype=np.int32))
+            with open(os.path.join(staging, "notes.json"), "w") as f:
+                json.dump(list(notes), f)
+            
+            name = f"seg-{time.time_ns()}-{uuid.uuid4().hex[:8]}"
+            os.rename(staging, os.path.join(self.root, name))
+            return name
+        except BaseException:
+            shutil.rmtree(staging, ignore_errors=True)
+            raise
+    
+    def append(
+        self,
+        documents: List[Document],
+        vectors: np.ndarray,
+        ids: Optional[List[str]] = None,
+        watermark: Optional[str] = None
+    ) -> Optional[str]:
+        """
+        Publish documents as one new segment
+        
+        A note's chunks in this segment replace its chunks in older ones.
+        watermark is stored in the manifest for the ingest process to
+        resume from. Returns the segment name (None if nothing was written).
+        """
+        with self.locked() as manifest:
+            name = None
+            if documents:
+                ids = ids or [str(uuid.uuid4()) for _ in documents]
+                name = self.write_segment(documents, np.asarray(vectors, dtype=np.float32), ids)
+                manifest["segments"] = manifest["segments"] + [name]
+            elif watermark is None:
+                return None
+            merged = self.merge_tiers(manifest) if name else False
+            manifest["version"] += 1
+            if watermark is not None:
+                manifest["watermark"] = watermark
+            self.publish(manifest)
+            if merged:
+                self.remove_unreferenced(manifest)
+            return name
+    
+    def merge_tiers(self, manifest: Dict[str, Any]) -> bool:
+        """
+        Merge every size tier holding merge_factor segments (call while holding the lock)
+        
+        Updates the manifest for the caller to publish; returns whether
+        anything was merged.
+        """
+        if self.merge_factor < 2:
+            return False
+        merged = False
+        while True:
+            tiers: Dict[int, List[Segment]] = {}
+            for segment in self.sync(manifest):
+                tier = int(math.log(max(len(segment), 1), self.merge_factor))
+                tiers.setdefault(tier, []).append(segment)
+            full = [group for _, group in sorted(tiers.items()) if len(group) >= self.merge_factor]
+            if not full:
+                return merged
+            group = full[0]
+            self.rewrite(manifest, [
+                (segment, np.flatnonzero(~self.dead_rows(manifest, segment))) for segment in group
+            ])
+            logger.info(
+                f"Merged {len(group)} vector segments of {sum(len(s) for s in group)} rows "
+                f"in {self.root}"
+            )
+            merged = True
+    
+    def dead_rows(self, manifest: Dict[str, Any], segment: Segment) -> np.ndarray:
+        """Rows of a segment that are tombstoned or superseded by a newer segment"""
+        order = {name: i for i, name in enumerate(manifest["segments"])}
+        shadowed = segment.note_mask(
+            note for note in segment.notes
+            if note is not None and max(self._holders[note], key=order.__getitem__) != segment.name
+        )
+        return shadowed | read_tombstones(self.root, manifest, segment)
+    
+    def tombstone(self, manifest: Dict[str, Any], segment: Segment, note_ids: List[str]) -> int:
+        """Write a tombstone bitmap for a segment's rows of the notes; returns rows newly deleted"""
+        rows = segment.note_mask(note_ids)
+        dead = read_tombstones(self.root, manifest, segment)
+        added = int((rows & ~dead).sum())
+        if added:
+            tombstones = dict(manifest.get("tombstones", {}))
+            tombstones[segment.name] = f"{segment.name}.tomb-{manifest['version'] + 1}.npy"
+            np.save(os.path.join(self.root, tombstones[segment.name]), np.packbits(dead | rows))
+            manifest["tombstones"] = tombstones
+        return added
+    
+    def rewrite(self, manifest: Dict[str, Any], parts: List[Tuple[Segment, np.ndarray]]) -> int:
+        """
+        Replace segments with one holding the given rows of each (call while holding the lock)
+        
+        Rows keep their stored codes. Each note has live rows in one segment
+        only, so the new segment can go last. Returns the rows kept.
+        """
+        live = [(segment, rows) for segment, rows in parts if len(rows)]
+        name = None
+        if live:
+            index = CompactVectorIndex.merge([(segment.index, rows) for segment, rows in live])
+            records = [segment.record(int(row)) for segment, rows in live for row in rows]
+            name = self._write(index, records)
+        
+        dropped = {segment.name for segment, _ in parts}
+        manifest["segments"] = (
+            [n for n in manifest["segments"] if n not in dropped] + ([name] if name else [])
+        )
+        manifest["tombstones"] = {
+            n: tombstone
+            for n, tombstone in manifest.get("tombstones", {}).items()
+            if n not in dropped
+        }
+        return sum(len(rows) for _, rows in live)
+    
+    def delete(self, note_ids: Iterable[Any]) -> int:
+        """
+        Tombstone every row of the given notes; returns the rows deleted
+        
+        The writer's note map finds the segments holding the notes, so only
+        those are read and get a new bitmap (one bit per row). The cost
+        follows the size of those segments, plus opening any segment
+        published since this writer last looked.
+        """
+        wanted = [str(note_id) for note_id in note_ids]
+        with self.locked() as manifest:
+            self.sync(manifest)
+            holders = set().union(*(self._holders.get(note, set()) for note in wanted))
+            deleted = sum(
+                self.tombstone(manifest, self._segments[name], wanted) for name in sorted(holders)
+            )
+            if deleted:
+                manifest["version"] += 1
+                self.publish(manifest)
+            return deleted
+    
+    def compact(self, threshold: float = VECTOR_COMPACT_RATIO) -> Optional[Dict[str, int]]:
+        """
+        Rewrite the segments holding dead rows into one dense segment
+        
+        Runs once dead (deleted or superseded) rows reach threshold of all
+        rows. Returns a summary, or None when the directory is under the
+        threshold.
+        """
+        with self.locked() as manifest:
+            segments = self.sync(manifest)
+            view = build_view(self.root, manifest, segments)
+            total, dead = sum(len(segment) for segment in segments), sum(view.skipped)
+            if not total or dead / total < threshold:
+                return None
+            
+            parts = [
+                (segment, np.flatnonzero(~mask))
+                for segment, mask in zip(segments, view.dead, strict=True)
+                if mask is not None
+            ]
+            kept = self.rewrite(manifest, parts)
+            manifest["version"] += 1
+            self.publish(manifest)
+            self.remove_unreferenced(manifest)
+            
+            summary = {"compacted": len(parts), "removed": dead, "kept": kept}
+            logger.info(f"Compacted vector segments in {self.root}: {summary}")
+            return summary
+    
+    def remove_unreferenced(self, manifest: Dict[str, Any]) -> None:
+        """
+        Delete segments and tombstones the manifest no longer lists (call while holding the lock)
+        
+        Workers that still map a removed segment keep reading it until their
+        next refresh, since unlinked files stay readable while mapped.
+        """
+        keep = set(manifest["segments"]) | set(manifest.get("tombstones", {}).values())
+        for entry in os.listdir(self.root):
+            if entry in keep or not (entry.startswith("seg-") or entry.startswith(".tmp-")):
+                continue
+            path = os.path.join(self.root, entry)
+            if os.path.isdir(path):
+                shutil.rmtree(path, ignore_errors=True)
+            else:
+                os.remove(path)
+
+
+def _note_key(metadata: Dict[str, Any]) -> Optional[str]:
+    note_id = metadata.get("note_id")
+    return str(note_id) if note_id is not None else None
+
+
+class SegmentVectorStore(VectorStore):
+    """LangChain vector store over a shared segment directory"""
+    
+    def __init__(
+        self,
+        embedding: Embeddings,
+        index: SegmentIndex,
+        writer: Optional[SegmentWriter] = None
+    ):
+        self.embedding = embedding
+        self.index = index
+        self.writer = writer or get_segment_writer(index.root)
+    
+    @property
+    def embeddings(self) -> Embeddings:
+        return self.embedding
+    
+    def add_texts(
+        self,
+        texts: Iterable[str],
+        metadatas: Optional[List[Dict[str, Any]]] = None,
+        ids: Optional[List[str]] = None,
+        **kwargs: Any,
+    ) -> List[str]:
+        texts = list(texts)
+        if not texts:
+            return []
+        metadatas = metadatas or [{} for _ in texts]
+        ids = list(ids) if ids else [str(uuid.uuid4()) for _ in texts]
+        vectors = np.asarray(self.embedding.embed_documents(texts), dtype=np.float32)
+        documents = [
+            Document(page_content=text, metadata=metadata)
+            for text, metadata in zip(texts, metadatas, strict=True)
+        ]
+        self.writer.append(documents, vectors, ids)
+        # Make this worker's own write visible to its next search
+        self.index.refresh()
+        return ids
+    
+    def delete(self, ids: Optional[List[str]] = None, **kwargs: Any) -> Optional[bool]:
+        """Tombstone every chunk of note_ids=[...] (segments are addressed by note)"""
+        if ids:
+            raise NotImplementedError("SegmentVectorStore deletes by note: pass note_ids=[...]")
+        if self.writer.delete(kwargs.get("note_ids") or []):
+            self.index.refresh()
+        return True
+    
+    def similarity_search_by_vector_with_score(
+        self,
+        embedding: List[float],
+        k: int = 4,
+        **kwargs: Any,
+    ) -> List[Tuple[Document, float]]:
+        vector = np.asarray(embedding, dtype=np.float32)
+        return [
+            (segment.document(row), score)
+            for segment, row, score in self.index.search(vector, k)
+        ]
+    
+    def similarity_search_with_score(
+        self, query: str, k: int = 4, **kwargs: Any
+    ) -> List[Tuple[Document, float]]:
+        vector = self.embedding.embed_query(query)
+        return self.similarity_search_by_vector_with_score(vector, k, **kwargs)
+    
+    def similarity_search(self, query: str, k: int = 4, **kwargs: Any) -> List[Document]:
+        return [doc for doc, _ in self.similarity_search_with_score(query, k, **kwargs)]
+    
+    def _select_relevance_score_fn(self):
+        # Scores are cosine similarities in [-1, 1]
+        return lambda score: (score + 1.0) / 2.0
+    
+    @classmethod
+    def from_texts(
+        cls,
+        texts: List[str],
+        embedding: Embeddings,
+        metadatas: Optional[List[Dict[str, Any]]] = None,
+        **kwargs: Any,
+    ) -> "SegmentVectorStore":
+        store = cls(embedding, kwargs.pop("index", None) or get_segment_index())
+        store.add_texts(texts, metadatas, **kwargs)
+        return store
+
+
+def segment_root(index_name: str, scope: Optional[Scope] = None) -> str:
+    """
+    Segment directory of an index for a scope
+    
+    Each tenant workspace is its own shard with its own manifest, so a
+    search only maps and scans the segments of the scopes it asks for.
+    The default scope keeps the index directory itself.
+    """
+    root = os.path.join(VECTOR_SEGMENT_DIR, index_name)
+    if scope is None or scope == DEFAULT_SCOPE:
+        return root
+    return os.path.join(root, "tenants", scope.tenant_id, scope.workspace_id)
+
+
+@lru_cache(maxsize=None)
+def get_segment_index(root: str = VECTOR_SEGMENT_DIR) -> SegmentIndex:
+    """Get this process's reader for a segment directory (one per process)"""
+    return SegmentIndex(root)
+
+
+@lru_cache(maxsize=None)
+def get_segment_writer(root: str = VECTOR_SEGMENT_DIR) -> SegmentWriter:
+    """Get this process's writer for a segment directory, so its mapped segments are reused"""
+    return SegmentWriter(root)
@@ -0,0 +1,81 @@
+from functools import lru_cache
+from typing import Any, Optional, Tuple, get_args, get_origin
+
+from fastapi import Response
+from pydantic import BaseModel, TypeAdapter
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover - orjson is in requirements.txt
+    orjson = None
+
+
+@lru_cache(maxsize=None)
+def get_adapter(response_type: Any) -> TypeAdapter:
+    """TypeAdapter for a response type (the validator and serializer are built once)"""
+    return TypeAdapter(response_type)
+
+
+def _has_model(annotation: Any) -> bool:
+    if isinstance(annotation, type) and issubclass(annotation, BaseModel):
+        return True
+    return any(_has_model(arg) for arg in get_args(annotation))
+
+
+@lru_cache(maxsize=None)
+def projection(response_type: Any) -> Optional[Tuple[Tuple[str, ...], bool]]:
+    """
+    (field names, is a list) when response_type can be written by projection
+    
+    That is a flat model, or a list of one, without aliases or nested models,
+    so every field is a column orjson writes natively. Otherwise None.
+    """
+    many = get_origin(response_type) in (list, tuple)
+    model = get_args(response_type)[0] if many else response_type
+    if orjson is None or not (isinstance(model, type) and issubclass(model, BaseModel)):
+        return None
+    fields = model.model_fields
+    if any(
+        field.alias or field.serialization_alias or _has_model(field.annotation)
+        for field in fields.values()
+    ):
+        return None
+    return tuple(fields), many
+
+
+def dump_rows(response_type: Any, rows: Any) -> bytes:
+    """
+    Serialize query rows as response_type in a single pass
+    
+    Rows are ORM objects or SQLAlchemy Rows (or dicts of them, for models
+    with nested fields); fields are read from their attributes, so no model
+    is built per row. Flat models are projected straight into orjson, since
+    rows from the database are already typed by their columns. Anything
+    else is validated once and written by pydantic-core.
+    """
+    plan = projection(response_type)
+    if plan is None:
+        adapter = get_adapter(response_type)
+        return adapter.dump_json(adapter.validate_python(rows, from_attributes=True))
+    
+    fields, many = plan
+    if many:
+        content = [{name: getattr(row, name) for name in fields} for row in rows]
+    else:
+        content = {name: getattr(rows, name) for name in fields}
+    # OPT_UTC_Z writes UTC as "Z", as pydantic does
+    return orjson.dumps(content, option=orjson.OPT_UTC_Z)
+
+
+def json_response(response_type: Any, rows: Any, status_code: int = 200) -> Response:
+    """
+    JSON response for rows, serialized once as response_type
+    
+    FastAPI returns a Response as is, so the route's response_model only
+    documents the schema and the rows are not validated a second time.
+    """
+    return Response(
+        content=dump_rows(response_type, rows),
+        status_code=status_code,
+        media_type="application/json",
+    )
@@ -1,39 +1,187 @@
 import os
-from typing import Union, BinaryIO, Optional
+import io
+import json
+import time
+import hashlib
+import asyncio
+import shutil
+import tempfile
+import importlib.util
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Any, AsyncIterator, Union, BinaryIO, Dict, List, Optional, Tuple
 import logging
 from pathlib import Path
-import tempfile
 
-from openai import OpenAI
+from services.cache import get_cache, sha256_file, sha256_text
 
 # Environment variables
 OPENAI_API_KEY = os.getenv("OPENAI_API_KEY")
 WHISPER_USE_API = os.getenv("WHISPER_USE_API", "true").lower() == "true"
+WHISPER_MODEL = os.getenv("WHISPER_MODEL", "whisper-1")
+WHISPER_SEGMENT_SECONDS = int(os.getenv("WHISPER_SEGMENT_SECONDS", "600"))
+WHISPER_MAX_CONCURRENCY = int(os.getenv("WHISPER_MAX_CONCURRENCY", "4"))
+
+# Transcription backend: "api" (OpenAI Whisper), "local" (faster-whisper on CPU) or "stub"
+WHISPER_BACKEND = os.getenv("WHISPER_BACKEND", "api" if WHISPER_USE_API else "stub").lower()
+LOCAL_WHISPER_MODEL = os.getenv("LOCAL_WHISPER_MODEL", "base")
+LOCAL_WHISPER_COMPUTE_TYPE = os.getenv("LOCAL_WHISPER_COMPUTE_TYPE", "int8")
+LOCAL_WHISPER_WORKERS = int(
+    os.getenv("LOCAL_WHISPER_WORKERS", str(max(1, (os.cpu_count() or 2) // 2)))
+)
 
 # Configure logger
 logger = logging.getLogger(__name__)
 
-# Initialize OpenAI client
-client = OpenAI(api_key=OPENAI_API_KEY) if OPENAI_API_KEY else None
+# Bumped when the cached transcription shape changes, so older entries are not read
+TRANSCRIPT_CACHE_VERSION = 2
+
+# Clients are created on first use so importing this module stays cheap
+_client = None
+_async_client = None
+_local_pool = None
+
+# Per-process model for the local backend (loaded once in each pool worker)
+_local_model = None
+
+
+def get_client():
+    """Get the shared synchronous OpenAI client (None without an API key)"""
+    global _client
+    if _client is None and OPENAI_API_KEY:
+        from openai import OpenAI
+        _client = OpenAI(api_key=OPENAI_API_KEY)
+    return _client
+
+
+def get_async_client():
+    """Get the shared async OpenAI client (None without an API key)"""
+    global _async_client
+    if _async_client is None and OPENAI_API_KEY:
+        from openai import AsyncOpenAI
+        _async_client = AsyncOpenAI(api_key=OPENAI_API_KEY)
+    return _async_client
+
+
+def get_transcription_backend() -> str:
+    """Get the effective transcription backend: local, api (when enabled and keyed) or stub"""
+    if WHISPER_BACKEND == "local":
+        return "local"
+    if WHISPER_BACKEND == "api" and WHISPER_USE_API and OPENAI_API_KEY:
+        return "api"
+    return "stub"
+
+
+def transcript_cache_key(audio_hash: str, backend: Optional[str] = None) -> str:
+    """Cache key of a transcript: audio content, backend and model settings"""
+    backend = backend or get_transcription_backend()
+    if backend == "local":
+        model = f"{LOCAL_WHISPER_MODEL}:{LOCAL_WHISPER_COMPUTE_TYPE}"
+    else:
+        model = WHISPER_MODEL
+    return sha256_text(json.dumps(
+        {
+            "audio": audio_hash,
+            "backend": backend,
+            "model": model,
+            "version": TRANSCRIPT_CACHE_VERSION
+        },
+        sort_keys=True,
+    ))
+
+
+def get_cached_transcription(
+    audio_hash: str,
+    backend: Optional[str] = None
+) -> Optional[Dict[str, Any]]:
+    """Cached transcription of the audio with the current settings, or None"""
+    backend = backend or get_transcription_backend()
+    cache = get_cache()
+    if backend == "stub" or cache is None:
+        return None
+    return cache.get("transcript", transcript_cache_key(audio_hash, backend))
+
+
+def cache_transcription(audio_hash: str, result: Dict[str, Any]) -> None:
+    """
+    Cache a transcription result
+    
+    Every caller stores and reads this one shape (transcript, segments,
+    backend, real_time_factor). Stub output is not a real transcript of
+    the audio and is never cached.
+    """
+    backend = result.get("backend", "api")
+    cache = get_cache()
+    if backend == "stub" or cache is None:
+        return
+    cache.set("transcript", transcript_cache_key(audio_hash, backend), {
+        "transcript": result["transcript"],
+        "segments": result.get("segments", 1),
+        "backend": backend,
+        "real_time_factor": result.get("real_time_factor"),
+    })
 
 
 def transcribe_audio(file_path_or_bytes: Union[str, bytes, BinaryIO]) -> str:
     """
     Transcribe audio using Whisper API or return stub for testing
     
+    Transcripts are cached by the SHA-256 of the audio content and the
+    backend and model, so repeated uploads of the same recording skip the
+    model entirely until the transcription settings change.
+    
     Args:
         file_path_or_bytes: Path to audio file or bytes/file object
     
     Returns:
         Transcribed text
     """
+    # File-like objects are read once so their content can be hashed
+    if not isinstance(file_path_or_bytes, (str, Path, bytes)):
+        file_path_or_bytes = file_path_or_bytes.read()
+    
+    backend = get_transcription_backend()
+    if backend == "stub" or get_cache() is None:
+        return _transcribe_audio_uncached(file_path_or_bytes)
+    
+    if isinstance(file_path_or_bytes, bytes):
+        audio_hash = hashlib.sha256(file_path_or_bytes).hexdigest()
+    else:
+        audio_hash = sha256_file(str(file_path_or_bytes))
+    
+    cached = get_cached_transcription(audio_hash, backend)
+    if cached is not None:
+        return cached["transcript"]
+    
+    transcript = _transcribe_audio_uncached(file_path_or_bytes)
+    if not transcript.startswith("Error transcribing audio"):
+        cache_transcription(
+            audio_hash, {"transcript": transcript, "segments": 1, "backend": backend}
+        )
+    return transcript
+
+
+def _transcribe_audio_uncached(file_path_or_bytes: Union[str, Path, bytes]) -> str:
+    """Transcribe a path or bytes with the configured backend"""
+    if WHISPER_BACKEND == "local":
+        audio = file_path_or_bytes
+        if isinstance(audio, Path):
+            audio = str(audio)
+        pool = get_local_pool()
+        try:
+            text, _ = pool.submit(_transcribe_local_segment, audio).result()
+        except BrokenProcessPool:
+            discard_local_pool(pool)
+            raise
+        return text
+    
     # Check if we should use the API
-    if not WHISPER_USE_API:
+    if not WHISPER_USE_API or WHISPER_BACKEND == "stub":
         logger.warning("Whisper API disabled, using stub transcription")
         return _get_stub_transcription()
     
     # Check if API key is available
-    if not OPENAI_API_KEY or not client:
+    if not OPENAI_API_KEY or not get_client():
         logger.warning("OpenAI API key missing, using stub transcription")
         return _get_stub_transcription()
     
@@ -43,27 +191,20 @@ def transcribe_audio(file_path_or_bytes: Union[str, bytes, BinaryIO]) -> str:
             # It's a file path
             with open(file_path_or_bytes, "rb") as audio_file:
                 return _call_whisper_api(audio_file)
-        elif isinstance(file_path_or_bytes, bytes):
-            # It's bytes, write to temp file
-            with tempfile.NamedTemporaryFile(suffix=".mp3") as temp_file:
-                temp_file.write(file_path_or_bytes)
-                temp_file.flush()
-                with open(temp_file.name, "rb") as audio_file:
-                    return _call_whisper_api(audio_file)
         else:
-            # Assume it's a file-like object
-            return _call_whisper_api(file_path_or_bytes)
+            # It's bytes, upload directly as a named in-memory file
+            return _call_whisper_api(("audio.mp3", file_path_or_bytes))
     except Exception as e:
         logger.error(f"Error transcribing audio: {e}")
         return f"Error transcribing audio: {str(e)}"
 
 
-def _call_whisper_api(audio_file: BinaryIO) -> str:
+def _call_whisper_api(audio_file) -> str:
     """Call Whisper API with the audio file"""
     try:
-        response = client.audio.transcriptions.create(
+        response = get_client().audio.transcriptions.create(
             file=audio_file,
-            model="whisper-1"
+            model=WHISPER_MODEL
         )
         return response.text
     except Exception as e:
@@ -71,6 +212,213 @@ def _call_whisper_api(audio_file: BinaryIO) -> str:
         raise
 
 
+async def save_upload_stream(chunks: AsyncIterator[bytes], suffix: str = ".mp3") -> Tuple[str, str]:
+    """
+    Write an incoming byte stream to a temporary file chunk by chunk
+    
+    Only one network chunk is held in memory at a time, and the SHA-256 of
+    the content is computed on the same pass.
+    
+    Returns:
+        Tuple of (temporary file path, hex SHA-256); the caller removes the file
+    """
+    digest = hashlib.sha256()
+    with tempfile.NamedTemporaryFile(suffix=suffix, delete=False) as temp_file:
+        async for chunk in chunks:
+            if chunk:
+                digest.update(chunk)
+                temp_file.write(chunk)
+        return temp_file.name, digest.hexdigest()
+
+
+async def split_audio(file_path: str, segment_seconds: int = WHISPER_SEGMENT_SECONDS) -> List[str]:
+    """
+    Split a recording into segments of roughly segment_seconds without re-encoding
+    
+    Uses ffmpeg's segment muxer when ffmpeg is installed; otherwise the file is
+    returned as a single segment.
+    
+    Returns:
+        Ordered list of segment file paths
+    """
+    if not shutil.which("ffmpeg"):
+        logger.info("ffmpeg not found, transcribing recording as a single segment")
+        return [file_path]
+    
+    suffix = Path(file_path).suffix or ".mp3"
+    output_dir = tempfile.mkdtemp(prefix="segments-")
+    pattern = os.path.join(output_dir, f"segment-%04d{suffix}")
+    
+    process = await asyncio.create_subprocess_exec(
+        "ffmpeg", "-v", "error", "-i", file_path,
+        "-f", "segment", "-segment_time", str(segment_seconds),
+        "-c", "copy", "-reset_timestamps", "1", pattern,
+        stdout=asyncio.subprocess.DEVNULL,
+        stderr=asyncio.subprocess.PIPE,
+    )
+    _, stderr = await process.communicate()
+    
+    segments = sorted(str(path) for path in Path(output_dir).iterdir())
+    if process.returncode != 0 or not segments:
+        logger.warning(
+            f"ffmpeg segmentation failed, using whole file: {stderr.decode(errors='ignore')}"
+        )
+        shutil.rmtree(output_dir, ignore_errors=True)
+        return [file_path]
+    
+    return segments
+
+
+async def _call_whisper_api_async(segment_path: str) -> str:
+    """Call Whisper API asynchronously with one segment file"""
+    with open(segment_path, "rb") as audio_file:
+        response = await get_async_client().audio.transcriptions.create(
+            file=audio_file,
+            model=WHISPER_MODEL
+        )
+    return response.text
+
+
+def _init_local_worker(model_name: str, compute_type: str, cpu_threads: int) -> None:
+    """Load the local Whisper model once per worker process"""
+    global _local_model
+    try:
+        from faster_whisper import WhisperModel
+    except ImportError as e:
+        raise RuntimeError(
+            "WHISPER_BACKEND=local requires the faster-whisper package (pip install faster-whisper)"
+        ) from e
+    _local_model = WhisperModel(
+        model_name,
+        device="cpu",
+        compute_type=compute_type,
+        cpu_threads=cpu_threads,
+    )
+
+
+def _transcribe_local_segment(audio: Union[str, bytes]) -> Tuple[str, float]:
+    """Transcribe one segment in a worker process; returns (text, audio seconds)"""
+    source = io.BytesIO(audio) if isinstance(audio, bytes) else audio
+    segments, info = _local_model.transcribe(source, beam_size=1, vad_filter=True)
+    text = " ".join(segment.text.strip() for segment in segments)
+    return text, info.duration
+
+
+def get_local_pool() -> ProcessPoolExecutor:
+    """
+    Get the shared worker pool for the local backend
+    
+    faster-whisper is checked here, in the API process, because a worker
+    that fails to initialize only surfaces as a BrokenProcessPool.
+    """
+    global _local_pool
+    if _local_pool is None:
+        if importlib.util.find_spec("faster_whisper") is None:
+            raise RuntimeError(
+                "WHISPER_BACKEND=local requires the faster-whisper package "
+                "(pip install faster-whisper)"
+            )
+        # Split the cores between workers so they do not oversubscribe the CPU
+        cpu_threads = max(1, (os.cpu_count() or 1) // LOCAL_WHISPER_WORKERS)
+        _local_pool = ProcessPoolExecutor(
+            max_workers=LOCAL_WHISPER_WORKERS,
+            initializer=_init_local_worker,
+            initargs=(LOCAL_WHISPER_MODEL, LOCAL_WHISPER_COMPUTE_TYPE, cpu_threads),
+        )
+    return _local_pool
+
+
+def discard_local_pool(pool: ProcessPoolExecutor) -> None:
+    """Drop a broken worker pool so the next transcription starts a fresh one"""
+    global _local_pool
+    if _local_pool is pool:
+        _local_pool = None
+    pool.shutdown(wait=False, cancel_futures=True)
+
+
+async def _transcribe_segments_local(segments: List[str]) -> Tuple[List[str], float]:
+    """Transcribe segments in parallel across the local worker pool"""
+    loop = asyncio.get_running_loop()
+    pool = get_local_pool()
+    try:
+        results = await asyncio.gather(
+            *(loop.run_in_executor(pool, _transcribe_local_segment, path) for path in segments)
+        )
+    except BrokenProcessPool:
+        discard_local_pool(pool)
+        raise
+    texts = [text for text, _ in results]
+    audio_seconds = sum(duration for _, duration in results)
+    return texts, audio_seconds
+
+
+async def _transcribe_segments_api(segments: List[str], max_concurrency: int) -> List[str]:
+    """Transcribe segments with bounded concurrent Whisper API calls"""
+    semaphore = asyncio.Semaphore(max_concurrency)
+    
+    async def transcribe_segment(segment_path: str) -> str:
+        async with semaphore:
+            return await _call_whisper_api_async(segment_path)
+    
+    return await asyncio.gather(*(transcribe_segment(path) for path in segments))
+
+
+async def transcribe_file_async(
+    file_path: str,
+    segment_seconds: int = WHISPER_SEGMENT_SECONDS,
+    max_concurrency: int = WHISPER_MAX_CONCURRENCY,
+) -> dict:
+    """
+    Transcribe a recording by splitting it into segments transcribed concurrently
+    
+    Args:
+        file_path: Path of the audio file
+        segment_seconds: Target segment length
+        max_concurrency: Maximum simultaneous transcription requests (API backend)
+    
+    Returns:
+        Dict with the stitched "transcript", the number of "segments", the
+        "backend" used and the "real_time_factor" (processing seconds per
+        audio second, local backend only)
+    """
+    backend = get_transcription_backend()
+    if backend == "stub":
+        logger.warning("Whisper API disabled or key missing, using stub transcription")
+        return {
+            "transcript": _get_stub_transcription(),
+            "segments": 1,
+            "backend": "stub",
+            "real_time_factor": None,
+        }
+    
+    started = time.perf_counter()
+    segments = await split_audio(file_path, segment_seconds)
+    real_time_factor = None
+    
+    try:
+        # gather preserves input order, so segments stitch back in sequence
+        if backend == "local":
+            texts, audio_seconds = await _transcribe_segments_local(segments)
+            if audio_seconds > 0:
+                real_time_factor = round((time.perf_counter() - started) / audio_seconds, 4)
+                logger.info(
+                    f"Local transcription of {audio_seconds:.0f}s audio, RTF {real_time_factor}"
+                )
+        else:
+            texts = await _transcribe_segments_api(segments, max_concurrency)
+    finally:
+        if segments != [file_path]:
+            shutil.rmtree(os.path.dirname(segments[0]), ignore_errors=True)
+    
+    transcript = "\n".join(text.strip() for text in texts if text and text.strip())
+    return {
+        "transcript": transcript,
+        "segments": len(segments),
+        "backend": backend,
+        "real_time_factor": real_time_factor,
+    }
+
+
 def _get_stub_transcription() -> str:
     """Return a stub transcription for testing"""
     return """
@@ -0,0 +1,68 @@
+import os
+import re
+from typing import List, NamedTuple, Optional
+
+from fastapi import Header, HTTPException
+
+# Environment variables
+DEFAULT_TENANT = os.getenv("DEFAULT_TENANT", "default")
+DEFAULT_WORKSPACE = os.getenv("DEFAULT_WORKSPACE", "default")
+
+# Tenant and workspace IDs are used in namespaces and directory names
+SCOPE_ID_PATTERN = re.compile(r"^[A-Za-z0-9_-]{1,64}$")
+
+
+class Scope(NamedTuple):
+    """The tenant and workspace a request reads and writes"""
+    tenant_id: str
+    workspace_id: str
+    
+    @property
+    def namespace(self) -> Optional[str]:
+        """
+        Vector namespace of the scope
+        
+        The default scope keeps the index's default namespace, so data
+        indexed before scoping existed stays visible to it.
+        """
+        if self == DEFAULT_SCOPE:
+            return None
+        return f"{self.tenant_id}:{self.workspace_id}"
+    
+    def workspace(self, workspace_id: str) -> "Scope":
+        """Another workspace of the same tenant"""
+        return Scope(self.tenant_id, validate_scope_id(workspace_id, "workspace"))
+
+
+DEFAULT_SCOPE = Scope(DEFAULT_TENANT, DEFAULT_WORKSPACE)
+
+
+def validate_scope_id(value: str, kind: str) -> str:
+    if not SCOPE_ID_PATTERN.match(value or ""):
+        raise HTTPException(
+            status_code=400,
+            detail=f"Invalid {kind} ID {value!r}: use 1-64 letters, digits, '-' or '_'"
+        )
+    return value
+
+
+def get_scope(
+    x_tenant_id: str = Header(default=DEFAULT_TENANT),
+    x_workspace_id: str = Header(default=DEFAULT_WORKSPACE),
+) -> Scope:
+    """
+    Dependency for the request's scope, from the X-Tenant-ID and X-Workspace-ID headers
+    
+    The headers are trusted as given; a gateway that authenticates users
+    is expected to set them.
+    """
+    return Scope(
+        validate_scope_id(x_tenant_id, "tenant"), validate_scope_id(x_workspace_id, "workspace")
+    )
+
+
+def shard_scopes(scope: Scope, workspaces: Optional[List[str]] = None) -> List[Scope]:
+    """Scopes of the given workspaces of the request's tenant (default: its own workspace)"""
+    if not workspaces:
+        return [scope]
+    return [scope.workspace(workspace_id) for workspace_id in dict.fromkeys(workspaces)]
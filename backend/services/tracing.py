@@ -0,0 +1,327 @@
+import os
+import re
+import sys
+import json
+import time
+import queue
+import atexit
+import threading
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Dict, Iterator, NamedTuple, Optional, Union
+import logging
+
+from langchain_core.runnables import Runnable, RunnableConfig, RunnableLambda
+from langchain_core.runnables.base import coerce_to_runnable
+
+from services.profiling import current_profile
+
+# Environment variables
+TRACING_EXPORTER = os.getenv("TRACING_EXPORTER", "none")  # none, console or file
+TRACING_FILE = os.getenv("TRACING_FILE", "/tmp/ai-second-brain-traces.jsonl")
+TRACING_SERVICE_NAME = os.getenv("TRACING_SERVICE_NAME", "ai-second-brain")
+
+# Configure logger
+logger = logging.getLogger(__name__)
+
+TRACEPARENT_HEADER = "traceparent"
+TRACEPARENT_PATTERN = re.compile(r"^00-([0-9a-f]{32})-([0-9a-f]{16})-([0-9a-f]{2})$")
+
+# OTLP status codes
+STATUS_OK = 1
+STATUS_ERROR = 2
+
+# OTLP span kinds
+KIND_INTERNAL = 1
+KIND_SERVER = 2
+
+
+class SpanContext(NamedTuple):
+    """Identity of a span, as carried by a W3C traceparent header"""
+    trace_id: str
+    span_id: str
+    sampled: bool = True
+    
+    @property
+    def traceparent(self) -> str:
+        return f"00-{self.trace_id}-{self.span_id}-{'01' if self.sampled else '00'}"
+
+
+# Span the current code runs in (local or from an incoming traceparent)
+_current: ContextVar[Optional[SpanContext]] = ContextVar("trace_span", default=None)
+
+
+def parse_traceparent(value: Optional[str]) -> Optional[SpanContext]:
+    """Span context from a traceparent header, or None when it is missing or invalid"""
+    match = TRACEPARENT_PATTERN.match((value or "").strip().lower())
+    if match is None or set(match.group(1)) == {"0"} or set(match.group(2)) == {"0"}:
+        return None
+    return SpanContext(match.group(1), match.group(2), int(match.group(3), 16) & 1 == 1)
+
+
+def otlp_value(value: Any) -> Dict[str, Any]:
+    """OTLP/JSON AnyValue for an attribute"""
+    if isinstance(value, bool):
+        return {"boolValue": value}
+    if isinstance(value, int):
+        return {"intValue": str(value)}
+    if isinstance(value, float):
+        return {"doubleValue": value}
+    return {"stringValue": str(value)}
+
+
+class Span:
+    """One timed operation; exported when it ends"""
+    
+    def __init__(self, name: str, parent: Optional[SpanContext], kind: int = KIND_INTERNAL):
+        self.name = name
+        self.kind = kind
+        self.parent_id = parent.span_id if parent else None
+        trace_id = parent.trace_id if parent else os.urandom(16).hex()
+        self.context = SpanContext(trace_id, os.urandom(8).hex())
+        self.attributes: Dict[str, Any] = {}
+        self.status: Dict[str, Any] = {"code": STATUS_OK}
+        self.start_ns = time.time_ns()
+        self.end_ns = self.start_ns
+    
+    def set_attribute(self, key: str, value: Any) -> None:
+        self.attributes[key] = value
+    
+    def set_error(self, error: BaseException) -> None:
+        self.status = {"code": STATUS_ERROR, "message": f"{type(error).__name__}: {error}"}
+    
+    def to_otlp(self) -> Dict[str, Any]:
+        """Span in the OTLP/JSON encoding"""
+        span = {
+            "traceId": self.context.trace_id,
+            "spanId": self.context.span_id,
+            "name": self.name,
+            "kind": self.kind,
+            "startTimeUnixNano": str(self.start_ns),
+            "endTimeUnixNano": str(self.end_ns),
+            "attributes": [
+                {"key": key, "value": otlp_value(value)} for key, value in self.attributes.items()
+            ],
+            "status": self.status,
+        }
+        if self.parent_id:
+            span["parentSpanId"] = self.parent_id
+        return span
+
+
+class FileExporter:
+    """
+    Appends spans to a file as OTLP/JSON lines
+    
+    Each line is an ExportTraceServiceRequest, the format of the
+    OpenTelemetry Collector's file exporter, so the file can be replayed
+    into any OTLP backend with its otlpjsonfile receiver.
+    
+    export() only queues the span: a background thread encodes whatever
+    has queued up and appends it as one line, so the event loop never
+    waits on the file.
+    """
+    
+    def __init__(self, path: str):
+        self.path = path
+        self._queue: "queue.Queue[Span]" = queue.Queue()
+        self._thread = threading.Thread(target=self._run, name="trace-export", daemon=True)
+        self._thread.start()
+        atexit.register(self.flush)
+    
+    def export(self, span: Span) -> None:
+        self._queue.put(span)
+    
+    def flush(self) -> None:
+        """Wait until every queued span is written"""
+        self._queue.join()
+    
+    def _run(self) -> None:
+        while True:
+            spans = [self._queue.get()]
+            while True:
+                try:
+                    spans.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+            try:
+                service = {"key": "service.name", "value": otlp_value(TRACING_SERVICE_NAME)}
+                line = json.dumps({"resourceSpans": [{
+                    "resource": {"attributes": [service]},
+                    "scopeSpans": [
+                        {"scope": {"name": __name__}, "spans": [span.to_otlp() for span in spans]}
+                    ],
+                }]})
+                with open(self.path, "a") as f:
+                    f.write(line + "\n")
+            except Exception as e:
+                logger.warning(f"Could not export {len(spans)} spans to {self.path}: {e}")
+            finally:
+                for _ in spans:
+                    self._queue.task_done()
+
+
+class ConsoleExporter:
+    """Writes one readable line per span to stderr"""
+    
+    def __init__(self):
+        self._lock = threading.Lock()
+    
+    def export(self, span: Span) -> None:
+        attributes = " ".join(f"{key}={value}" for key, value in span.attributes.items())
+        error = f" error={span.status['message']!r}" if span.status["code"] == STATUS_ERROR else ""
+        line = (
+            f"[trace {span.context.trace_id[:8]}] {span.name} "
+            f"{(span.end_ns - span.start_ns) / 1e6:.1f}ms "
+            f"span={span.context.span_id} parent={span.parent_id or '-'} {attributes}"
+        ).rstrip()
+        with self._lock:
+            sys.stderr.write(line + error + "\n")
+
+
+_exporters: Dict[str, Any] = {}
+
+
+def get_exporter() -> Optional[Union[FileExporter, ConsoleExporter]]:
+    """Exporter for TRACING_EXPORTER, or None when tracing is off"""
+    key = f"{TRACING_EXPORTER}:{TRACING_FILE}"
+    if key not in _exporters:
+        if TRACING_EXPORTER == "file":
+            _exporters[key] = FileExporter(TRACING_FILE)
+        elif TRACING_EXPORTER == "console":
+            _exporters[key] = ConsoleExporter()
+        else:
+            if TRACING_EXPORTER not in ("none", ""):
+                logger.warning(f"Unknown TRACING_EXPORTER {TRACING_EXPORTER!r}; tracing is off")
+            _exporters[key] = None
+    return _exporters[key]
+
+
+@contextmanager
+def span(
+    name: str,
+    parent: Optional[SpanContext] = None,
+    kind: int = KIND_INTERNAL,
+    stage: Optional[str] = None,
+    **attributes: Any
+) -> Iterator[Optional[Span]]:
+    """
+    Trace a block as a child of the current span
+    
+    Yields the span (for set_attribute) or None when tracing is off or the
+    trace is not sampled. The current span lives in a context variable, so
+    children started in asyncio tasks, asyncio.to_thread and LangChain's
+    executors attach to it.
+    
+    With stage (chunking, embedding), the block is also timed as that stage
+    of the request's profile when the request is profiled.
+    """
+    profile = current_profile() if stage else None
+    if profile is None:
+        with _trace(name, parent, kind, attributes) as current:
+            yield current
+        return
+    started = time.perf_counter()
+    try:
+        with _trace(name, parent, kind, attributes) as current:
+            yield current
+    finally:
+        profile.add_stage(stage, started, time.perf_counter())
+
+
+@contextmanager
+def _trace(
+    name: str,
+    parent: Optional[SpanContext],
+    kind: int,
+    attributes: Dict[str, Any]
+) -> Iterator[Optional[Span]]:
+    exporter = get_exporter()
+    if exporter is None:
+        yield None
+        return
+    
+    parent = parent or _current.get()
+    if parent is not None and not parent.sampled:
+        # The caller chose not to record this trace; keep it that way for children
+        token = _current.set(parent)
+        try:
+            yield None
+        finally:
+            _current.reset(token)
+        return
+    
+    current = Span(name, parent, kind)
+    current.attributes.update(attributes)
+    token = _current.set(current.context)
+    try:
+        yield current
+    except BaseException as e:
+        current.set_error(e)
+        raise
+    finally:
+        _current.reset(token)
+        current.end_ns = time.time_ns()
+        try:
+            exporter.export(current)
+        except Exception as e:
+            logger.warning(f"Could not export span {name}: {e}")
+
+
+def traced_runnable(name: str, runnable: Runnable) -> Runnable:
+    """
+    Runnable that runs another inside a span, so its own spans nest below it
+    
+    Chains are built per request, so with tracing off the runnable is
+    returned as is and costs nothing.
+    """
+    if get_exporter() is None:
+        return runnable
+    runnable = coerce_to_runnable(runnable)
+    
+    def invoke(value: Any, config: RunnableConfig) -> Any:
+        with span(name):
+            return runnable.invoke(value, config)
+    
+    async def ainvoke(value: Any, config: RunnableConfig) -> Any:
+        with span(name):
+            return await runnable.ainvoke(value, config)
+    
+    return RunnableLambda(invoke, afunc=ainvoke, name=name)
+
+
+class TracingMiddleware:
+    """
+    Server span for every HTTP request (ASGI middleware)
+    
+    Joins the caller's trace from an incoming traceparent header and
+    returns the request's own traceparent on the response. A no-op while
+    TRACING_EXPORTER is none.
+    """
+    
+    def __init__(self, app: Any):
+        self.app = app
+    
+    async def __call__(self, scope, receive, send) -> None:
+        if scope["type"] != "http" or get_exporter() is None:
+            await self.app(scope, receive, send)
+            return
+        
+        headers = dict(scope["headers"])
+        remote = parse_traceparent(headers.get(TRACEPARENT_HEADER.encode(), b"").decode("latin-1"))
+        route = f"{scope['method']} {scope['path']}"
+        
+        with span(route, parent=remote, kind=KIND_SERVER, **{
+            "http.request.method": scope["method"], "url.path": scope["path"]
+        }) as server:
+            async def send_with_traceparent(message):
+                if message["type"] == "http.response.start" and server is not None:
+                    server.set_attribute("http.response.status_code", message["status"])
+                    if message["status"] >= 500:
+                        server.status = {"code": STATUS_ERROR}
+                    message["headers"] = list(message.get("headers", [])) + [
+                        (TRACEPARENT_HEADER.encode(), server.context.traceparent.encode())
+                    ]
+                await send(message)
+            
+            await self.app(scope, receive, send_with_traceparent)
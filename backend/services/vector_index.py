@@ -0,0 +1,394 @@
+import json
+import os
+import uuid
+import weakref
+import tempfile
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+import logging
+
+import numpy as np
+from langchain_core.documents import Document
+from langchain_core.embeddings import Embeddings
+from langchain_core.vectorstores import VectorStore
+
+# Environment variables
+VECTOR_STORAGE = os.getenv("VECTOR_STORAGE", "float32").lower()
+VECTOR_DIMS = int(os.getenv("VECTOR_DIMS", "0"))
+VECTOR_RESCORE = os.getenv("VECTOR_RESCORE", "true").lower() == "true"
+VECTOR_RESCORE_DIR = os.getenv("VECTOR_RESCORE_DIR")
+VECTOR_SHORTLIST_FACTOR = int(os.getenv("VECTOR_SHORTLIST_FACTOR", "4"))
+
+# Configure logger
+logger = logging.getLogger(__name__)
+
+# Supported storage types for the scanned (first-stage) vectors
+STORAGE_TYPES = ("float32", "float16", "int8")
+
+# Rows converted to float32 at a time while scanning compact vectors
+SCAN_BLOCK_SIZE = 8192
+
+
+def normalize_rows(vectors: np.ndarray) -> np.ndarray:
+    """L2-normalize each row (zero rows stay zero)"""
+    vectors = np.asarray(vectors, dtype=np.float32)
+    norms = np.linalg.norm(vectors, axis=-1, keepdims=True)
+    return vectors / np.maximum(norms, 1e-12)
+
+
+def truncate_dims(vectors: np.ndarray, dims: int) -> np.ndarray:
+    """
+    Keep the first dims components and renormalize (Matryoshka truncation)
+    
+    Models trained with Matryoshka representation learning, such as
+    text-embedding-3-*, keep most of their ranking quality when truncated.
+    dims <= 0 keeps every component.
+    """
+    vectors = np.asarray(vectors, dtype=np.float32)
+    if dims <= 0 or dims >= vectors.shape[-1]:
+        return normalize_rows(vectors)
+    return normalize_rows(vectors[..., :dims])
+
+
+class QuantizedVectors:
+    """
+    Row vectors stored as float32, float16 or int8 codes
+    
+    int8 uses symmetric per-row scales (code = round(x / scale), with
+    scale = max|x| / 127), so a dot product is code @ q * scale.
+    """
+    
+    def __init__(self, vectors: np.ndarray, storage: str = "float32"):
+        if storage not in STORAGE_TYPES:
+            raise ValueError(f"Unknown vector storage: {storage}")
+        self.storage = storage
+        vectors = np.asarray(vectors, dtype=np.float32)
+        if storage == "int8":
+            self.scales = np.maximum(np.abs(vectors).max(axis=1), 1e-12) / 127.0
+            self.codes = np.round(vectors / self.scales[:, None]).astype(np.int8)
+        else:
+            self.scales = None
+            self.codes = vectors.astype(storage)
+    
+    @classmethod
+    def from_codes(
+        cls, codes: np.ndarray, scales: Optional[np.ndarray], storage: str
+    ) -> "QuantizedVectors":
+        """Wrap stored codes (and int8 scales) without copying them"""
+        vectors = cls.__new__(cls)
+        vectors.storage = storage
+        vectors.codes = codes
+        vectors.scales = scales
+        return vectors
+    
+    def __len__(self) -> int:
+        return len(self.codes)
+    
+    @property
+    def nbytes(self) -> int:
+        return self.codes.nbytes + (self.scales.nbytes if self.scales is not None else 0)
+    
+    @property
+    def mapped(self) -> bool:
+        return isinstance(self.codes, np.memmap)
+    
+    def extend(self, other: "QuantizedVectors") -> None:
+        """Append rows quantized with the same storage type"""
+        self.codes = np.concatenate([self.codes, other.codes])
+        if self.scales is not None:
+            self.scales = np.concatenate([self.scales, other.scales])
+    
+    def scores(self, query: np.ndarray, rows: Optional[np.ndarray] = None) -> np.ndarray:
+        """Dot products of the query with every stored row (or the given rows)"""
+        codes = self.codes if rows is None else self.codes[rows]
+        scales = self.scales
+        if scales is not None and rows is not None:
+            scales = scales[rows]
+        out = np.empty(len(codes), dtype=np.float32)
+        # Upcast block by block so the scan never materializes a float32 copy
+        for start in range(0, len(codes), SCAN_BLOCK_SIZE):
+            block = codes[start:start + SCAN_BLOCK_SIZE].astype(np.float32, copy=False)
+            out[start:start + len(block)] = block @ query
+        return out * scales if scales is not None else out
+
+
+class CompactVectorIndex:
+    """
+    Cosine-similarity index with compact first-stage vectors and exact rescoring
+    
+    Stage one scans truncated (dims) vectors stored as storage; stage two
+    rescores the best k * shortlist_factor candidates with full-dimension
+    float16 vectors, kept in memory or in a memory-mapped file so they cost
+    no resident memory until touched. The file is rescore_path, or a file of
+    this index's own in rescore_dir (removed with the index); new vectors are
+    appended to it, so an add writes only its own rows.
+    """
+    
+    def __init__(
+        self,
+        dims: int = VECTOR_DIMS,
+        storage: str = VECTOR_STORAGE,
+        rescore: bool = VECTOR_RESCORE,
+        rescore_path: Optional[str] = None,
+        shortlist_factor: int = VECTOR_SHORTLIST_FACTOR,
+        rescore_dir: Optional[str] = VECTOR_RESCORE_DIR,
+    ):
+        self.dims = dims
+        self.storage = storage
+        self.rescore = rescore
+        self.rescore_path = rescore_path
+        self.shortlist_factor = shortlist_factor
+        self.input_dims = 0
+        self.compact: Optional[QuantizedVectors] = None
+        self.full: Optional[np.ndarray] = None
+        self._full_parts: List[np.ndarray] = []
+        if rescore and rescore_path is None and rescore_dir:
+            # Never share a spill file: another index would overwrite it under our map
+            os.makedirs(rescore_dir, exist_ok=True)
+            fd, self.rescore_path = tempfile.mkstemp(
+                prefix="rescore-", suffix=".f16", dir=rescore_dir
+            )
+            os.close(fd)
+            weakref.finalize(self, _remove_file, self.rescore_path)
+    
+    def __len__(self) -> int:
+        return len(self.compact) if self.compact is not None else 0
+    
+    def add(self, vectors: np.ndarray) -> None:
+        """Append vectors (any scale; they are normalized)"""
+        vectors = normalize_rows(vectors)
+        self.input_dims = vectors.shape[1]
+        compact = QuantizedVectors(truncate_dims(vectors, self.dims), self.storage)
+        if self.compact is None:
+            self.compact = compact
+        else:
+            self.compact.extend(compact)
+        if self.rescore:
+            self._store_full(vectors.astype(np.float16))
+    
+    def _store_full(self, vectors: np.ndarray) -> None:
+        if self.rescore_path:
+            # Raw rows, so new ones are appended instead of rewriting the file
+            rows = len(self.full) if self.full is not None else 0
+            with open(self.rescore_path, "ab" if rows else "wb") as f:
+                f.write(np.ascontiguousarray(vectors).tobytes())
+            shape = (rows + len(vectors), vectors.shape[1])
+            self.full = np.memmap(self.rescore_path, dtype=np.float16, mode="r", shape=shape)
+            self._full_parts = [self.full]
+        else:
+            self._full_parts.append(vectors)
+            parts = self._full_parts
+            full = np.concatenate(parts) if len(parts) > 1 else parts[0]
+            self.full = full
+            self._full_parts = [full]
+    
+    def search(self, query: np.ndarray, k: int) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Two-stage top-k search
+        
+        Returns:
+            (row indices, cosine similarities), best first
+        """
+        if not len(self):
+            return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.float32)
+        query = normalize_rows(query)
+        k = min(k, len(self))
+        
+        scores = self.compact.scores(truncate_dims(query, self.dims))
+        shortlist = k * self.shortlist_factor if self.rescore else k
+        candidates = _top_k(scores, min(shortlist, len(self)))
+        
+        if self.rescore and self.full is not None:
+            # Ascending rows read a memory-mapped file sequentially
+            candidates = np.sort(candidates)
+            exact = np.asarray(self.full[candidates], dtype=np.float32) @ query
+            order = np.argsort(-exact)[:k]
+            return candidates[order], exact[order]
+        return candidates[:k], scores[candidates[:k]]
+    
+    def save(self, path: str) -> None:
+        """Write the index to a directory of .npy files that load() can memory-map"""
+        os.makedirs(path, exist_ok=True)
+        if self.compact is not None:
+            np.save(os.path.join(path, "compact.npy"), self.compact.codes)
+            if self.compact.scales is not None:
+                np.save(os.path.join(path, "scales.npy"), self.compact.scales)
+        if self.full is not None:
+            np.save(os.path.join(path, "full.npy"), np.asarray(self.full))
+        with open(os.path.join(path, "index.json"), "w") as f:
+            json.dump({
+                "dims": self.dims,
+                "storage": self.storage,
+                "rescore": self.rescore,
+                "shortlist_factor": self.shortlist_factor,
+                "input_dims": self.input_dims,
+            }, f)
+    
+    @classmethod
+    def load(cls, path: str, mmap_mode: Optional[str] = "r") -> "CompactVectorIndex":
+        """
+        Open an index written by save()
+        
+        With mmap_mode="r" every array is a read-only memory map, so processes
+        opening the same files share one copy in the page cache.
+        """
+        with open(os.path.join(path, "index.json")) as f:
+            config = json.load(f)
+        index = cls(
+            dims=config["dims"],
+            storage=config["storage"],
+            rescore=config["rescore"],
+            shortlist_factor=config["shortlist_factor"],
+            rescore_dir=None,
+        )
+        index.input_dims = config["input_dims"]
+        
+        def array(name: str) -> Optional[np.ndarray]:
+            file = os.path.join(path, name)
+            return np.load(file, mmap_mode=mmap_mode) if os.path.exists(file) else None
+        
+        codes = array("compact.npy")
+        if codes is not None:
+            index.compact = QuantizedVectors.from_codes(codes, array("scales.npy"), index.storage)
+        index.full = array("full.npy")
+        index._full_parts = [index.full] if index.full is not None else []
+        return index
+    
+    @classmethod
+    def merge(cls, parts: List[Tuple["CompactVectorIndex", np.ndarray]]) -> "CompactVectorIndex":
+        """
+        New in-memory index holding the given rows of each index, in order
+        
+        Stored codes are copied as they are (no re-quantization), so rows
+        score exactly as they did. The indexes must share one configuration.
+        """
+        first = parts[0][0]
+        index = cls(
+            dims=first.dims,
+            storage=first.storage,
+            rescore=first.rescore,
+            shortlist_factor=first.shortlist_factor,
+            rescore_dir=None,
+        )
+        index.input_dims = first.input_dims
+        codes = np.concatenate([np.asarray(part.compact.codes[rows]) for part, rows in parts])
+        scales = None
+        if first.compact.scales is not None:
+            scales = np.concatenate([np.asarray(part.compact.scales[rows]) for part, rows in parts])
+        index.compact = QuantizedVectors.from_codes(codes, scales, first.storage)
+        if first.full is not None:
+            index.full = np.concatenate([np.asarray(part.full[rows]) for part, rows in parts])
+            index._full_parts = [index.full]
+        return index
+    
+    def memory_report(self) -> Dict[str, Any]:
+        """Bytes used by each part of the index and the ratio to plain float32 storage"""
+        n = len(self)
+        baseline = n * self.input_dims * 4
+        compact = self.compact.nbytes if self.compact is not None else 0
+        rescore = self.full.nbytes if self.full is not None else 0
+        # Memory-mapped arrays live in the shared page cache, not in this process
+        compact_mapped = self.compact is not None and self.compact.mapped
+        rescore_mapped = isinstance(self.full, np.memmap)
+        resident = (0 if compact_mapped else compact) + (0 if rescore_mapped else rescore)
+        return {
+            "vectors": n,
+            "storage": self.storage,
+            "dims": self.compact.codes.shape[1] if n else 0,
+            "compact_bytes": compact,
+            "rescore_bytes": rescore,
+            "resident_bytes": resident,
+            "float32_bytes": baseline,
+            "compression": round(baseline / resident, 2) if resident else None,
+        }
+
+
+def _remove_file(path: str) -> None:
+    try:
+        os.remove(path)
+    except OSError:
+        pass
+
+
+def _top_k(scores: np.ndarray, k: int) -> np.ndarray:
+    """Indices of the k largest scores, best first"""
+    top = np.argpartition(-scores, k - 1)[:k]
+    return top[np.argsort(-scores[top])]
+
+
+def evaluate_recall(
+    index: CompactVectorIndex,
+    vectors: np.ndarray,
+    queries: np.ndarray,
+    k: int = 10
+) -> float:
+    """Mean recall@k of the index against exact float32 search"""
+    k = min(k, len(vectors))
+    truth = normalize_rows(queries) @ normalize_rows(vectors).T
+    hits = 0
+    for query, row_scores in zip(queries, truth, strict=True):
+        found = index.search(query, k)[0]
+        hits += len(set(_top_k(row_scores, k).tolist()) & set(found.tolist()))
+    return hits / (len(queries) * k)
+
+
+class CompactVectorStore(VectorStore):
+    """LangChain vector store over a CompactVectorIndex held in process memory"""
+    
+    def __init__(self, embedding: Embeddings, index: Optional[CompactVectorIndex] = None):
+        self.embedding = embedding
+        self.index = index or CompactVectorIndex()
+        self.documents: List[Document] = []
+        self.ids: List[str] = []
+    
+    @property
+    def embeddings(self) -> Embeddings:
+        return self.embedding
+    
+    def add_texts(
+        self,
+        texts: Iterable[str],
+        metadatas: Optional[List[Dict[str, Any]]] = None,
+        ids: Optional[List[str]] = None,
+        **kwargs: Any,
+    ) -> List[str]:
+        texts = list(texts)
+        if not texts:
+            return []
+        metadatas = metadatas or [{} for _ in texts]
+        ids = list(ids) if ids else [str(uuid.uuid4()) for _ in texts]
+        self.index.add(np.asarray(self.embedding.embed_documents(texts), dtype=np.float32))
+        self.documents.extend(
+            Document(page_content=text, metadata=metadata)
+            for text, metadata in zip(texts, metadatas, strict=True)
+        )
+        self.ids.extend(ids)
+        return ids
+    
+    def similarity_search_with_score(
+        self, query: str, k: int = 4, **kwargs: Any
+    ) -> List[Tuple[Document, float]]:
+        vector = np.asarray(self.embedding.embed_query(query), dtype=np.float32)
+        rows, scores = self.index.search(vector, k)
+        return [
+            (self.documents[row], float(score))
+            for row, score in zip(rows, scores, strict=True)
+        ]
+    
+    def similarity_search(self, query: str, k: int = 4, **kwargs: Any) -> List[Document]:
+        return [doc for doc, _ in self.similarity_search_with_score(query, k, **kwargs)]
+    
+    def _select_relevance_score_fn(self):
+        # Scores are cosine similarities in [-1, 1]
+        return lambda score: (score + 1.0) / 2.0
+    
+    @classmethod
+    def from_texts(
+        cls,
+        texts: List[str],
+        embedding: Embeddings,
+        metadatas: Optional[List[Dict[str, Any]]] = None,
+        **kwargs: Any,
+    ) -> "CompactVectorStore":
+        store = cls(embedding, kwargs.pop("index", None))
+        store.add_texts(texts, metadatas, **kwargs)
+        return store
@@ -0,0 +1,10 @@
+import pytest
+
+import services.cache
+
+
+@pytest.fixture(autouse=True)
+def disable_artifact_cache(monkeypatch):
+    """Keep tests independent of the on-disk artifact cache"""
+    monkeypatch.setattr(services.cache, "CACHE_ENABLED", False)
+    monkeypatch.setattr(services.cache, "_cache", None)
@@ -1,7 +1,20 @@
+import uuid
+import threading
+
 import pytest
-from unittest.mock import patch, MagicMock
+from unittest.mock import patch, MagicMock, AsyncMock
+
+from langchain_core.documents import Document
 
-from services.llm import build_summarization_chain, build_task_chain, build_qa_chain
+from services.llm import (
+    build_summarization_chain,
+    build_task_chain,
+    build_qa_chain,
+    build_meeting_chain,
+    merge_tasks,
+)
+from services.cache import ArtifactCache
+from services.graph import expand_note_neighborhood
 
 
 class TestSummarizationChain:
@@ -137,3 +150,158 @@ class TestQAChain:
         # Check answer contains citations in expected format
         assert "note_id:123e4567-e89b-12d3-a456-426614174000" in result
         assert "note_id:223e4567-e89b-12d3-a456-426614174001" in result
+
+
+class TestChunkedTaskChain:
+    @patch('services.llm.embed_task_descriptions')
+    @patch('services.llm.get_llm')
+    def test_long_text_extracts_per_chunk_and_dedupes(self, mock_get_llm, mock_embed):
+        """Test that each chunk is extracted once and cross-chunk duplicates merge"""
+        mock_get_llm.return_value = MagicMock(side_effect=[
+            '{"tasks": [{"description": "Email the vendor", "due_date": "2024-06-01", '
+            '"owner": null}]}',
+            '{"tasks": [{"description": "Send an email to the vendor", "due_date": "2024-05-20", '
+            '"owner": "Sam"}]}',
+            '{"tasks": [{"description": "Book the venue", "due_date": null, "owner": null}]}',
+        ])
+        mock_embed.return_value = [[1.0, 0.0], [0.98, 0.05], [0.0, 1.0]]
+        
+        task_chain = build_task_chain(max_concurrency=1)
+        result = task_chain("\n\n".join(["Paragraph about the project. " * 60] * 3))
+        
+        assert mock_get_llm.return_value.call_count == 3
+        assert len(result["tasks"]) == 2
+        vendor = result["tasks"][0]
+        assert vendor["due_date"] == "2024-05-20"
+        assert vendor["owner"] == "Sam"
+
+
+class TestMeetingChain:
+    @patch('services.llm.get_llm')
+    def test_single_pass_summary_and_tasks(self, mock_get_llm):
+        """Test that one map call per chunk feeds both the summary and the tasks"""
+        map_llm = MagicMock(return_value="""
+        {"bullets": ["Budget approved"], "decisions": ["Ship in Q3"],
+         "tasks": [{"description": "Draft the plan", "owner": "Ana", "completed": false}]}
+        """)
+        reduce_llm = MagicMock(return_value="""
+        ## Summary
+        - Budget approved
+        
+        ## Decisions
+        - Ship in Q3
+        
+        ## Action Items
+        - Draft the plan
+        """)
+        mock_get_llm.side_effect = [map_llm, reduce_llm]
+        
+        meeting_chain = build_meeting_chain()
+        result = meeting_chain("Short meeting transcript")
+        
+        assert map_llm.call_count == 1
+        assert reduce_llm.call_count == 1
+        assert result["decisions"] == ["Ship in Q3"]
+        assert result["tasks"][0]["description"] == "Draft the plan"
+        assert result["tasks"][0]["owner"] == "Ana"
+    
+    @patch('services.llm.get_cache', return_value=None)
+    @patch('services.llm.embed_task_descriptions')
+    @patch('services.llm.get_chunker')
+    @patch('services.llm.get_llm')
+    def test_summary_reduce_and_task_merge_overlap(
+        self, mock_get_llm, mock_chunker, mock_embed, mock_cache
+    ):
+        """Test that the summary reduce call and the task embedding run at the same time"""
+        both_running = threading.Barrier(2, timeout=2)
+        mock_chunker.return_value.create_documents.return_value = [
+            Document(page_content="Part one"), Document(page_content="Part two")
+        ]
+        map_llm = MagicMock(side_effect=[
+            '{"bullets": ["A"], "decisions": [], "tasks": [{"description": "Draft the plan"}]}',
+            '{"bullets": ["B"], "decisions": [], "tasks": [{"description": "Book a room"}]}',
+        ])
+        
+        def reduce(*args, **kwargs):
+            both_running.wait()
+            return "## Summary\n- A"
+        
+        def embed(texts):
+            both_running.wait()
+            return [[1.0, 0.0], [0.0, 1.0]]
+        
+        reduce_llm = MagicMock(side_effect=reduce)
+        mock_embed.side_effect = embed
+        mock_get_llm.side_effect = [map_llm, reduce_llm]
+        
+        result = build_meeting_chain()("Long meeting transcript")
+        
+        descriptions = [task["description"] for task in result["tasks"]]
+        assert descriptions == ["Draft the plan", "Book a room"]
+        mock_embed.assert_called_once()
+    
+    def test_merge_tasks(self):
+        """Test that duplicates keep the earliest due date and the known owner"""
+        tasks = merge_tasks([
+            {"description": "Send the report.", "due_date": "2024-05-10", "owner": None},
+            {"description": "send the report", "due_date": "2024-05-03", "owner": "Li"},
+            {"description": "Book a room", "due_date": None, "owner": None},
+        ])
+        
+        assert len(tasks) == 2
+        assert tasks[0]["due_date"] == "2024-05-03"
+        assert tasks[0]["owner"] == "Li"
+
+
+class TestLLMCache:
+    @pytest.fixture
+    def cache(self, tmp_path):
+        """Isolated artifact cache backed by a temporary SQLite file"""
+        return ArtifactCache(str(tmp_path / "cache.sqlite3"), max_entries=2)
+    
+    @patch('services.llm.get_llm')
+    def test_repeated_extraction_served_from_cache(self, mock_get_llm, cache):
+        """Test that identical input hits the cache and a prompt version bump misses it"""
+        mock_get_llm.return_value = MagicMock(
+            return_value='{"tasks": [{"description": "Book the venue"}]}'
+        )
+        
+        with patch('services.llm.get_cache', return_value=cache):
+            first = build_task_chain()("Please book the venue")
+            second = build_task_chain()("Please book the venue")
+            with patch('services.llm.PROMPT_VERSION', "2"):
+                build_task_chain()("Please book the venue")
+        
+        assert first == second
+        assert mock_get_llm.return_value.call_count == 2
+    
+    def test_eviction_keeps_most_recently_used(self, cache):
+        """Test that eviction drops the least recently used entries first"""
+        for key in ["a", "b", "c"]:
+            cache.set("llm", key, key)
+        cache.get("llm", "a")
+        cache.evict()
+        
+        assert cache.get("llm", "b") is None
+        assert cache.get("llm", "a") == "a"
+        assert cache.get("llm", "c") == "c"
+
+
+class TestGraphExpansion:
+    @pytest.mark.asyncio
+    @patch('services.graph.get_links_for_notes', new_callable=AsyncMock)
+    async def test_two_hop_expansion(self, mock_get_links):
+        """Scores multiply along paths and expansion is capped"""
+        seed, hop1, hop2, other = (uuid.uuid4() for _ in range(4))
+        mock_get_links.side_effect = [
+            [(seed, hop1, 0.9), (other, seed, 0.8)],
+            [(hop1, hop2, 0.8), (hop1, seed, 0.9)],
+        ]
+        
+        neighbors = await expand_note_neighborhood(MagicMock(), [seed], hops=2, max_expansion=2)
+        
+        # One batched link query per hop
+        assert mock_get_links.await_count == 2
+        assert list(neighbors) == [hop1, other]
+        assert neighbors[hop1] == pytest.approx(0.9)
+        assert seed not in neighbors
@@ -0,0 +1,85 @@
+import uuid
+
+import numpy as np
+import pytest
+from unittest.mock import patch, MagicMock, AsyncMock
+
+from services.chunk_store import PostgresChunkStore, chunk_hash, encode_vector
+from services.embeddings import create_chunks_from_text
+
+
+class TestPostgresChunkStore:
+    @pytest.mark.asyncio
+    @patch('services.chunk_store.has_pgvector', new_callable=AsyncMock, return_value=False)
+    @patch('services.chunk_store.replace_note_chunks', new_callable=AsyncMock)
+    @patch('services.chunk_store.get_chunk_embeddings_by_hash', new_callable=AsyncMock)
+    async def test_add_documents_records_offsets_and_reuses_embeddings(
+        self, mock_known, mock_replace, mock_pgvector
+    ):
+        """Test that chunks keep their offsets and unchanged text is not re-embedded"""
+        note_id = uuid.uuid4()
+        text = "First paragraph. " * 80 + "\n\n" + "Second paragraph. " * 80
+        docs = create_chunks_from_text(text, str(note_id))
+        mock_known.return_value = {
+            chunk_hash(docs[0].page_content, "openai:small"): encode_vector([1.0, 0.0])
+        }
+        mock_replace.return_value = []
+        embedding = MagicMock()
+        embedding.aembed_documents = AsyncMock(side_effect=lambda texts: [[0.0, 1.0]] * len(texts))
+        
+        store = PostgresChunkStore(MagicMock(), embedding, model_id="openai:small")
+        await store.aadd_documents(docs)
+        
+        assert len(embedding.aembed_documents.call_args.args[0]) == len(docs) - 1
+        replaced_note, rows = mock_replace.call_args.args[1:]
+        assert replaced_note == note_id
+        assert [row["ordinal"] for row in rows] == list(range(len(docs)))
+        for row in rows:
+            assert text[row["start_char"]:row["end_char"]] == row["content"]
+        assert rows[0]["embedding"] == encode_vector([1.0, 0.0])
+    
+    @pytest.mark.asyncio
+    @patch('services.chunk_store.has_pgvector', new_callable=AsyncMock, return_value=False)
+    @patch('services.chunk_store.replace_note_chunks', new_callable=AsyncMock)
+    @patch('services.chunk_store.get_chunk_embeddings_by_hash', new_callable=AsyncMock)
+    async def test_embeddings_of_another_model_not_reused(
+        self, mock_known, mock_replace, mock_pgvector
+    ):
+        """Test that switching embedding models re-embeds text stored under the old model"""
+        docs = create_chunks_from_text("Short note", str(uuid.uuid4()))
+        mock_known.return_value = {}
+        mock_replace.return_value = []
+        embedding = MagicMock()
+        embedding.aembed_documents = AsyncMock(return_value=[[0.0, 1.0]])
+        
+        store = PostgresChunkStore(MagicMock(), embedding, model_id="local:minilm")
+        await store.aadd_documents(docs)
+        
+        requested = mock_known.await_args.args[1]
+        assert requested == [chunk_hash("Short note", "local:minilm")]
+        assert requested != [chunk_hash("Short note", "openai:small")]
+        embedding.aembed_documents.assert_awaited_once()
+    
+    @pytest.mark.asyncio
+    @patch('services.chunk_store.has_pgvector', new_callable=AsyncMock, return_value=False)
+    async def test_bytea_similarity_search(self, mock_pgvector):
+        """Test that the bytea fallback ranks chunks by cosine similarity"""
+        note_a, note_b = uuid.uuid4(), uuid.uuid4()
+        rows = [
+            MagicMock(id=uuid.uuid4(), note_id=note_a, ordinal=0, start_char=0, end_char=5,
+                      content="alpha", embedding=encode_vector([1.0, 0.0])),
+            MagicMock(id=uuid.uuid4(), note_id=note_b, ordinal=0, start_char=0, end_char=4,
+                      content="beta", embedding=encode_vector([0.0, 1.0])),
+        ]
+        session = MagicMock()
+        session.execute = AsyncMock(return_value=MagicMock(all=MagicMock(return_value=rows)))
+        embedding = MagicMock()
+        embedding.aembed_query = AsyncMock(return_value=[0.9, 0.1])
+        
+        store = PostgresChunkStore(session, embedding)
+        results = await store.asimilarity_search_with_score("query", k=1)
+        
+        doc, score = results[0]
+        assert doc.metadata["note_id"] == str(note_a)
+        assert doc.page_content == "alpha"
+        assert score == pytest.approx(0.9 / np.hypot(0.9, 0.1))
@@ -0,0 +1,60 @@
+from services.chunking import MarkdownTokenChunker, count_tokens, parse_blocks
+
+
+MEETING_NOTES = """# Weekly sync
+
+## Attendees
+- Ana
+- Sam
+  (remote)
+
+## Discussion
+""" + "We reviewed the budget in detail. " * 40 + """
+
+## Action Items
+1. Draft the plan
+2. Email the vendor
+"""
+
+
+class TestMarkdownTokenChunker:
+    def test_blocks_follow_markdown_structure(self):
+        """Test that lists, headings and paragraphs are parsed as whole blocks"""
+        blocks = parse_blocks(MEETING_NOTES)
+        
+        assert [block.kind for block in blocks] == [
+            "heading", "heading", "list", "heading", "paragraph", "heading", "list"
+        ]
+        attendees = blocks[2]
+        assert MEETING_NOTES[attendees.start:attendees.end] == "- Ana\n- Sam\n  (remote)"
+        assert attendees.section == "Weekly sync > Attendees"
+    
+    def test_chunks_are_exact_slices_within_token_budget(self):
+        """Test that chunks map back to the text and oversized paragraphs split at sentences"""
+        chunker = MarkdownTokenChunker(max_tokens=80, overlap_tokens=0)
+        docs = chunker.create_documents([MEETING_NOTES], [{"note_id": "n1"}])
+        
+        assert len(docs) > 3
+        for doc in docs:
+            start = doc.metadata["start_index"]
+            assert MEETING_NOTES[start:start + len(doc.page_content)] == doc.page_content
+            assert count_tokens(doc.page_content) <= 80
+            assert doc.metadata["note_id"] == "n1"
+        
+        # Paragraph pieces end at sentences; the action items stay together under their heading
+        assert all(doc.page_content.endswith(".") for doc in docs[2:-1])
+        assert docs[-1].page_content.endswith(
+            "## Action Items\n1. Draft the plan\n2. Email the vendor"
+        )
+    
+    def test_small_sections_share_a_chunk(self):
+        """Test that short sections are packed together instead of one chunk each"""
+        text = "## One\nShort.\n\n## Two\nAlso short.\n\n## Three\nStill short."
+        
+        assert MarkdownTokenChunker(max_tokens=200).split_text(text) == [text]
+    
+    def test_results_are_cached(self):
+        """Test that chunking the same text again reuses the cached spans"""
+        chunker = MarkdownTokenChunker(max_tokens=64)
+        
+        assert chunker.spans(MEETING_NOTES) is chunker.spans(MEETING_NOTES)
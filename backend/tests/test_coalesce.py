@@ -0,0 +1,85 @@
+import time
+import asyncio
+import threading
+
+import pytest
+from unittest.mock import MagicMock
+
+from services.coalesce import SingleFlight, CoalescingEmbeddings, normalize_query
+
+
+class TestSingleFlight:
+    @pytest.mark.asyncio
+    async def test_concurrent_callers_share_one_run(self):
+        """Test that identical in-flight work runs once and distinct keys run separately"""
+        flight = SingleFlight("test")
+        calls = []
+        
+        async def work(value):
+            calls.append(value)
+            await asyncio.sleep(0.01)
+            return value * 2
+        
+        results = await asyncio.gather(
+            flight.do("a", lambda: work(1)),
+            flight.do("a", lambda: work(1)),
+            flight.do("b", lambda: work(2)),
+        )
+        
+        assert results == [2, 2, 4]
+        assert calls == [1, 2]
+        assert flight.coalesced == 1
+        
+        # Finished work is not cached
+        assert await flight.do("a", lambda: work(1)) == 2
+        assert calls == [1, 2, 1]
+    
+    @pytest.mark.asyncio
+    async def test_errors_reach_every_waiter(self):
+        """Test that a failure is raised to all coalesced callers"""
+        flight = SingleFlight("test")
+        
+        async def fail():
+            await asyncio.sleep(0.01)
+            raise RuntimeError("upstream failed")
+        
+        results = await asyncio.gather(
+            flight.do("a", fail), flight.do("a", fail), return_exceptions=True
+        )
+        
+        assert all(isinstance(r, RuntimeError) for r in results)
+    
+    def test_normalize_query(self):
+        """Test that case, spacing and trailing punctuation are ignored"""
+        expected = normalize_query("what was decided about q3")
+        assert normalize_query("  What was decided   about Q3? ") == expected
+
+
+class TestCoalescingEmbeddings:
+    def test_concurrent_batches_embed_each_text_once(self):
+        """Test that overlapping concurrent batches send each text upstream once"""
+        upstream = MagicMock()
+        
+        def embed(texts):
+            time.sleep(0.05)
+            return [[float(len(text))] for text in texts]
+        
+        upstream.embed_documents.side_effect = embed
+        embeddings = CoalescingEmbeddings(upstream)
+        
+        results = {}
+        threads = [
+            threading.Thread(
+                target=lambda i=i, b=batch: results.update({i: embeddings.embed_documents(b)})
+            )
+            for i, batch in enumerate([["a", "bb", "a"], ["bb", "ccc"]])
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        
+        sent = [text for call in upstream.embed_documents.call_args_list for text in call.args[0]]
+        assert sorted(sent) == ["a", "bb", "ccc"]
+        assert results[0] == [[1.0], [2.0], [1.0]]
+        assert results[1] == [[2.0], [3.0]]
@@ -0,0 +1,61 @@
+import threading
+
+import numpy as np
+from unittest.mock import patch, MagicMock
+
+from services.embeddings import get_embedding_backend, get_embeddings_model
+from services.local_embeddings import DynamicBatcher, LocalEmbeddings
+
+
+def fake_encode(texts):
+    """Deterministic stand-in for the ONNX encoder"""
+    return np.array([[float(len(text)), 1.0] for text in texts], dtype=np.float32)
+
+
+class TestDynamicBatcher:
+    def test_concurrent_requests_share_batches(self):
+        """Test that concurrent requests are merged and results routed back in order"""
+        encode = MagicMock(side_effect=fake_encode)
+        batcher = DynamicBatcher(encode, max_batch_size=64, max_wait_ms=50, workers=1)
+        embeddings = LocalEmbeddings(batcher)
+        
+        results = {}
+        threads = [
+            threading.Thread(
+                target=lambda i=i: results.update({i: embeddings.embed_documents(["x" * i, "y"])})
+            )
+            for i in range(1, 9)
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        
+        assert encode.call_count < 8
+        for i in range(1, 9):
+            assert results[i] == [[float(i), 1.0], [1.0, 1.0]]
+    
+    def test_oversized_request_is_split(self):
+        """Test that a request above max_batch_size runs as several model calls"""
+        encode = MagicMock(side_effect=fake_encode)
+        batcher = DynamicBatcher(encode, max_batch_size=4, max_wait_ms=1, workers=1)
+        
+        vectors = LocalEmbeddings(batcher).embed_documents(["a"] * 10)
+        
+        assert len(vectors) == 10
+        assert [len(call.args[0]) for call in encode.call_args_list] == [4, 4, 2]
+
+
+class TestEmbeddingBackend:
+    @patch('services.embeddings.EMBEDDING_BACKENDS', {"offline-notes": "local"})
+    def test_backend_per_index(self):
+        """Test that per-index overrides win over the default backend"""
+        assert get_embedding_backend("offline-notes") == "local"
+        assert get_embedding_backend("other") == "openai"
+    
+    @patch('services.embeddings.get_local_embeddings')
+    def test_local_backend(self, mock_local):
+        """Test that the local backend wraps the shared ONNX embeddings"""
+        mock_local.return_value.embed_query.return_value = [0.5, 0.5]
+        
+        assert get_embeddings_model("local").embed_query("offline query") == [0.5, 0.5]
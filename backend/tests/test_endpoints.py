@@ -1,10 +1,14 @@
 import pytest
 from fastapi.testclient import TestClient
 import uuid
-from unittest.mock import patch, MagicMock
+from unittest.mock import patch, MagicMock, AsyncMock
+
+from langchain_core.documents import Document
 
 from main import app
 from services.database import get_session
+from services.cache import ArtifactCache
+from services.speech import transcribe_audio
 
 
 # Create test client
@@ -133,17 +137,23 @@ class TestTasksEndpoint:
 
 
 class TestSearchEndpoint:
+    @patch('routers.search.get_note_titles', new_callable=AsyncMock)
     @patch('routers.search.make_retriever')
     @patch('routers.search.build_qa_chain')
-    def test_search_success(self, mock_build_qa, mock_make_retriever, mock_db_session):
+    def test_search_success(self, mock_build_qa, mock_make_retriever, mock_titles, mock_db_session):
         """Test successful search"""
         # Set up mocks
         mock_retriever = MagicMock()
         mock_make_retriever.return_value = mock_retriever
         
+        note_id = str(uuid.uuid4())
         mock_qa_chain = MagicMock()
-        mock_qa_chain.return_value = "Answer with citation [note_id:123e4567-e89b-12d3-a456-426614174000]"
+        mock_qa_chain.return_value = (
+            f"Answer with citation [note_id:{note_id}]",
+            [Document(page_content="Source text", metadata={"note_id": note_id, "start_index": 0})]
+        )
         mock_build_qa.return_value = mock_qa_chain
+        mock_titles.return_value = {uuid.UUID(note_id): "Source note"}
         
         # Make request
         response = client.post(
@@ -157,6 +167,65 @@ class TestSearchEndpoint:
         assert "answer" in data
         assert "citations" in data
         assert len(data["citations"]) == 1
+        assert data["citations"][0]["title"] == "Source note"
+        assert data["citations"][0]["snippet"] == "Source text"
+    
+    @patch('routers.search.get_note_titles', new_callable=AsyncMock)
+    @patch('routers.search.make_retriever')
+    @patch('routers.search.build_qa_chain')
+    def test_search_citations_resolved_against_sources(
+        self, mock_build_qa, mock_make_retriever, mock_titles
+    ):
+        """Test that citations are de-duplicated and limited to retrieved notes"""
+        retrieved, invented = uuid.uuid4(), uuid.uuid4()
+        chunk_id = uuid.uuid4()
+        mock_qa_chain = MagicMock()
+        mock_qa_chain.return_value = (
+            f"First [note_id:{retrieved}], again [note_id:{retrieved}], "
+            f"made up [note_id:{invented}]",
+            [
+                Document(page_content="Best chunk", metadata={
+                    "note_id": str(retrieved),
+                    "chunk_id": str(chunk_id),
+                    "start_char": 40,
+                    "end_char": 50
+                }),
+                Document(page_content="Second chunk", metadata={"note_id": str(retrieved)}),
+            ]
+        )
+        mock_build_qa.return_value = mock_qa_chain
+        mock_titles.return_value = {retrieved: "Retrieved note"}
+        
+        response = client.post("/search/query", json={"query": "Another query"})
+        
+        assert response.status_code == 200
+        citations = response.json()["citations"]
+        assert len(citations) == 1
+        assert citations[0]["note_id"] == str(retrieved)
+        assert citations[0]["chunk_id"] == str(chunk_id)
+        assert (citations[0]["start_char"], citations[0]["end_char"]) == (40, 50)
+        assert citations[0]["snippet"] == "Best chunk"
+        
+        # Titles are fetched once, for cited notes only
+        mock_titles.assert_awaited_once()
+        assert mock_titles.await_args.args[1] == [retrieved]
+    
+    @patch('routers.search.get_note_titles', new_callable=AsyncMock)
+    @patch('routers.search.answer_query', new_callable=AsyncMock)
+    def test_shared_answer_uses_own_session(self, mock_answer, mock_titles, mock_db_session):
+        """Test that the coalesced answer does not run on the first caller's request session"""
+        own_session = MagicMock()
+        session_factory = MagicMock()
+        session_factory.return_value.__aenter__ = AsyncMock(return_value=own_session)
+        session_factory.return_value.__aexit__ = AsyncMock(return_value=False)
+        mock_answer.return_value = ("No citations", [])
+        
+        with patch('routers.search.async_session', session_factory):
+            response = client.post("/search/query", json={"query": "Session query"})
+        
+        assert response.status_code == 200
+        assert mock_answer.await_args.args[2] is own_session
+        assert mock_answer.await_args.args[2] is not mock_db_session
 
 
 class TestNotesEndpoint:
@@ -181,3 +250,172 @@ class TestNotesEndpoint:
         data = response.json()
         assert len(data) == 1
         assert data[0]["title"] == "Test Note"
+    
+    @patch('routers.notes.compact_vectors')
+    @patch('routers.notes.remove_note_vectors', new_callable=AsyncMock)
+    @patch('routers.notes.delete_note', new_callable=AsyncMock)
+    def test_delete_note_removes_vectors(
+        self, mock_delete, mock_remove, mock_compact, mock_db_session
+    ):
+        """Test that deleting a note removes its vectors once committed and schedules compaction"""
+        note_id = uuid.uuid4()
+        mock_delete.return_value = True
+        order = []
+        mock_db_session.commit = AsyncMock(side_effect=lambda: order.append("commit"))
+        mock_remove.side_effect = lambda *args, **kwargs: order.append("vectors")
+        
+        response = client.delete(f"/notes/{note_id}")
+        
+        assert response.status_code == 204
+        assert mock_remove.await_args.args[0] == [note_id]
+        assert order == ["commit", "vectors"]
+        mock_compact.assert_called_once()
+    
+    @patch('routers.notes.remove_note_vectors', new_callable=AsyncMock)
+    @patch('routers.notes.delete_note', new_callable=AsyncMock)
+    def test_failed_delete_keeps_vectors(self, mock_delete, mock_remove, mock_db_session):
+        """Test that a delete whose commit fails leaves the note's vectors in place"""
+        mock_delete.return_value = True
+        mock_db_session.commit = AsyncMock(side_effect=RuntimeError("connection lost"))
+        mock_db_session.rollback = AsyncMock()
+        
+        response = client.delete(f"/notes/{uuid.uuid4()}")
+        
+        assert response.status_code == 500
+        mock_remove.assert_not_awaited()
+        mock_db_session.rollback.assert_awaited_once()
+    
+    @patch('routers.notes.remove_note_vectors', new_callable=AsyncMock)
+    @patch('routers.notes.delete_note', new_callable=AsyncMock)
+    def test_delete_missing_note(self, mock_delete, mock_remove):
+        """Test deleting a note that is not in the request's scope"""
+        mock_delete.return_value = False
+        
+        response = client.delete(f"/notes/{uuid.uuid4()}")
+        
+        assert response.status_code == 404
+        mock_remove.assert_not_awaited()
+
+
+class TestTranscribeEndpoint:
+    @patch('services.speech.get_cache', return_value=None)
+    @patch('routers.transcribe.build_task_chain')
+    @patch('routers.transcribe.build_summarization_chain')
+    @patch('routers.transcribe.transcribe_file_async')
+    def test_transcribe_pipes_into_summary_and_tasks(
+        self, mock_transcribe, mock_build_summary, mock_build_tasks, mock_get_cache, mock_db_session
+    ):
+        """Test that the transcript is summarized and mined for tasks"""
+        # Set up mocks
+        mock_transcribe.return_value = {"transcript": "We agreed to ship on Friday.", "segments": 2}
+        mock_build_summary.return_value = MagicMock(return_value={
+            "summary": "Ship on Friday",
+            "highlights": ["Ship on Friday"],
+            "decisions": ["Ship"],
+            "action_items": []
+        })
+        mock_build_tasks.return_value = MagicMock(return_value={
+            "tasks": [{"description": "Ship release", "completed": False}]
+        })
+        
+        # Make request with a raw audio body
+        response = client.post(
+            "/transcribe?filename=meeting.mp3",
+            content=b"fake-audio-bytes",
+            headers={"Content-Type": "audio/mpeg"}
+        )
+        
+        # Check response
+        assert response.status_code == 200
+        data = response.json()
+        assert data["transcript"] == "We agreed to ship on Friday."
+        assert data["segments"] == 2
+        assert data["summary"]["summary"] == "Ship on Friday"
+        assert len(data["tasks"]) == 1
+    
+    @patch('routers.transcribe.build_task_chain')
+    @patch('routers.transcribe.build_summarization_chain')
+    @patch('routers.transcribe.transcribe_file_async')
+    def test_transcribe_repeat_upload_hits_cache(
+        self, mock_transcribe, mock_build_summary, mock_build_tasks, tmp_path
+    ):
+        """Test that a repeat upload reuses the transcript (the chains cache their own LLM calls)"""
+        mock_transcribe.return_value = {
+            "transcript": "Cached meeting", "segments": 1, "backend": "api"
+        }
+        mock_build_summary.return_value = MagicMock(return_value={
+            "summary": "S", "highlights": [], "decisions": [], "action_items": []
+        })
+        mock_build_tasks.return_value = MagicMock(return_value={"tasks": []})
+        
+        cache = ArtifactCache(str(tmp_path / "cache.sqlite3"))
+        with patch('services.speech.get_cache', return_value=cache), \
+                patch('services.speech.WHISPER_BACKEND', "api"), \
+                patch('services.speech.WHISPER_USE_API', True), \
+                patch('services.speech.OPENAI_API_KEY', "sk-test"):
+            first = client.post("/transcribe", content=b"same-audio")
+            second = client.post("/transcribe", content=b"same-audio")
+        
+        assert first.status_code == 200 and second.status_code == 200
+        assert first.json()["cached"] is False
+        assert second.json()["cached"] is True
+        assert second.json()["segments"] == 1
+        assert mock_transcribe.call_count == 1
+    
+    @patch('services.speech._transcribe_audio_uncached', return_value="Shared transcript")
+    @patch('routers.transcribe.transcribe_file_async')
+    def test_transcript_cached_by_service_served_to_upload(
+        self, mock_transcribe, mock_uncached, tmp_path
+    ):
+        """Test that a transcript cached by transcribe_audio has the shape /transcribe reads"""
+        cache = ArtifactCache(str(tmp_path / "cache.sqlite3"))
+        with patch('services.speech.get_cache', return_value=cache), \
+                patch('services.speech.WHISPER_BACKEND', "api"), \
+                patch('services.speech.WHISPER_USE_API', True), \
+                patch('services.speech.OPENAI_API_KEY', "sk-test"):
+            transcribe_audio(b"same bytes")
+            response = client.post(
+                "/transcribe?summarize=false&extract_tasks=false", content=b"same bytes"
+            )
+        
+        assert response.status_code == 200
+        assert response.json()["transcript"] == "Shared transcript"
+        assert response.json()["segments"] == 1
+        assert response.json()["cached"] is True
+        mock_transcribe.assert_not_called()
+    
+    def test_transcribe_empty_body(self):
+        """Test transcription with an empty upload"""
+        response = client.post("/transcribe", content=b"")
+        assert response.status_code == 400
+
+
+class TestMeetingsEndpoint:
+    @patch('routers.meetings.uses_chunk_store', return_value=False)
+    @patch('routers.meetings.remove_note_vectors', new_callable=AsyncMock)
+    @patch('routers.meetings.process_and_index_note', new_callable=AsyncMock)
+    @patch('routers.meetings.stage_note_with_tasks', new_callable=AsyncMock)
+    @patch('routers.meetings.build_meeting_chain')
+    def test_failed_commit_removes_vectors(
+        self,
+        mock_build_chain,
+        mock_stage,
+        mock_index,
+        mock_remove,
+        mock_uses_chunk_store,
+        mock_db_session
+    ):
+        """Test that the note's vectors are indexed in its transaction and removed on rollback"""
+        mock_build_chain.return_value = MagicMock(return_value={"summary": "S", "tasks": []})
+        mock_stage.return_value = MagicMock(id=uuid.uuid4())
+        mock_db_session.commit = AsyncMock(side_effect=RuntimeError("connection lost"))
+        mock_db_session.rollback = AsyncMock()
+        
+        response = client.post(
+            "/meetings/process", json={"title": "Standup", "text": "We ship on Friday."}
+        )
+        
+        assert response.status_code == 500
+        assert mock_index.await_args.kwargs["session"] is mock_db_session
+        mock_db_session.rollback.assert_awaited_once()
+        assert mock_remove.await_args.args[0] == [mock_stage.return_value.id]
@@ -0,0 +1,115 @@
+import uuid
+
+import numpy as np
+import pytest
+
+from services.graph import top_k_neighbors, prune_pairs
+from services.graph_analytics import (
+    build_csr_graph,
+    pagerank,
+    connected_components,
+    detect_communities,
+)
+
+
+@pytest.fixture
+def two_cluster_graph():
+    """Two triangles joined by one weak edge, plus an orphan note"""
+    ids = [uuid.uuid4() for _ in range(7)]
+    edges = [
+        (0, 1, 0.9), (1, 2, 0.9), (0, 2, 0.9),
+        (3, 4, 0.9), (4, 5, 0.9), (3, 5, 0.9),
+        (2, 3, 0.1),
+    ]
+    return build_csr_graph(
+        ids,
+        [ids[s] for s, _, _ in edges],
+        [ids[t] for _, t, _ in edges],
+        [w for _, _, w in edges],
+    )
+
+
+class TestCSRGraph:
+    def test_symmetric_and_deduplicated(self):
+        """Both link directions are stored once, keeping the max weight"""
+        a, b = uuid.uuid4(), uuid.uuid4()
+        graph = build_csr_graph([a, b], [a, b, a], [b, a, a], [0.5, 0.8, 1.0])
+        
+        assert graph.num_edges == 1
+        assert list(graph.degree) == [1, 1]
+        assert list(graph.weights) == [0.8, 0.8]
+
+
+class TestGraphAnalytics:
+    def test_pagerank(self, two_cluster_graph):
+        """Scores sum to one and bridge nodes outrank the orphan"""
+        result = pagerank(two_cluster_graph)
+        scores = result["scores"]
+        
+        assert scores.sum() == pytest.approx(1.0)
+        assert scores[2] > scores[6]
+        assert scores[3] > scores[6]
+    
+    def test_pagerank_warm_start(self, two_cluster_graph):
+        """Warm-starting from a converged vector needs fewer iterations"""
+        cold = pagerank(two_cluster_graph)
+        warm = pagerank(two_cluster_graph, initial=cold["scores"])
+        
+        assert warm["iterations"] < cold["iterations"]
+        assert np.allclose(warm["scores"], cold["scores"], atol=1e-5)
+    
+    def test_connected_components(self, two_cluster_graph):
+        """Linked triangles form one component and the orphan its own"""
+        labels = connected_components(two_cluster_graph)
+        
+        assert len(set(labels[:6])) == 1
+        assert labels[6] != labels[0]
+    
+    def test_detect_communities(self, two_cluster_graph):
+        """The weak bridge does not merge the two triangles"""
+        labels = detect_communities(two_cluster_graph)["labels"]
+        
+        assert labels[0] == labels[1] == labels[2]
+        assert labels[3] == labels[4] == labels[5]
+        assert labels[0] != labels[3]
+
+
+class TestBatchLinking:
+    def test_top_k_neighbors_matches_brute_force(self):
+        """Blocked top-k equals a full similarity matrix scan"""
+        vectors = np.random.default_rng(0).standard_normal((50, 8))
+        
+        triples = top_k_neighbors(vectors, k=3, similarity_threshold=-1.0, block_size=7)
+        
+        normed = vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+        sims = normed @ normed.T
+        np.fill_diagonal(sims, -np.inf)
+        expected = {(i, int(j)) for i in range(50) for j in np.argsort(-sims[i])[:3]}
+        assert {(s, t) for s, t, _ in triples} == expected
+    
+    def test_top_k_neighbors_threshold(self):
+        """Pairs below the similarity threshold are dropped"""
+        vectors = np.array([[1.0, 0.0], [0.99, 0.1], [0.0, 1.0]])
+        
+        triples = top_k_neighbors(vectors, k=2, similarity_threshold=0.9)
+        
+        assert {(s, t) for s, t, _ in triples} == {(0, 1), (1, 0)}
+    
+    def test_prune_pairs(self):
+        """Mirrored pairs collapse to one and the per-note cap holds"""
+        triples = [(0, 1, 0.9), (1, 0, 0.9), (0, 2, 0.8), (0, 3, 0.7), (2, 3, 0.6)]
+        
+        kept = prune_pairs(triples, max_links_per_note=2)
+        
+        assert kept == [(0, 1, 0.9), (0, 2, 0.8), (2, 3, 0.6)]
+    
+    def test_warm_start_splits_disconnected_community(self):
+        """A stored community whose notes are no longer linked is split by component"""
+        ids = [uuid.uuid4() for _ in range(4)]
+        graph = build_csr_graph(ids, [ids[0], ids[2]], [ids[1], ids[3]], [0.9, 0.9])
+        
+        components = connected_components(graph)
+        labels = detect_communities(graph, initial=np.zeros(4, dtype=np.int64))["labels"]
+        
+        assert list(components) == [0, 0, 1, 1]
+        assert list(labels) == [0, 0, 1, 1]
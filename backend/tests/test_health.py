@@ -0,0 +1,86 @@
+import pytest
+from fastapi.testclient import TestClient
+from unittest.mock import patch, MagicMock, AsyncMock
+
+from main import app
+from services import health
+
+
+client = TestClient(app)
+
+
+@pytest.fixture(autouse=True)
+def fresh_probes():
+    """Give each check a fake session and start with an empty probe cache"""
+    session = MagicMock()
+    session.execute = AsyncMock()
+    session_factory = MagicMock()
+    session_factory.return_value.__aenter__ = AsyncMock(return_value=session)
+    session_factory.return_value.__aexit__ = AsyncMock(return_value=False)
+    health.clear_cache()
+    with patch('services.health.async_session', session_factory):
+        yield session
+    health.clear_cache()
+
+
+class TestHealthProbes:
+    def test_liveness(self):
+        """Test that liveness does not touch dependencies"""
+        response = client.get("/health/live")
+        
+        assert response.status_code == 200
+        assert response.json() == {"status": "ok"}
+    
+    @patch('services.health.VECTOR_STORE', 'auto')
+    def test_ready_reports_latency_per_check(self, fresh_probes):
+        """Test that readiness pings the database and reports each check"""
+        response = client.get("/health/ready")
+        
+        assert response.status_code == 200
+        data = response.json()
+        assert data["ready"] is True
+        assert set(data["checks"]) == {"database", "vector_index"}
+        assert data["checks"]["database"]["latency_ms"] >= 0
+        assert data["checks"]["vector_index"]["data"]["backend"] == "local"
+        fresh_probes.execute.assert_awaited_once()
+    
+    def test_not_ready_when_database_fails_and_failure_is_cached(self, fresh_probes):
+        """Test that a failing critical check returns 503 and is not re-run within the TTL"""
+        fresh_probes.execute.side_effect = ConnectionError("connection refused")
+        
+        first = client.get("/health/ready")
+        second = client.get("/health/ready")
+        
+        assert first.status_code == 503
+        assert first.json()["checks"]["database"]["status"] == "fail"
+        assert "connection refused" in first.json()["checks"]["database"]["detail"]
+        assert second.status_code == 503
+        assert second.json()["checks"]["database"]["cached"] is True
+        assert fresh_probes.execute.await_count == 1
+    
+    @patch('services.health.VECTOR_STORE', 'auto')
+    @patch('services.health.OPENAI_API_KEY', None)
+    def test_deep_probe_llm_is_not_critical(self):
+        """Test that a missing LLM key degrades status without failing readiness"""
+        response = client.get("/health/ready", params={"deep": True})
+        
+        assert response.status_code == 200
+        data = response.json()
+        assert data["status"] == "degraded"
+        assert data["checks"]["llm"]["status"] == "degraded"
+        assert data["checks"]["llm"]["critical"] is False
+    
+    @patch('services.health.VECTOR_STORE', 'segments')
+    @patch('services.health.get_segment_index')
+    def test_segments_report_published_version(self, mock_index):
+        """Test that the segment store reports the manifest version its workers serve"""
+        mock_index.return_value.stats.return_value = {
+            "version": 3, "segments": 2, "vectors": 40, "superseded": 0
+        }
+        
+        response = client.get("/health/ready")
+        
+        assert response.status_code == 200
+        data = response.json()["checks"]["vector_index"]["data"]
+        assert data["backend"] == "segments"
+        assert data["version"] == 3
@@ -0,0 +1,138 @@
+import time
+import asyncio
+
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from unittest.mock import patch
+
+from langchain_core.documents import Document
+from langchain_core.retrievers import BaseRetriever
+
+from main import app
+from services.profiling import ProfileStore, ProfilingMiddleware
+from services.tracing import span
+
+
+class SlowRetriever(BaseRetriever):
+    """Retriever that takes a while, like a remote vector search"""
+    
+    def _get_relevant_documents(self, query, *, run_manager):
+        time.sleep(0.02)
+        return [Document(page_content=query)]
+
+
+def embed_in_thread():
+    with span("embed.documents", stage="embedding"):
+        time.sleep(0.01)
+
+
+def make_app(store, sample_rate=0.0):
+    """Small app with one profiled path that runs every kind of stage"""
+    profiled = FastAPI()
+    
+    @profiled.get("/search/query")
+    async def search_query():
+        with span("ingest.chunk", stage="chunking"):
+            time.sleep(0.01)
+        await asyncio.to_thread(embed_in_thread)
+        docs = await SlowRetriever().ainvoke("query")
+        busy_until = time.perf_counter() + 0.05
+        while time.perf_counter() < busy_until:
+            pass
+        return {"results": len(docs)}
+    
+    profiled.add_middleware(
+        ProfilingMiddleware, sample_rate=sample_rate, paths=["/search/query"], store=store
+    )
+    return profiled
+
+
+class TestProfilingMiddleware:
+    @patch('services.profiling.PROFILE_ADMIN_TOKEN', 'secret')
+    def test_header_triggers_profile(self, tmp_path):
+        """Test that the admin header profiles a request and stores its stages and samples"""
+        store = ProfileStore(str(tmp_path))
+        client = TestClient(make_app(store))
+        
+        response = client.get("/search/query", headers={"X-Profile-Token": "secret"})
+        
+        assert response.status_code == 200
+        report = store.get(response.headers["x-profile-id"])
+        assert report["trigger"] == "header"
+        assert report["status"] == 200
+        assert report["stages"]["chunking"]["count"] == 1
+        assert report["stages"]["embedding"]["count"] == 1
+        assert report["stages"]["vector_search"]["total_ms"] >= 20
+        assert report["samples"] > 0
+        assert any("search_query" in stack for stack in report["stacks"])
+    
+    @patch('services.profiling.PROFILE_ADMIN_TOKEN', 'secret')
+    def test_unprofiled_requests_pass_through(self, tmp_path):
+        """Test that requests without a valid token are not profiled when sampling is off"""
+        store = ProfileStore(str(tmp_path))
+        client = TestClient(make_app(store))
+        
+        response = client.get("/search/query", headers={"X-Profile-Token": "wrong"})
+        
+        assert response.status_code == 200
+        assert "x-profile-id" not in response.headers
+        assert store.list() == []
+    
+    @patch('services.profiling.PROFILE_ADMIN_TOKEN', 'secret')
+    def test_non_ascii_token_not_profiled(self, tmp_path):
+        """Test that a non-ASCII token header is served unprofiled instead of failing"""
+        store = ProfileStore(str(tmp_path))
+        client = TestClient(make_app(store))
+        
+        headers = {"X-Profile-Token": "caf\xe9".encode("latin-1")}
+        response = client.get("/search/query", headers=headers)
+        
+        assert response.status_code == 200
+        assert "x-profile-id" not in response.headers
+        assert TestClient(app).get("/admin/profiles", headers=headers).status_code == 403
+    
+    def test_sample_rate(self, tmp_path):
+        """Test that a sampling fraction profiles requests without any header"""
+        store = ProfileStore(str(tmp_path))
+        client = TestClient(make_app(store, sample_rate=1.0))
+        
+        response = client.get("/search/query")
+        
+        assert store.list()[0]["id"] == response.headers["x-profile-id"]
+        assert store.list()[0]["trigger"] == "sample"
+    
+    def test_store_keeps_newest(self, tmp_path):
+        """Test that the store prunes the oldest profiles"""
+        store = ProfileStore(str(tmp_path), max_records=2)
+        for profile_id in ["a1", "b2", "c3"]:
+            store.save({"id": profile_id, "method": "GET", "path": "/", "status": 200,
+                        "trigger": "sample", "started_at": "", "duration_ms": 1.0})
+        
+        assert [summary["id"] for summary in store.list()] == ["c3", "b2"]
+        assert store.get("a1") is None
+
+
+class TestProfilesEndpoint:
+    @patch('services.profiling.PROFILE_ADMIN_TOKEN', 'secret')
+    def test_requires_token(self, tmp_path):
+        """Test that stored profiles are only readable with the admin token"""
+        client = TestClient(app)
+        store = ProfileStore(str(tmp_path))
+        store.save({"id": "abc123", "method": "GET", "path": "/search/query", "status": 200,
+                    "trigger": "header", "started_at": "", "duration_ms": 1.0,
+                    "stacks": {"MainThread;main:run": 3}})
+        
+        with patch('routers.profiles.get_profile_store', return_value=store):
+            assert client.get("/admin/profiles").status_code == 403
+            listed = client.get("/admin/profiles", headers={"X-Profile-Token": "secret"})
+            collapsed = client.get(
+                "/admin/profiles/abc123?format=collapsed", headers={"X-Profile-Token": "secret"}
+            )
+        
+        assert listed.json()[0]["id"] == "abc123"
+        assert collapsed.text == "MainThread;main:run 3\n"
+    
+    def test_disabled_without_token(self):
+        """Test that the admin endpoint does not exist unless a token is configured"""
+        with patch('services.profiling.PROFILE_ADMIN_TOKEN', None):
+            assert TestClient(app).get("/admin/profiles").status_code == 404
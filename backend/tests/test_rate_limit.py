@@ -0,0 +1,127 @@
+import fcntl
+import asyncio
+
+import httpx
+import openai
+import pytest
+from unittest.mock import patch, MagicMock
+
+from services.rate_limit import (
+    BULK,
+    INTERACTIVE,
+    RateLimiter,
+    rate_limited,
+)
+
+
+def rate_limit_error(body=None):
+    """A 429 error as raised by the OpenAI client"""
+    request = httpx.Request("POST", "https://api.openai.com/v1/chat/completions")
+    response = httpx.Response(429, request=request)
+    return openai.RateLimitError("Rate limit reached", response=response, body=body)
+
+
+class TestRateLimiter:
+    def test_bulk_cannot_spend_interactive_reserve(self):
+        """Test that bulk calls stop at the reserve while interactive calls continue"""
+        limiter = RateLimiter(rpm=10, tpm=10_000, max_concurrency=10, interactive_reserve=0.2)
+        
+        for _ in range(8):
+            assert limiter._try_acquire(tokens=1, requests=1, lane=BULK) == 0
+            limiter.release()
+        
+        assert limiter._try_acquire(tokens=1, requests=1, lane=BULK) > 0
+        assert limiter._try_acquire(tokens=1, requests=1, lane=INTERACTIVE) == 0
+    
+    def test_bulk_waits_for_queued_interactive(self):
+        """Test that bulk calls yield while an interactive call is queued"""
+        limiter = RateLimiter(rpm=100, tpm=10_000, max_concurrency=10)
+        limiter.interactive_waiting = 1
+        
+        assert limiter._try_acquire(tokens=1, requests=1, lane=BULK) > 0
+    
+    @patch('services.rate_limit.time.sleep')
+    def test_retries_429_and_halves_concurrency(self, mock_sleep):
+        """Test that a 429 is retried with backoff and shrinks the concurrency limit"""
+        limiter = RateLimiter(rpm=100, tpm=10_000, max_concurrency=8)
+        fn = MagicMock(side_effect=[rate_limit_error(), "ok"])
+        
+        assert limiter.call(fn, tokens=10) == "ok"
+        assert fn.call_count == 2
+        assert mock_sleep.call_count == 1
+        assert 4 <= limiter.concurrency.limit < 5
+        assert limiter.in_flight == 0
+    
+    @patch('services.rate_limit.time.sleep')
+    def test_gives_up_after_max_retries(self, mock_sleep):
+        """Test that the last 429 is raised once retries are exhausted"""
+        limiter = RateLimiter(rpm=100, tpm=10_000, max_retries=2)
+        fn = MagicMock(side_effect=rate_limit_error())
+        
+        with pytest.raises(openai.RateLimitError):
+            limiter.call(fn)
+        assert fn.call_count == 3
+    
+    @patch('services.rate_limit.time.sleep')
+    def test_quota_exhausted_not_retried(self, mock_sleep):
+        """Test that an exhausted account quota fails at once instead of backing off"""
+        limiter = RateLimiter(rpm=100, tpm=10_000, max_concurrency=8)
+        error = rate_limit_error({"code": "insufficient_quota", "message": "quota"})
+        fn = MagicMock(side_effect=error)
+        
+        with pytest.raises(openai.RateLimitError):
+            limiter.call(fn)
+        assert fn.call_count == 1
+        mock_sleep.assert_not_called()
+        assert limiter.concurrency.limit == 8
+    
+    def test_budget_shared_between_processes(self, tmp_path):
+        """Test that limiters sharing a budget file draw from one budget"""
+        path = str(tmp_path / "budget.json")
+        api = RateLimiter(
+            rpm=10, tpm=10_000, max_concurrency=10, interactive_reserve=0.2, budget_path=path
+        )
+        script = RateLimiter(
+            rpm=10, tpm=10_000, max_concurrency=10, interactive_reserve=0.2, budget_path=path
+        )
+        
+        for _ in range(8):
+            assert script._try_acquire(tokens=1, requests=1, lane=BULK) == 0
+            script.release()
+        
+        assert api._try_acquire(tokens=1, requests=1, lane=BULK) > 0
+        assert api._try_acquire(tokens=1, requests=1, lane=INTERACTIVE) == 0
+    
+    def test_interactive_in_other_process_holds_back_bulk(self, tmp_path):
+        """Test that a queued interactive call in one process pauses bulk calls in another"""
+        path = str(tmp_path / "budget.json")
+        api = RateLimiter(rpm=100, tpm=10_000, max_concurrency=1, budget_path=path)
+        script = RateLimiter(rpm=100, tpm=10_000, max_concurrency=10, budget_path=path)
+        api.in_flight = 1
+        
+        assert api._try_acquire(tokens=1, requests=1, lane=INTERACTIVE) > 0
+        assert script._try_acquire(tokens=1, requests=1, lane=BULK) > 0
+    
+    @pytest.mark.asyncio
+    async def test_async_acquire_waits_off_the_event_loop(self, tmp_path):
+        """Test that a shared budget file locked by another process does not block the event loop"""
+        path = str(tmp_path / "budget.json")
+        limiter = RateLimiter(rpm=100, tpm=10_000, max_concurrency=10, budget_path=path)
+        
+        with open(path, "a") as other_process:
+            fcntl.flock(other_process, fcntl.LOCK_EX)
+            acquire = asyncio.ensure_future(limiter.aacquire(tokens=1, lane=INTERACTIVE))
+            # The loop keeps running other work while the acquire waits for the lock
+            await asyncio.sleep(0.05)
+            assert not acquire.done()
+            fcntl.flock(other_process, fcntl.LOCK_UN)
+        
+        await asyncio.wait_for(acquire, timeout=1)
+        assert limiter.in_flight == 1
+    
+    def test_rate_limited_runnable(self):
+        """Test that a wrapped model still composes into a chain"""
+        llm = MagicMock()
+        llm.invoke.return_value = "answer"
+        
+        assert rate_limited(llm, lane=INTERACTIVE).invoke("question") == "answer"
@@ -0,0 +1,170 @@
+import os
+
+import numpy as np
+import pytest
+from unittest.mock import MagicMock, patch
+
+from langchain_core.documents import Document
+
+from services.segment_index import (
+    Segment, SegmentIndex, SegmentVectorStore, SegmentWriter, read_manifest
+)
+
+
+def docs(*note_ids):
+    return [
+        Document(page_content=f"chunk of {note_id}", metadata={"note_id": note_id})
+        for note_id in note_ids
+    ]
+
+
+def ranked(hits):
+    return [(s.document(row).metadata["note_id"], round(score, 4)) for s, row, score in hits]
+
+
+@pytest.fixture
+def root(tmp_path):
+    return str(tmp_path / "segments")
+
+
+class TestSegmentIndex:
+    def test_search_across_segments(self, root):
+        """Test that search merges the best rows of every published segment"""
+        writer = SegmentWriter(root)
+        writer.append(docs("a", "b"), np.array([[1.0, 0.0, 0.0], [0.0, 1.0, 0.0]]))
+        writer.append(docs("c"), np.array([[0.0, 0.0, 1.0]]))
+        
+        index = SegmentIndex(root)
+        hits = index.search(np.array([0.1, 0.2, 0.9]), k=2)
+        
+        assert [segment.document(row).metadata["note_id"] for segment, row, _ in hits] == ["c", "b"]
+        assert isinstance(hits[0][0].index.compact.codes, np.memmap)
+        assert index.stats() == {
+            "version": 2, "segments": 2, "vectors": 3, "superseded": 0, "deleted": 0
+        }
+    
+    def test_hot_swap_without_reopening(self, root):
+        """Test that a reader picks up newly published segments and keeps the mapped ones"""
+        writer = SegmentWriter(root)
+        writer.append(docs("a"), np.array([[1.0, 0.0]]))
+        index = SegmentIndex(root, refresh_seconds=0)
+        first = index.view.segments[0]
+        
+        writer.append(docs("b"), np.array([[0.0, 1.0]]))
+        hits = index.search(np.array([0.0, 1.0]), k=1)
+        
+        assert hits[0][0].document(hits[0][1]).metadata["note_id"] == "b"
+        assert index.view.segments[0] is first
+        assert index.view.version == 2
+    
+    def test_reindexed_note_supersedes_older_chunks(self, root):
+        """Test that a note's newest segment replaces its chunks in older segments"""
+        writer = SegmentWriter(root)
+        writer.append(docs("a", "a", "b"), np.array([[1.0, 0.0], [0.9, 0.1], [0.0, 1.0]]))
+        writer.append(docs("a"), np.array([[0.0, 1.0]]), watermark="2024-05-01T00:00:00")
+        
+        index = SegmentIndex(root)
+        hits = index.search(np.array([1.0, 0.0]), k=3)
+        
+        assert [(segment.name, row) for segment, row, _ in hits] == [
+            (index.view.segments[0].name, 2),
+            (index.view.segments[1].name, 0),
+        ]
+        assert index.stats()["superseded"] == 2
+        assert read_manifest(root)["watermark"] == "2024-05-01T00:00:00"
+
+
+class TestTombstones:
+    def test_delete_hides_rows_without_rewriting_segments(self, root):
+        """Test that a delete only publishes a tombstone bitmap that searches filter"""
+        writer = SegmentWriter(root)
+        writer.append(docs("a", "b", "b"), np.array([[1.0, 0.0], [0.9, 0.1], [0.8, 0.2]]))
+        index = SegmentIndex(root, refresh_seconds=0)
+        segments = read_manifest(root)["segments"]
+        
+        assert writer.delete(["b"]) == 2
+        assert writer.delete(["b"]) == 0
+        
+        hits = index.search(np.array([1.0, 0.0]), k=3)
+        assert [segment.document(row).metadata["note_id"] for segment, row, _ in hits] == ["a"]
+        assert read_manifest(root)["segments"] == segments
+        assert index.stats()["deleted"] == 2
+    
+    def test_delete_reads_only_segments_holding_the_note(self, root):
+        """Test that a delete does not scan segments without rows of the note"""
+        writer = SegmentWriter(root, merge_factor=0)
+        for note_id in ("a", "b", "c", "d"):
+            writer.append(docs(note_id), np.array([[1.0, 0.0]]))
+        
+        spy = patch.object(Segment, "note_mask", autospec=True, side_effect=Segment.note_mask)
+        with spy as note_mask:
+            assert writer.delete(["c"]) == 1
+        
+        assert [call.args[0].notes for call in note_mask.call_args_list] == [["c"]]
+        assert SegmentIndex(root).stats()["deleted"] == 1
+    
+    def test_compaction_rewrites_dead_segments(self, root):
+        """Test that compaction drops deleted and superseded rows and keeps results unchanged"""
+        writer = SegmentWriter(root)
+        writer.append(docs("a", "b", "d"), np.array([[1.0, 0.0], [0.0, 1.0], [0.6, 0.8]]))
+        writer.append(docs("c"), np.array([[0.8, 0.6]]))
+        writer.append(docs("a"), np.array([[0.7, 0.7]]))
+        writer.delete(["b"])
+        old = SegmentIndex(root, refresh_seconds=3600)
+        query = np.array([0.6, 0.8])
+        before = ranked(old.search(query, k=5))
+        
+        assert writer.compact(threshold=0.9) is None
+        summary = writer.compact(threshold=0.2)
+        
+        assert summary == {"compacted": 1, "removed": 2, "kept": 1}
+        index = SegmentIndex(root)
+        assert ranked(index.search(query, k=5)) == before
+        assert index.stats() == {
+            "version": 5, "segments": 3, "vectors": 3, "superseded": 0, "deleted": 0
+        }
+        # Workers still mapping the removed segment keep serving until they refresh
+        assert ranked(old.search(query, k=5)) == before
+    
+    
+    def test_small_segments_merged_by_tier(self, root):
+        """Test that one-note appends are merged once a size tier fills up"""
+        writer = SegmentWriter(root, merge_factor=3)
+        writer.append(docs("a"), np.array([[1.0, 0.0]]))
+        writer.append(docs("b"), np.array([[0.0, 1.0]]))
+        writer.append(docs("a"), np.array([[0.6, 0.8]]))
+        
+        index = SegmentIndex(root)
+        assert index.stats() == {
+            "version": 3, "segments": 1, "vectors": 2, "superseded": 0, "deleted": 0
+        }
+        assert ranked(index.search(np.array([1.0, 0.0]), k=2)) == [("a", 0.6), ("b", 0.0)]
+        segment_dirs = sorted(entry for entry in os.listdir(root) if entry.startswith("seg-"))
+        assert segment_dirs == read_manifest(root)["segments"]
+    
+    def test_merge_keeps_deleted_notes_hidden(self, root):
+        """Test that merging away a note's tombstoned rows does not bring back its older rows"""
+        writer = SegmentWriter(root, merge_factor=3)
+        writer.append(docs("a", "a", "a"), np.array([[1.0, 0.0], [0.9, 0.1], [0.8, 0.2]]))
+        writer.append(docs("a"), np.array([[0.7, 0.3]]))
+        writer.delete(["a"])
+        writer.append(docs("b"), np.array([[0.0, 1.0]]))
+        writer.append(docs("c"), np.array([[0.5, 0.5]]))
+        
+        index = SegmentIndex(root)
+        assert index.stats()["segments"] == 2
+        hits = index.search(np.array([1.0, 0.0]), k=5)
+        assert [s.document(row).metadata["note_id"] for s, row, _ in hits] == ["c", "b"]
+
+
+class TestSegmentVectorStore:
+    def test_add_and_search(self, root):
+        """Test that texts added through the store are searchable right away"""
+        embedding = MagicMock()
+        embedding.embed_documents.return_value = [[1.0, 0.0], [0.0, 1.0]]
+        embedding.embed_query.return_value = [0.2, 0.9]
+        store = SegmentVectorStore(embedding, SegmentIndex(root, refresh_seconds=60))
+        
+        store.add_documents(docs("a", "b"))
+        
+        assert [doc.metadata["note_id"] for doc in store.similarity_search("query", k=1)] == ["b"]
@@ -0,0 +1,81 @@
+import json
+import uuid
+from datetime import datetime, timezone
+from types import SimpleNamespace
+from typing import List
+
+from models.schemas import NoteDetailOut, NoteOut, NoteRankOut, TaskItem
+from services.serialization import dump_rows, json_response, projection
+
+
+def note_row(**overrides):
+    """An object with the attributes of a Note row"""
+    now = datetime(2024, 5, 1, 9, 30, 15, 123456, tzinfo=timezone.utc)
+    fields = dict(
+        id=uuid.uuid4(),
+        title="Weekly sync",
+        body='Ship "v2" on Friday.\nÉquipe ✓',
+        created_at=now,
+        updated_at=now,
+        pagerank=0.125,
+        component_id=1,
+        community_id=None,
+    )
+    fields.update(overrides)
+    return SimpleNamespace(**fields)
+
+
+def model_json(model, row):
+    """What FastAPI returned for a model built field by field"""
+    built = model(**{name: getattr(row, name) for name in model.model_fields})
+    return json.loads(built.model_dump_json())
+
+
+class TestDumpRows:
+    def test_projection_matches_response_model(self):
+        """Test that projected rows serialize exactly like the response models did"""
+        rows = [note_row(), note_row(title=None, updated_at=datetime(2024, 5, 2, 8, 0))]
+        
+        for model in (NoteOut, NoteRankOut):
+            assert projection(List[model]) is not None
+            data = json.loads(dump_rows(List[model], rows))
+            assert data == [model_json(model, row) for row in rows]
+    
+    def test_single_row(self):
+        """Test that a single row serializes as an object"""
+        row = note_row()
+        
+        assert json.loads(dump_rows(NoteOut, row)) == model_json(NoteOut, row)
+    
+    def test_nested_models_are_validated_once(self):
+        """Test that responses with nested models take the validating path"""
+        task = SimpleNamespace(
+            description="Send notes",
+            due_date=None,
+            owner="Ana",
+            source_note_id=uuid.uuid4(),
+            completed=False,
+        )
+        note = note_row()
+        
+        assert projection(NoteDetailOut) is None
+        data = json.loads(dump_rows(NoteDetailOut, {
+            "id": note.id,
+            "title": note.title,
+            "body": note.body,
+            "created_at": note.created_at,
+            "updated_at": note.updated_at,
+            "tasks": [task],
+            "related_links": [],
+        }))
+        
+        assert data["tasks"] == [json.loads(TaskItem(**vars(task)).model_dump_json())]
+        assert data["created_at"] == "2024-05-01T09:30:15.123456Z"
+    
+    def test_json_response(self):
+        """Test that the response carries the serialized rows as JSON"""
+        response = json_response(List[NoteOut], [note_row()], status_code=201)
+        
+        assert response.status_code == 201
+        assert response.media_type == "application/json"
+        assert json.loads(response.body)[0]["title"] == "Weekly sync"
@@ -0,0 +1,78 @@
+import time
+from concurrent.futures import ThreadPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+import pytest
+from unittest.mock import patch, MagicMock, AsyncMock
+
+from services import speech
+from services.speech import (
+    get_local_pool, get_transcription_backend, transcribe_file_async, transcript_cache_key
+)
+
+
+class TestBackendSelection:
+    @pytest.mark.parametrize("backend,use_api,key,expected", [
+        ("local", False, None, "local"),
+        ("api", True, "sk-test", "api"),
+        ("api", True, None, "stub"),
+        ("api", False, "sk-test", "stub"),
+        ("stub", True, "sk-test", "stub"),
+    ])
+    def test_effective_backend(self, backend, use_api, key, expected):
+        """Test that the API backend needs both WHISPER_USE_API and a key"""
+        with patch('services.speech.WHISPER_BACKEND', backend), \
+                patch('services.speech.WHISPER_USE_API', use_api), \
+                patch('services.speech.OPENAI_API_KEY', key):
+            assert get_transcription_backend() == expected
+
+
+@patch('services.speech.WHISPER_BACKEND', "local")
+class TestLocalBackend:
+    @pytest.mark.asyncio
+    @patch('services.speech._transcribe_local_segment')
+    @patch('services.speech.split_audio', new_callable=AsyncMock)
+    async def test_segments_and_real_time_factor(self, mock_split, mock_segment):
+        """Test that local segments are stitched in order and the RTF is reported"""
+        mock_split.return_value = ["meeting.mp3"]
+        mock_segment.side_effect = lambda path: time.sleep(0.05) or ("We ship on Friday.", 1.0)
+        
+        with ThreadPoolExecutor(max_workers=2) as pool, \
+                patch('services.speech.get_local_pool', return_value=pool):
+            result = await transcribe_file_async("meeting.mp3")
+        
+        assert result["transcript"] == "We ship on Friday."
+        assert result["backend"] == "local"
+        assert 0.05 <= result["real_time_factor"] < 1
+    
+    def test_missing_package_reported(self):
+        """Test that a missing faster-whisper is reported instead of breaking the pool"""
+        with patch('services.speech._local_pool', None), \
+                patch('services.speech.importlib.util.find_spec', return_value=None):
+            with pytest.raises(RuntimeError, match="faster-whisper"):
+                get_local_pool()
+            assert speech._local_pool is None
+    
+    def test_broken_pool_discarded(self):
+        """Test that a broken worker pool is replaced on the next transcription"""
+        pool = MagicMock()
+        pool.submit.side_effect = BrokenProcessPool("worker died")
+        
+        with patch('services.speech._local_pool', pool), \
+                patch('services.speech.get_cache', return_value=None):
+            with pytest.raises(BrokenProcessPool):
+                speech.transcribe_audio(b"audio")
+            assert speech._local_pool is None
+        pool.shutdown.assert_called_once()
+
+
+class TestTranscriptCache:
+    def test_key_includes_backend_and_model(self):
+        """Test that switching backend or model does not serve the old transcripts"""
+        api = transcript_cache_key("abc", "api")
+        local = transcript_cache_key("abc", "local")
+        with patch('services.speech.LOCAL_WHISPER_MODEL', "small"):
+            local_small = transcript_cache_key("abc", "local")
+        
+        assert len({api, local, local_small}) == 3
+        assert transcript_cache_key("abc", "api") == api
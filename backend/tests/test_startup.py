@@ -0,0 +1,80 @@
+import json
+import os
+import subprocess
+import sys
+
+# Seconds that importing the app may add on top of its framework imports
+APP_IMPORT_BUDGET_SECONDS = float(os.getenv("APP_IMPORT_BUDGET_SECONDS", "0.5"))
+
+# Provider SDKs that must only be imported by the backend that uses them
+LAZY_MODULES = [
+    "openai",
+    "langchain_openai",
+    "langchain_pinecone",
+    "langchain_community",
+    "pinecone",
+    "faiss",
+    "tiktoken",
+    "onnxruntime",
+    "faster_whisper",
+]
+
+# Framework imports every worker needs; timed first so only app code counts
+PROFILE_SCRIPT = """
+import json, sys, time
+started = time.perf_counter()
+import fastapi, numpy, sqlmodel
+from sqlalchemy.ext.asyncio import create_async_engine
+from langchain_core.output_parsers import JsonOutputParser
+from langchain_core.prompts import ChatPromptTemplate
+from langchain_core.retrievers import BaseRetriever
+from langchain_core.runnables import RunnableLambda
+from langchain_core.vectorstores import VectorStore
+framework = time.perf_counter()
+import main
+done = time.perf_counter()
+print(json.dumps({
+    "framework": framework - started,
+    "app": done - framework,
+    "loaded": [name for name in %r if name in sys.modules],
+}))
+"""
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def profile_cold_import():
+    """Import the app in a fresh interpreter with -X importtime"""
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", PROFILE_SCRIPT % LAZY_MODULES],
+        cwd=BACKEND_DIR,
+        capture_output=True,
+        text=True,
+        timeout=120,
+    )
+    assert result.returncode == 0, result.stderr[-2000:]
+    return json.loads(result.stdout.strip().splitlines()[-1]), result.stderr
+
+
+def slowest_imports(importtime: str, limit: int = 15) -> str:
+    """The modules with the largest cumulative import time, for failure messages"""
+    rows = []
+    for line in importtime.splitlines():
+        parts = line.split("|")
+        if len(parts) == 3 and parts[1].strip().isdigit():
+            rows.append((int(parts[1]), parts[2].strip()))
+    return "\n".join(f"{us / 1e6:8.3f}s {name}" for us, name in sorted(rows, reverse=True)[:limit])
+
+
+class TestStartup:
+    def test_cold_import_is_fast_and_lazy(self):
+        """Test that importing the app skips provider SDKs and adds little to framework imports"""
+        profile, importtime = profile_cold_import()
+        
+        assert profile["loaded"] == [], (
+            f"Imported eagerly at startup: {profile['loaded']}\n{slowest_imports(importtime)}"
+        )
+        assert profile["app"] < APP_IMPORT_BUDGET_SECONDS, (
+            f"App import took {profile['app']:.2f}s on top of {profile['framework']:.2f}s "
+            f"of framework imports\n{slowest_imports(importtime)}"
+        )
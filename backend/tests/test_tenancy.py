@@ -0,0 +1,116 @@
+import time
+import uuid
+
+import numpy as np
+import pytest
+from fastapi.testclient import TestClient
+from unittest.mock import patch, MagicMock, AsyncMock
+
+from langchain_core.documents import Document
+
+from main import app
+from services.database import get_session
+from services.retriever import ScatterGatherRetriever
+from services.segment_index import SegmentIndex, SegmentWriter, segment_root
+from services.tenancy import DEFAULT_SCOPE, Scope, shard_scopes
+
+
+client = TestClient(app)
+
+
+@pytest.fixture(autouse=True)
+def override_get_session():
+    """Override the database session dependency"""
+    app.dependency_overrides[get_session] = lambda: MagicMock()
+    yield
+    app.dependency_overrides = {}
+
+
+class SlowShard:
+    """Shard that answers after a delay, like a remote index"""
+    
+    def __init__(self, hits, delay=0.2):
+        self.hits = hits
+        self.delay = delay
+    
+    def similarity_search_by_vector_with_score(self, embedding, k=4):
+        time.sleep(self.delay)
+        return [
+            (Document(page_content=note_id, metadata={"note_id": note_id}), score)
+            for note_id, score in self.hits
+        ][:k]
+
+
+class TestScopeHeaders:
+    @patch('routers.notes.list_notes', new_callable=AsyncMock)
+    def test_scope_passed_to_queries(self, mock_list_notes):
+        """Test that the tenant and workspace headers scope the request's queries"""
+        mock_list_notes.return_value = []
+        
+        response = client.get(
+            "/notes", headers={"X-Tenant-ID": "acme", "X-Workspace-ID": "research"}
+        )
+        
+        assert response.status_code == 200
+        assert mock_list_notes.await_args.kwargs["scope"] == Scope("acme", "research")
+    
+    @patch('routers.notes.list_notes', new_callable=AsyncMock)
+    def test_default_scope_without_headers(self, mock_list_notes):
+        """Test that requests without headers use the default scope"""
+        mock_list_notes.return_value = []
+        
+        client.get("/notes")
+        
+        assert mock_list_notes.await_args.kwargs["scope"] == DEFAULT_SCOPE
+        assert DEFAULT_SCOPE.namespace is None
+    
+    def test_invalid_tenant_rejected(self):
+        """Test that tenant IDs that could escape a namespace or directory are rejected"""
+        response = client.get("/notes", headers={"X-Tenant-ID": "../other"})
+        
+        assert response.status_code == 400
+    
+    def test_shard_scopes_stay_in_tenant(self):
+        """Test that listed workspaces always belong to the request's tenant"""
+        scopes = shard_scopes(Scope("acme", "research"), ["research", "sales", "research"])
+        
+        assert scopes == [Scope("acme", "research"), Scope("acme", "sales")]
+        assert scopes[1].namespace == "acme:sales"
+
+
+class TestScatterGatherRetriever:
+    @pytest.mark.asyncio
+    async def test_merges_top_k_concurrently(self):
+        """Test that shards are searched concurrently and merged by score"""
+        embedding = MagicMock()
+        embedding.aembed_query = AsyncMock(return_value=[1.0, 0.0])
+        retriever = ScatterGatherRetriever(
+            stores=[SlowShard([("a", 0.9), ("b", 0.4)]), SlowShard([("c", 0.7), ("d", 0.1)])],
+            embedding=embedding,
+            k=3
+        )
+        
+        started = time.perf_counter()
+        docs = await retriever.ainvoke("query")
+        elapsed = time.perf_counter() - started
+        
+        assert [doc.metadata["note_id"] for doc in docs] == ["a", "c", "b"]
+        assert docs[1].metadata["score"] == 0.7
+        assert elapsed < 0.35
+        embedding.aembed_query.assert_awaited_once()
+
+
+class TestSegmentShards:
+    def test_workspaces_have_separate_segments(self, tmp_path):
+        """Test that one tenant's segments are never searched for another"""
+        with patch('services.segment_index.VECTOR_SEGMENT_DIR', str(tmp_path)):
+            acme, other = Scope("acme", "research"), Scope("other", "research")
+            SegmentWriter(segment_root("notes", acme)).append(
+                [Document(page_content="secret", metadata={"note_id": str(uuid.uuid4())})],
+                np.array([[1.0, 0.0]])
+            )
+            
+            query = np.array([1.0, 0.0])
+            assert len(SegmentIndex(segment_root("notes", acme)).search(query, k=5)) == 1
+            assert SegmentIndex(segment_root("notes", other)).search(query, k=5) == []
+            assert segment_root("notes", DEFAULT_SCOPE) == str(tmp_path / "notes")
@@ -0,0 +1,121 @@
+import json
+
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from unittest.mock import patch, MagicMock
+
+from langchain_core.documents import Document
+from langchain_core.retrievers import BaseRetriever
+
+from services.llm import build_qa_chain
+from services.tracing import TracingMiddleware, get_exporter, span, traced_runnable
+
+INCOMING = "00-4bf92f3577b34da6a3ce929d0e0e4736-00f067aa0ba902b7-01"
+
+
+class StaticRetriever(BaseRetriever):
+    """Retriever with a fixed answer"""
+    
+    def _get_relevant_documents(self, query, *, run_manager):
+        return [Document(page_content="Proceed with option A", metadata={"note_id": "n1"})]
+
+
+@pytest.fixture
+def trace_file(tmp_path):
+    """Export spans to a temporary file and read them back"""
+    path = tmp_path / "traces.jsonl"
+    with patch('services.tracing.TRACING_EXPORTER', "file"), \
+            patch('services.tracing.TRACING_FILE', str(path)):
+        def spans():
+            get_exporter().flush()
+            lines = path.read_text().splitlines() if path.exists() else []
+            return {
+                exported["name"]: exported
+                for line in lines
+                for exported in json.loads(line)["resourceSpans"][0]["scopeSpans"][0]["spans"]
+            }
+        yield spans
+
+
+class TestSpans:
+    @patch('services.llm.get_llm')
+    def test_qa_chain_stages_nest(self, mock_get_llm, trace_file):
+        """Test that retrieval, formatting and the LLM call are spans of the caller's trace"""
+        mock_get_llm.return_value = MagicMock(return_value="Option A [note_id:n1]")
+        
+        with span("request"):
+            answer = build_qa_chain(StaticRetriever())("What should we do?")
+        
+        spans = trace_file()
+        assert answer == "Option A [note_id:n1]"
+        assert {"rag.retrieve", "rag.format_docs", "rag.llm"} <= set(spans)
+        root = spans["request"]
+        for name in ("rag.retrieve", "rag.format_docs", "rag.llm"):
+            assert spans[name]["traceId"] == root["traceId"]
+            assert spans[name]["parentSpanId"] == root["spanId"]
+        assert spans["rag.format_docs"]["attributes"] == [
+            {"key": "documents", "value": {"intValue": "1"}}
+        ]
+    
+    def test_error_status(self, trace_file):
+        """Test that an exception marks the span as failed and still propagates"""
+        with pytest.raises(ValueError):
+            with span("ingest.index"):
+                raise ValueError("store unavailable")
+        
+        assert trace_file()["ingest.index"]["status"] == {
+            "code": 2, "message": "ValueError: store unavailable"
+        }
+    
+    def test_stage_feeds_profile_and_trace(self, trace_file):
+        """Test that one block with a stage is both a profiled stage and a span"""
+        profile = MagicMock()
+        
+        with patch('services.tracing.current_profile', return_value=profile):
+            with span("ingest.chunk", stage="chunking", characters=12):
+                pass
+        
+        assert profile.add_stage.call_args.args[0] == "chunking"
+        assert trace_file()["ingest.chunk"]["attributes"] == [
+            {"key": "characters", "value": {"intValue": "12"}}
+        ]
+    
+    def test_disabled_by_default(self):
+        """Test that tracing off records nothing and leaves chains unwrapped"""
+        runnable = MagicMock()
+        
+        with patch('services.tracing.TRACING_EXPORTER', "none"):
+            with span("rag.retrieve") as current:
+                assert current is None
+            assert traced_runnable("rag.llm", runnable) is runnable
+
+
+class TestTracingMiddleware:
+    def make_client(self):
+        traced = FastAPI()
+        
+        @traced.get("/ping")
+        async def ping():
+            with span("work"):
+                return {"status": "ok"}
+        
+        traced.add_middleware(TracingMiddleware)
+        return TestClient(traced)
+    
+    def test_joins_incoming_trace(self, trace_file):
+        """Test that a traceparent header continues the caller's trace"""
+        response = self.make_client().get("/ping", headers={"traceparent": INCOMING})
+        
+        spans = trace_file()
+        server = spans["GET /ping"]
+        assert server["traceId"] == "4bf92f3577b34da6a3ce929d0e0e4736"
+        assert server["parentSpanId"] == "00f067aa0ba902b7"
+        assert spans["work"]["parentSpanId"] == server["spanId"]
+        assert response.headers["traceparent"] == f"00-{server['traceId']}-{server['spanId']}-01"
+    
+    def test_unsampled_trace_not_recorded(self, trace_file):
+        """Test that a caller's decision not to sample is respected"""
+        self.make_client().get("/ping", headers={"traceparent": INCOMING[:-2] + "00"})
+        
+        assert trace_file() == {}
@@ -0,0 +1,88 @@
+import os
+
+import numpy as np
+import pytest
+from unittest.mock import MagicMock
+
+from langchain_core.documents import Document
+
+from services.vector_index import CompactVectorIndex, CompactVectorStore, evaluate_recall
+
+
+@pytest.fixture
+def vectors():
+    """Clustered random vectors standing in for embeddings"""
+    rng = np.random.default_rng(0)
+    centers = rng.standard_normal((20, 64))
+    return centers[rng.integers(0, 20, 2000)] + 0.5 * rng.standard_normal((2000, 64))
+
+
+class TestCompactVectorIndex:
+    def test_int8_with_rescoring_matches_exact_search(self, vectors):
+        """Test that int8 scanning plus float rescoring keeps recall near exact"""
+        index = CompactVectorIndex(storage="int8", rescore=True)
+        index.add(vectors)
+        
+        assert evaluate_recall(index, vectors, vectors[:20], k=10) >= 0.95
+    
+    def test_memory_report(self, vectors, tmp_path):
+        """Test that int8 storage with memory-mapped rescoring is 4x smaller in memory"""
+        index = CompactVectorIndex(
+            dims=32, storage="int8", rescore=True, rescore_path=str(tmp_path / "rescore.npy")
+        )
+        index.add(vectors[:1000])
+        index.add(vectors[1000:])
+        
+        report = index.memory_report()
+        assert report["vectors"] == 2000
+        assert report["dims"] == 32
+        assert report["resident_bytes"] == 2000 * 32 + 2000 * 4
+        assert report["compression"] > 6
+        assert index.search(vectors[1500], k=1)[0][0] == 1500
+    
+    def test_rescore_files_per_index(self, vectors, tmp_path):
+        """Test that indexes in one rescore directory never share or rewrite a file"""
+        first = CompactVectorIndex(storage="int8", rescore=True, rescore_dir=str(tmp_path))
+        second = CompactVectorIndex(storage="int8", rescore=True, rescore_dir=str(tmp_path))
+        first.add(vectors[:1000])
+        second.add(vectors[1000:])
+        first.add(vectors[1000:1500])
+        
+        assert first.rescore_path != second.rescore_path
+        assert os.path.getsize(first.rescore_path) == 1500 * vectors.shape[1] * 2
+        assert first.search(vectors[1200], k=1)[0][0] == 1200
+        assert second.search(vectors[1200], k=1)[0][0] == 200
+        
+        path = second.rescore_path
+        del second
+        assert not os.path.exists(path)
+    
+    def test_save_and_memory_map(self, vectors, tmp_path):
+        """Test that a saved index loads as memory maps and searches the same"""
+        index = CompactVectorIndex(storage="int8", rescore=True)
+        index.add(vectors)
+        index.save(str(tmp_path / "index"))
+        
+        mapped = CompactVectorIndex.load(str(tmp_path / "index"))
+        
+        assert isinstance(mapped.compact.codes, np.memmap)
+        assert mapped.memory_report()["resident_bytes"] == 0
+        for query in vectors[:5]:
+            np.testing.assert_array_equal(mapped.search(query, 10)[0], index.search(query, 10)[0])
+
+
+class TestCompactVectorStore:
+    def test_similarity_search(self):
+        """Test that the store returns the closest documents with their metadata"""
+        embedding = MagicMock()
+        embedding.embed_documents.return_value = [[1.0, 0.0], [0.0, 1.0], [0.7, 0.7]]
+        embedding.embed_query.return_value = [0.9, 0.1]
+        
+        store = CompactVectorStore.from_documents(
+            [Document(page_content=text, metadata={"note_id": text}) for text in ["a", "b", "c"]],
+            embedding=embedding,
+            index=CompactVectorIndex(storage="float16", rescore=False),
+        )
+        
+        docs = store.as_retriever(search_kwargs={"k": 2}).invoke("query")
+        assert [doc.metadata["note_id"] for doc in docs] == ["a", "c"]
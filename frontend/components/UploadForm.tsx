@@ -41,24 +41,11 @@ export const UploadForm: FC<UploadFormProps> = ({
       setIsProcessing(true);
       setCurrentStep('transcribing');
       
-      const formData = new FormData();
-      formData.append('file', audioFile);
-      
-      // This would typically call the transcription API
-      // For demo purposes, we'll simulate a delay and response
-      await new Promise(resolve => setTimeout(resolve, 1000));
-      
-      // Placeholder for real transcription
-      const transcription = `Transcribed content from ${audioFile.name}. 
-      
-This is a sample transcription that would normally come from the Whisper API.
-      
-Key points:
-- We should prioritize the new feature for Q3
-- User testing showed positive results for the prototype
-- Budget needs to be adjusted by 15% to accommodate changes
-
-Let's schedule a follow-up meeting next week to discuss implementation details.`;
+      const result = await api.transcribe(audioFile, {
+        summarize: false,
+        extractTasks: false,
+      });
+      const transcription = result.transcript;
       
       setText(transcription);
       setCurrentStep(null);
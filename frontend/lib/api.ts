@@ -5,7 +5,9 @@ import {
   TaskItem,
   SearchOut,
   SummarizeOut,
-  NoteEmbedResponse
+  NoteEmbedResponse,
+  TranscribeOut,
+  MeetingOut
 } from './types';
 
 const BACKEND_URL = process.env.NEXT_PUBLIC_BACKEND_URL || 'http://localhost:8000';
@@ -55,6 +57,20 @@ const noteEmbedResponseSchema = z.object({
   links: z.array(linkInfoSchema),
 });
 
+const transcribeOutSchema = z.object({
+  transcript: z.string(),
+  segments: z.number(),
+  summary: summarizeOutSchema.nullable().optional(),
+  tasks: z.array(taskItemSchema),
+});
+
+const meetingOutSchema = z.object({
+  note_id: z.string().uuid(),
+  summary: summarizeOutSchema,
+  tasks: z.array(taskItemSchema),
+  chunks_indexed: z.number(),
+});
+
 const noteDetailOutSchema = noteOutSchema.extend({
   tasks: z.array(taskItemSchema),
   related_links: z.array(linkInfoSchema),
@@ -185,6 +201,39 @@ export const api = {
     );
   },
   
+  // Transcription (raw body upload, streamed server-side)
+  transcribe: async (
+    file: File,
+    { summarize = true, extractTasks = true }: { summarize?: boolean; extractTasks?: boolean } = {}
+  ) => {
+    const params = new URLSearchParams({
+      filename: file.name,
+      summarize: String(summarize),
+      extract_tasks: String(extractTasks),
+    });
+    return apiFetch<TranscribeOut>(
+      `/transcribe?${params.toString()}`,
+      {
+        method: 'POST',
+        headers: { 'Content-Type': file.type || 'application/octet-stream' },
+        body: file,
+      },
+      transcribeOutSchema
+    );
+  },
+  
+  // Single-pass meeting pipeline (summary, tasks, note and embeddings)
+  processMeeting: async (data: { text: string; title?: string; meta?: Record<string, any> }) => {
+    return apiFetch<MeetingOut>(
+      '/meetings/process',
+      {
+        method: 'POST',
+        body: JSON.stringify(data),
+      },
+      meetingOutSchema
+    );
+  },
+  
   // Summarize
   summarize: async (data: { text: string }) => {
     return apiFetch<SummarizeOut>(
@@ -73,3 +73,17 @@ export interface NoteIn {
   text: string;
   meta?: Record<string, any>;
 }
+
+export interface TranscribeOut {
+  transcript: string;
+  segments: number;
+  summary?: SummarizeOut | null;
+  tasks: TaskItem[];
+}
+
+export interface MeetingOut {
+  note_id: string; // UUID
+  summary: SummarizeOut;
+  tasks: TaskItem[];
+  chunks_indexed: number;
+}